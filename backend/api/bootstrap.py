@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, Query, Request
+from db import db, LAYER_PROJECTION
+from datasets import read_dataset_version, read_changes
+from layer_cache import layer_response
+from geo import haversine
+from centers import Center, center_filter, center_param
+from responses import json_response
+
+router = APIRouter()
+
+# Layers the app loads on start-up: collection -> key the change log uses
+BOOTSTRAP_LAYERS = {
+    "signed_intersections": "osm_id",
+    "hojre_vigepligt": "osm_id",
+    "speed_limits": "osm_id",
+    "google_speed_limits": "placeId",
+    "villa_streets": "osm_id",
+}
+# As the layer endpoints' default format: geometry as lat/lng lists
+PROJECTION = {**LAYER_PROJECTION, "polyline": 0}
+LAYER_LIMIT = 50000
+# Keys per $in query when fetching upserted documents
+FETCH_BATCH = 1000
+
+
+def _decorate(center: Center, layer: str, docs: list[dict]) -> list[dict]:
+    """Computed fields the layer endpoints add (villa streets' distance from the start)."""
+    if layer == "villa_streets":
+        for s in docs:
+            s["distance_m"] = round(haversine(center.lat, center.lng, s["lat"], s["lng"]))
+        docs.sort(key=lambda s: s["distance_m"])
+    return docs
+
+
+async def _full_layer(center: Center, layer: str, defer: frozenset = frozenset()) -> dict:
+    if layer in defer:
+        # The client streams it from the layer endpoint instead
+        return {"key": BOOTSTRAP_LAYERS[layer], "full": True, "deferred": True, "docs": []}
+    docs = await db[layer].find(center_filter(center.id), PROJECTION).to_list(LAYER_LIMIT)
+    return {"key": BOOTSTRAP_LAYERS[layer], "full": True, "docs": _decorate(center, layer, docs)}
+
+
+async def _full(center: Center, defer: frozenset) -> dict:
+    # Version first: anything changing while the layers are read is sent again next time
+    version = await read_dataset_version(db, center.id)
+    layers = {layer: await _full_layer(center, layer, defer) for layer in BOOTSTRAP_LAYERS}
+    return {"center": center.id, "version": version, "full": True, "layers": layers}
+
+
+async def _delta(center: Center, since: int, defer: frozenset) -> dict | None:
+    """Documents upserted and keys deleted since centre version `since`; None if the log doesn't reach back."""
+    version = await read_dataset_version(db, center.id)
+    changes = await read_changes(db, center.id, since)
+    if changes is None:
+        return None
+    upserted = {layer: set() for layer in BOOTSTRAP_LAYERS}
+    deleted = {layer: set() for layer in BOOTSTRAP_LAYERS}
+    reset = set()
+    # Oldest first, so the latest change to a key wins
+    for change in changes:
+        layer = change["layer"]
+        if layer not in BOOTSTRAP_LAYERS:
+            continue
+        if change["reset"]:
+            reset.add(layer)
+        upserted[layer].update(change["upserted"])
+        upserted[layer].difference_update(change["deleted"])
+        deleted[layer].update(change["deleted"])
+        deleted[layer].difference_update(change["upserted"])
+
+    layers = {}
+    for layer, key in BOOTSTRAP_LAYERS.items():
+        if layer in reset:
+            layers[layer] = await _full_layer(center, layer, defer)
+            continue
+        wanted = sorted(upserted[layer], key=str)
+        docs = []
+        for i in range(0, len(wanted), FETCH_BATCH):
+            docs += await db[layer].find({**center_filter(center.id), key: {"$in": wanted[i:i + FETCH_BATCH]}},
+                                         PROJECTION).to_list(None)
+        # Upserted and since deleted again (after `version` was read)
+        gone = set(wanted) - {d[key] for d in docs}
+        layers[layer] = {"key": key, "full": False, "docs": _decorate(center, layer, docs),
+                         "deleted": sorted(deleted[layer] | gone, key=str)}
+    return {"center": center.id, "version": version, "full": False, "layers": layers}
+
+
+@router.get("")
+async def bootstrap(
+    request: Request,
+    since: int | None = Query(None, description="version from the client's last bootstrap"),
+    defer: str | None = Query(None, description="comma-separated layers to leave out when sent whole"),
+    center: Center = Depends(center_param),
+):
+    """
+    Every start-up layer of a test centre in one response, with the centre's
+    dataset version as a token:
+      {"center", "version", "full", "layers": {collection: {"key", "full", "docs", "deleted"?}}}
+    Layers are signed_intersections, hojre_vigepligt, speed_limits,
+    google_speed_limits and villa_streets, as the layer endpoints return them.
+    With since=<version> only what the change log (written by seeding and
+    hojre bulk-delete) recorded after it is sent: upserted documents and
+    deleted keys per layer, or a whole layer ("full": true) after a full
+    reseed. A token the log no longer covers gets everything again.
+    defer=google_speed_limits leaves that layer out whenever it would be sent
+    whole ({"full": true, "deferred": true, "docs": []}), so the client can
+    stream it from its layer endpoint (?stream=ndjson) and draw it as it
+    arrives; its deltas are still included.
+    """
+    deferred = frozenset(name.strip() for name in defer.split(",")) & BOOTSTRAP_LAYERS.keys() if defer else frozenset()
+    if since is not None:
+        delta = await _delta(center, since, deferred)
+        if delta is not None:
+            return json_response(delta)
+    key = f"{center.id}:bootstrap" + (":defer=" + "+".join(sorted(deferred)) if deferred else "")
+    return await layer_response(request, center.id, key, lambda: _full(center, deferred))
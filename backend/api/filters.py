@@ -0,0 +1,97 @@
+from typing import Literal
+from fastapi import Depends, HTTPException, Query
+from db import LAYER_PROJECTION
+from centers import Center, center_filter, center_param
+from geo import spatial_filter
+import polyline
+
+
+def area_filter(field: str, lat: float | None, lng: float | None, radius: float | None,
+                bbox: str | None, lines: bool = False) -> dict | None:
+    """spatial_filter() for query parameters; bad input becomes a 400."""
+    try:
+        return spatial_filter(field, lat, lng, radius, bbox, lines=lines)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+class LayerParams:
+    """
+    Query parameters shared by the layer endpoints:
+      center — test centre whose layers to serve (default DEFAULT_CENTER)
+      lat, lng, radius (metres) — features within radius of a point
+      bbox=minLng,minLat,maxLng,maxLat — features inside a viewport
+      format=polyline — road geometry as an encoded polyline string
+      fields=name,maxspeed — only these fields (Mongo projection)
+      stream=ndjson|json — stream from the cursor in batches (api/streaming.py)
+    Without spatial parameters or stream the layer is served from the snapshot cache.
+    """
+
+    def __init__(
+        self,
+        lat: float | None = None,
+        lng: float | None = None,
+        radius: float | None = None,
+        bbox: str | None = None,
+        format: Literal["json", "polyline"] = "json",
+        fields: str | None = Query(None, description="Comma-separated field names"),
+        stream: Literal["ndjson", "json"] | None = None,
+        center: Center = Depends(center_param),
+    ):
+        self.center = center
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.bbox = bbox
+        self.format = format
+        self.stream = stream
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+    def area(self, field: str, lines: bool = False) -> dict | None:
+        return area_filter(field, self.lat, self.lng, self.radius, self.bbox, lines=lines)
+
+    def scoped(self, query: dict | None = None) -> dict:
+        """`query` limited to this request's test centre."""
+        return {**center_filter(self.center.id), **(query or {})}
+
+    def cache_key(self, layer: str) -> str:
+        """Snapshot cache key for this centre/format/fieldset of a layer."""
+        key = f"{self.center.id}:{layer}"
+        if self.format != "json":
+            key += f":{self.format}"
+        if self.fields:
+            # No commas: the key is part of the ETag, and If-None-Match lists are comma-separated
+            key += ":" + "+".join(sorted(self.fields))
+        return key
+
+    def projection(self, allowed: set[str]) -> dict:
+        """Mongo projection for `fields` (validated against `allowed`) and `format`."""
+        if not self.fields:
+            proj = dict(LAYER_PROJECTION)
+            # Roads store both forms; send only the one asked for
+            proj["geometry" if self.format == "polyline" else "polyline"] = 0
+            return proj
+        unknown = [f for f in self.fields if f not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        proj = {"_id": 0}
+        for f in self.fields:
+            if f == "geometry" and self.format == "polyline":
+                # osm_id lets ensure_polylines() fill in older docs
+                proj["osm_id"] = 1
+                f = "polyline"
+            proj[f] = 1
+        return proj
+
+
+async def ensure_polylines(col, docs: list[dict]):
+    """Fill in `polyline` for docs seeded before it was stored, from their geometry."""
+    missing = [d for d in docs if "polyline" not in d and "osm_id" in d]
+    if not missing:
+        return
+    ids = [d["osm_id"] for d in missing]
+    geoms = {g["osm_id"]: g.get("geometry") or [] async for g in
+             col.find({"osm_id": {"$in": ids}}, {"_id": 0, "osm_id": 1, "geometry": 1})}
+    for d in missing:
+        pts = [[p["lat"], p["lng"]] for p in geoms.get(d["osm_id"], [])]
+        d["polyline"] = polyline.encode(pts)
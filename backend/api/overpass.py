@@ -1,5 +1,17 @@
-from fastapi import APIRouter
+import asyncio
+import math
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from db import db
+from layer_cache import layer_response, invalidate_layers, etag_matches
+from tile_store import get_tile, tile_variant
+from speed_lookup import get_speed_lookup
+from junction_events import get_junction_index
+import polyline
+from api.filters import LayerParams
+from api.streaming import Section, load_sections, stream_layer
+from responses import accepted_encoding, json_response
+from centers import Center, center_param, default_center_id
+from datasets import layer_change
 
 router = APIRouter()
 
@@ -8,46 +20,212 @@ signed_col = db["signed_intersections"]
 hojre_col = db["hojre_vigepligt"]
 google_speed_col = db["google_speed_limits"]
 
+# Fields each layer exposes to ?fields=
+SPEED_LIMIT_FIELDS = {"osm_id", "name", "maxspeed", "highway_type", "geometry"}
+JUNCTION_FIELDS = {"osm_id", "lat", "lng", "type", "way_count"}
+GOOGLE_SPEED_FIELDS = {"lat", "lng", "speedLimit", "units", "placeId", "source", "osm_id", "name",
+                       "length_m", "geometry", "cell", "level"}
+
+
+def _intersection_sections(params: LayerParams, query: dict | None = None) -> list[Section]:
+    return [Section("intersections", "count", signed_col, params.scoped(query),
+                    params.projection(JUNCTION_FIELDS), 10000)]
+
+
+def _speed_limit_sections(params: LayerParams, query: dict | None = None) -> list[Section]:
+    polylines = params.format == "polyline" and (not params.fields or "geometry" in params.fields)
+    return [Section("roads", "count", speed_col, params.scoped(query),
+                    params.projection(SPEED_LIMIT_FIELDS), 10000, polylines)]
+
+
+def _hojre_vigepligt_sections(params: LayerParams, query: dict | None = None) -> list[Section]:
+    projection = params.projection(JUNCTION_FIELDS)
+    return [
+        Section("hojre_vigepligt", "hojre_vigepligt_count", hojre_col, params.scoped(query), projection, 10000),
+        Section("signed", "signed_count", signed_col, params.scoped(query), projection, 10000),
+    ]
+
+
+def _google_speed_limit_sections(params: LayerParams, query: dict | None = None) -> list[Section]:
+    return [Section("speed_limits", "count", google_speed_col, params.scoped(query),
+                    params.projection(GOOGLE_SPEED_FIELDS), 50000)]
+
+
+async def _layer(request: Request, params: LayerParams, layer: str, sections, query: dict | None):
+    """Streamed (stream=), filtered (query) or cached whole-layer response for a layer's sections."""
+    if params.stream:
+        return stream_layer(sections(params, query), params.stream)
+    if query:
+        return json_response(await load_sections(sections(params, query)))
+    return await layer_response(request, params.center.id, params.cache_key(layer),
+                                lambda: load_sections(sections(params)))
+
 
 @router.get("/intersections")
-async def get_intersections():
-    """All signed intersections from MongoDB."""
-    docs = await signed_col.find({}, {"_id": 0}).to_list(10000)
-    return {"count": len(docs), "intersections": docs}
+async def get_intersections(request: Request, params: LayerParams = Depends()):
+    """Signed intersections from MongoDB, optionally within radius/bbox."""
+    return await _layer(request, params, "intersections", _intersection_sections, params.area("location"))
 
 
 @router.get("/speed-limits")
-async def get_speed_limits():
-    """All speed limits from MongoDB."""
-    docs = await speed_col.find({}, {"_id": 0}).to_list(10000)
-    return {"count": len(docs), "roads": docs}
+async def get_speed_limits(request: Request, params: LayerParams = Depends()):
+    """Speed limit roads from MongoDB, optionally touching radius/bbox; format=polyline for compact geometry."""
+    return await _layer(request, params, "speed_limits", _speed_limit_sections,
+                        params.area("path", lines=True))
 
 
 @router.get("/hojre-vigepligt")
-async def get_hojre_vigepligt():
-    """All højre vigepligt + signed intersections from MongoDB."""
-    hojre = await hojre_col.find({}, {"_id": 0}).to_list(10000)
-    signed = await signed_col.find({}, {"_id": 0}).to_list(10000)
-    return {
-        "hojre_vigepligt_count": len(hojre),
-        "signed_count": len(signed),
-        "hojre_vigepligt": hojre,
-        "signed": signed,
-    }
+async def get_hojre_vigepligt(request: Request, params: LayerParams = Depends()):
+    """Højre vigepligt + signed intersections from MongoDB, optionally within radius/bbox."""
+    return await _layer(request, params, "hojre_vigepligt", _hojre_vigepligt_sections, params.area("location"))
 
 
 @router.get("/google-speed-limits")
-async def get_google_speed_limits():
-    """All Google Roads API speed limits from MongoDB (seeded once)."""
-    docs = await google_speed_col.find({}, {"_id": 0}).to_list(50000)
-    return {"count": len(docs), "speed_limits": docs}
+async def get_google_speed_limits(request: Request, params: LayerParams = Depends()):
+    """
+    Merged HERE/OSM speed limits from MongoDB (seeded once): constant-speed
+    runs along ways plus off-road cells, each with a lat/lng point (a run's
+    midpoint), optionally within radius/bbox of that point.
+    """
+    return await _layer(request, params, "google_speed_limits", _google_speed_limit_sections,
+                        params.area("location"))
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_map_tile(z: int, x: int, y: int, request: Request, center: Center = Depends(center_param)):
+    """
+    Pre-built tile with the speed_limits, google_speed_limits, hojre_vigepligt
+    and signed_intersections layers (see tiles.py for the format).
+    Zooms above the deepest pre-built zoom get their ancestor tile;
+    tiles with nothing in them are 204.
+    """
+    body, version, (tz, tx, ty) = await get_tile(z, x, y, center.id)
+    if body is None:
+        return Response(status_code=204)
+    etag = f'"tile-{center.id}-{tz}-{tx}-{ty}-v{version}"'
+    encoding = accepted_encoding(request)
+    headers = {"Cache-Control": "no-cache", "X-Tile": f"{tz}/{tx}/{ty}", "Vary": "Accept-Encoding"}
+    headers["ETag"] = etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+    if etag_matches(request, headers["ETag"]) or etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = tile_variant(center.id, version, (tz, tx, ty), body, encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Upper bound on points per /speed-lookup call
+MAX_LOOKUP_POINTS = 5000
+
+
+@router.post("/speed-lookup")
+async def lookup_speed_limits(body: dict, center: Center = Depends(center_param)):
+    """
+    Speed limits from the in-memory index (OSM road snap, then merged grid).
+    Body, one of:
+      {"points": [{"lat", "lng"}, ...]}      — one result per point
+      {"polyline": "...", "step_m": 50}      — per vertex, or every step_m metres
+      {"steps": ["<step polyline>", ...]}    — one result per route step
+    """
+    lookup = await get_speed_lookup(center.id)
+    if "steps" in body:
+        steps = body["steps"]
+        if not isinstance(steps, list) or len(steps) > MAX_LOOKUP_POINTS:
+            raise HTTPException(status_code=400, detail=f"steps must be a list of at most {MAX_LOOKUP_POINTS}")
+        if not all(isinstance(enc, str) for enc in steps):
+            raise HTTPException(status_code=400, detail="steps must be encoded polyline strings")
+        try:
+            results = await asyncio.to_thread(lambda: [lookup.lookup_step(enc) for enc in steps])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="steps must be encoded polyline strings")
+        return json_response({"count": len(results), "speed_limits": results})
+
+    if "polyline" in body:
+        try:
+            if not isinstance(body["polyline"], str):
+                raise TypeError
+            pts = polyline.decode(body["polyline"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="polyline must be an encoded polyline string")
+        step_m = body.get("step_m")
+        if step_m is not None:
+            try:
+                step_m = float(step_m)
+            except (TypeError, ValueError):
+                step_m = None
+            if step_m is None or not math.isfinite(step_m) or step_m <= 0:
+                raise HTTPException(status_code=400, detail="step_m must be a positive number of metres")
+            pts = polyline.resample(pts, max(step_m, 5.0))
+    elif "points" in body:
+        try:
+            pts = [(float(p["lat"]), float(p["lng"])) for p in body["points"]]
+            if not all(math.isfinite(lat) and math.isfinite(lng) for lat, lng in pts):
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="points must be [{lat, lng}, ...]")
+    else:
+        raise HTTPException(status_code=400, detail="Expected points, polyline or steps")
+    if len(pts) > MAX_LOOKUP_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_POINTS} points per call")
+
+    results = await asyncio.to_thread(lookup.lookup_many, pts)
+    return json_response({"count": len(results), "speed_limits": results})
+
+
+@router.post("/junction-events")
+async def junction_events(body: dict, center: Center = Depends(center_param)):
+    """
+    Højre vigepligt, trafiklys, ubetinget vigepligt and stopskilt met along a
+    route, in driving order with distance along the route. Body, one of:
+      {"polyline": "..."}                  — leg/step index are null
+      {"legs": [...]}                      — Routes API legs; events get leg/step index
+    """
+    index = await get_junction_index(center.id)
+    if "polyline" in body and not isinstance(body["polyline"], str):
+        raise HTTPException(status_code=400, detail="polyline must be an encoded polyline string")
+    try:
+        if "legs" in body:
+            if not _valid_legs(body["legs"]):
+                raise HTTPException(status_code=400,
+                                    detail="legs must be [{steps: [{polyline: {encodedPolyline}}]}, ...]")
+            events = await asyncio.to_thread(index.events_for_legs, body["legs"], body.get("polyline", ""))
+        elif "polyline" in body:
+            events = await asyncio.to_thread(index.events_for_polyline, body["polyline"])
+        else:
+            raise HTTPException(status_code=400, detail="Expected polyline or legs")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed encoded polyline")
+    return json_response({"count": len(events), "events": events})
+
+
+def _valid_legs(legs) -> bool:
+    """Routes API leg shape, as far as events_for_legs reads it."""
+    if not isinstance(legs, list):
+        return False
+    for leg in legs:
+        if not isinstance(leg, dict) or not isinstance(leg.get("steps", []), list):
+            return False
+        for step in leg.get("steps", []):
+            if not isinstance(step, dict) or not isinstance(step.get("polyline", {}), dict):
+                return False
+            if not isinstance(step.get("polyline", {}).get("encodedPolyline", ""), str):
+                return False
+    return True
 
 
 @router.post("/hojre-vigepligt/bulk-delete")
 async def bulk_delete_hojre(body: dict):
-    """Delete false positive højre vigepligt by osm_id list."""
+    """Delete false positive højre vigepligt by osm_id list (from whichever centres have them)."""
     osm_ids = body.get("osm_ids", [])
     if not osm_ids:
         return {"deleted": 0}
+    # Untagged documents belong to the default centre
+    deleted: dict[str, list] = {}
+    async for d in hojre_col.find({"osm_id": {"$in": osm_ids}}, {"osm_id": 1, "center": 1}):
+        deleted.setdefault(d.get("center") or default_center_id(), []).append(d["osm_id"])
     result = await hojre_col.delete_many({"osm_id": {"$in": osm_ids}})
+    if result.deleted_count:
+        # Drops the cached layers and the villa waypoint weights (hojre-based),
+        # and logs the deletions for /api/bootstrap deltas
+        await invalidate_layers(deleted, [layer_change(c, "hojre_vigepligt", deleted=ids) for c, ids in deleted.items()])
     return {"deleted": result.deleted_count}
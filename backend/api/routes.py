@@ -1,111 +1,82 @@
 import random
-import math
+import bisect
+import asyncio
 import logging
-from fastapi import APIRouter, Depends
-import httpx
+import time
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from config import get_settings, Settings
-from db import routes_col, villa_col, hojre_col
+from db import routes_col
+from geo import haversine
+from polyline import decode as decode_polyline, passes_near
+from waypoints import get_villa_table
+from route_pool import route_pool
+from http_client import get_client
+from rate_limit import TokenBucket
+from local_router import get_graph
+from speed_lookup import get_speed_lookup
+from junction_events import get_junction_index
+from centers import Center, center_filter, center_param, default_center_id, get_center
+import metrics
+import profiling
+from responses import dumps, json_response
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-START_ADDRESS = "Vindblæs Alle 2, 2770 Kastrup, Denmark"
-START_LAT = 55.634464
-START_LNG = 12.650135
-
-# E20 motorway waypoints — real driving test checkpoints
-MOTORWAY_EXIT = {"lat": 55.629318, "lng": 12.603788}  # west off-ramp
-TAARNBY_RUNDKOERSEL = {"lat": 55.6180, "lng": 12.6050}  # roundabout after exit — locks route to surface roads
-# Two route variations — via points (pass-through on E20 only)
-MOTORWAY_VIA_A = [
-    {"lat": 55.633517, "lng": 12.656518},   # entry east
-    {"lat": 55.630170, "lng": 12.641366},   # mid checkpoint
-]
-MOTORWAY_VIA_B = [
-    {"lat": 55.630433, "lng": 12.655834},   # entry east
-    {"lat": 55.630201, "lng": 12.628568},   # mid checkpoint
-]
-
-ROUTES_API_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
-
-
-def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Haversine distance in meters between two points."""
-    R = 6371000
-    dLat = math.radians(lat2 - lat1)
-    dLng = math.radians(lng2 - lng1)
-    a = (math.sin(dLat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dLng / 2) ** 2)
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-
-def decode_polyline(encoded: str) -> list[tuple[float, float]]:
-    """Decode a Google encoded polyline into list of (lat, lng) tuples."""
-    points = []
-    index = 0
-    lat = 0
-    lng = 0
-    while index < len(encoded):
-        for is_lng in (False, True):
-            shift = 0
-            result = 0
-            while True:
-                b = ord(encoded[index]) - 63
-                index += 1
-                result |= (b & 0x1F) << shift
-                shift += 5
-                if b < 0x20:
-                    break
-            delta = ~(result >> 1) if result & 1 else result >> 1
-            if is_lng:
-                lng += delta
-            else:
-                lat += delta
-        points.append((lat / 1e5, lng / 1e5))
-    return points
+# Shared by all batch requests in this process so parallel batches
+# together stay under the Google Routes quota
+_routes_bucket: TokenBucket | None = None
+
+
+def routes_bucket(settings: Settings) -> TokenBucket:
+    global _routes_bucket
+    if _routes_bucket is None:
+        _routes_bucket = TokenBucket(settings.ROUTES_RATE_PER_SECOND, capacity=settings.BATCH_CONCURRENCY)
+    return _routes_bucket
+
+
+def _phase_done(phase: str, engine: str, since: float) -> float:
+    """Record a compute_route() phase that began at `since`; returns now, the next phase's start."""
+    now = time.perf_counter()
+    metrics.ROUTE_PHASE.observe(now - since, phase=phase, engine=engine)
+    profiling.record(phase, now - since)
+    return now
 
 
 def polyline_passes_near(encoded: str, target_lat: float, target_lng: float, max_dist_m: float = 500) -> bool:
-    """Check if any point on a decoded polyline is within max_dist_m of target."""
-    for plat, plng in decode_polyline(encoded):
-        if haversine(plat, plng, target_lat, target_lng) < max_dist_m:
-            return True
-    return False
+    """Check if any segment of an encoded polyline comes within max_dist_m of target."""
+    return passes_near(decode_polyline(encoded), target_lat, target_lng, max_dist_m)
 
 
-async def pick_spread_waypoints(count: int, min_dist_between: float = 300, max_dist_from_start: float = 2000) -> list[dict]:
+async def pick_spread_waypoints(count: int, min_dist_between: float = 300, max_dist_from_start: float = 2000,
+                                center_id: str | None = None) -> list[dict]:
     """
     Select villa waypoints, prioritizing villas near højre vigepligt junctions.
     Villas with more H junctions within 300m get picked more often.
+    Weights come precomputed from the villa table, so this is just a few
+    weighted draws without replacement (rejecting villas too close to an
+    already selected one).
     """
-    all_villas = await villa_col.find({}, {"_id": 0, "lat": 1, "lng": 1, "name": 1}).to_list(10000)
-    if not all_villas:
+    table = await get_villa_table(max_dist_from_start, center_id)
+    villas = table["villas"]
+    cum_weights = table["cum_weights"]
+    if not villas:
         return []
-
-    hojre_junctions = await hojre_col.find({}, {"_id": 0, "lat": 1, "lng": 1}).to_list(10000)
-
-    # Only consider villas within range of start
-    nearby = [v for v in all_villas
-              if 200 < haversine(v["lat"], v["lng"], START_LAT, START_LNG) < max_dist_from_start]
-
-    # Score each villa by number of H junctions within 300m
-    for v in nearby:
-        h_count = sum(1 for h in hojre_junctions
-                      if haversine(v["lat"], v["lng"], h["lat"], h["lng"]) < 300)
-        # Weight: villas with H junctions get 5x more likely per junction
-        v["_weight"] = 1 + h_count * 5
-
-    # Weighted shuffle: higher weight = more likely to appear early
-    for v in nearby:
-        v["_sort"] = random.random() ** (1.0 / v["_weight"])
-    nearby.sort(key=lambda v: v["_sort"], reverse=True)
+    total = cum_weights[-1]
 
     selected: list[dict] = []
-    for v in nearby:
-        if len(selected) >= count:
-            break
+    tried: set[int] = set()
+    attempts = 0
+    while len(selected) < count and len(tried) < len(villas) and attempts < count * 50:
+        attempts += 1
+        i = bisect.bisect_right(cum_weights, random.random() * total)
+        if i >= len(villas) or i in tried:
+            continue
+        tried.add(i)
+        v = villas[i]
         too_close = any(
             haversine(v["lat"], v["lng"], s["lat"], s["lng"]) < min_dist_between
             for s in selected
@@ -116,31 +87,36 @@ async def pick_spread_waypoints(count: int, min_dist_between: float = 300, max_d
     return selected
 
 
-@router.get("/generate")
-async def generate_route(
-    include_motorway: bool = True,
-    settings: Settings = Depends(get_settings),
-):
+async def compute_route(include_motorway: bool, settings: Settings, engine: str | None = None,
+                        center: Center | None = None) -> dict:
     """
-    Generate a driving test route (loop) from start address.
-    With or without motorway section.
-    Routes vary each time via random villa waypoints.
-    Target: 25-35 min round trip.
+    Build one driving test route (loop) from `center` (default centre for
+    None) with a live Google Routes call, or with the offline OSM router
+    when engine (default ROUTING_ENGINE) is "local". Centres without a
+    motorway section always get a villa-only route.
+    Returns the /generate response body; nothing is saved.
     """
+    engine = engine or settings.ROUTING_ENGINE
+    center = center or get_center()
+    include_motorway = include_motorway and center.motorway is not None
+    start = center.start
+    phase_start = time.perf_counter()
     if include_motorway:
         # Motorway FIRST (like real driving test), then villa area
         # Start → E20 via → EXIT (stop) → Tårnby rundkørsel (stop) → villa → back
         # Rundkørsel stop anchors the route to surface roads so it NEVER re-enters E20
-        motorway_via = random.choice([MOTORWAY_VIA_A, MOTORWAY_VIA_B])
+        motorway = center.motorway
+        motorway_via = random.choice(motorway["via"])
         motorway_wps = list(motorway_via)  # only these are via (pass-through)
-        post = await pick_spread_waypoints(2)
+        post = await pick_spread_waypoints(2, center_id=center.id)
         villa_wps = post
-        waypoints = motorway_via + [MOTORWAY_EXIT, TAARNBY_RUNDKOERSEL] + post
+        waypoints = motorway_via + [motorway["exit"], motorway["roundabout"]] + post
     else:
         # 3 random villa waypoints creating a residential loop
-        villa_wps = await pick_spread_waypoints(3)
+        villa_wps = await pick_spread_waypoints(3, center_id=center.id)
         motorway_wps = []
         waypoints = villa_wps
+    phase_start = _phase_done("waypoints", engine, phase_start)
 
     intermediate = []
     for wp in waypoints:
@@ -157,12 +133,12 @@ async def generate_route(
     body: dict = {
         "origin": {
             "location": {
-                "latLng": {"latitude": START_LAT, "longitude": START_LNG}
+                "latLng": {"latitude": start["lat"], "longitude": start["lng"]}
             }
         },
         "destination": {
             "location": {
-                "latLng": {"latitude": START_LAT, "longitude": START_LNG}
+                "latLng": {"latitude": start["lat"], "longitude": start["lng"]}
             }
         },
         "intermediates": intermediate,
@@ -178,27 +154,39 @@ async def generate_route(
     # uses surface roads instead of hopping back onto E20.
     body["routeModifiers"] = {"avoidHighways": True}
 
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": settings.G_API_KEY,
-        "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline,routes.legs,routes.legs.steps.navigationInstruction,routes.legs.steps.startLocation,routes.legs.steps.endLocation,routes.legs.steps.localizedValues,routes.legs.steps.polyline,routes.legs.duration,routes.legs.distanceMeters,routes.legs.polyline.encodedPolyline",
-    }
+    if engine == "local":
+        # Same waypoints over the seeded OSM graph; returns computeRoutes JSON
+        graph = await get_graph(center.id)
+        stops = [{"lat": wp["lat"], "lng": wp["lng"], "via": wp in motorway_wps} for wp in waypoints]
+        data = await asyncio.to_thread(graph.route, start, start, stops, True)
+        status_code = 200
+        api_name = "Local router"
+    else:
+        headers = {
+            "Content-Type": "application/json",
+            "X-Goog-Api-Key": settings.G_API_KEY,
+            "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline,routes.legs,routes.legs.steps.navigationInstruction,routes.legs.steps.startLocation,routes.legs.steps.endLocation,routes.legs.steps.localizedValues,routes.legs.steps.polyline,routes.legs.duration,routes.legs.distanceMeters,routes.legs.polyline.encodedPolyline",
+        }
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(ROUTES_API_URL, json=body, headers=headers)
+        resp = await get_client().post(settings.ROUTES_API_URL, json=body, headers=headers)
         data = resp.json()
+        status_code = resp.status_code
+        api_name = "Google API"
+    phase_start = _phase_done("routing", engine, phase_start)
 
-    # Handle Google API errors explicitly
-    if resp.status_code != 200 or "error" in data:
+    # Handle routing errors explicitly
+    if status_code != 200 or "error" in data:
         error_detail = data.get("error", {})
-        error_msg = error_detail.get("message", f"HTTP {resp.status_code}")
-        logger.error("Google Routes API error: %s (body: %s)", error_msg, data)
+        error_msg = error_detail.get("message", f"HTTP {status_code}")
+        logger.error("%s routing error: %s (body: %s)", api_name, error_msg, data)
         return {
-            "start": START_ADDRESS,
+            "start": center.address,
+            "center": center.id,
             "include_motorway": include_motorway,
+            "engine": engine,
             "routes_count": 0,
             "routes": [],
-            "error": f"Google API: {error_msg}",
+            "error": f"{api_name}: {error_msg}",
         }
 
     routes = []
@@ -217,32 +205,139 @@ async def generate_route(
             "polyline": polyline_enc,
             "legs": route.get("legs", []),
             "include_motorway": include_motorway,
+            "center": center.id,
             "within_target": 25 <= duration_minutes <= 40,
         })
 
+    # Attach the speed limit to every step so the client needn't search the layers
+    if routes:
+        try:
+            lookup = await get_speed_lookup(center.id)
+            await asyncio.to_thread(lambda: [lookup.annotate_legs(r["legs"]) for r in routes])
+        except Exception as exc:
+            logger.warning("Speed limit annotation failed: %s", exc)
+        try:
+            junctions = await get_junction_index(center.id)
+            for r in routes:
+                r["junction_events"] = await asyncio.to_thread(
+                    junctions.events_for_legs, r["legs"], r["polyline"])
+        except Exception as exc:
+            logger.warning("Junction event annotation failed: %s", exc)
+        _phase_done("annotate", engine, phase_start)
+
     # Diagnostic: verify the polyline actually passes near the motorway exit
     if include_motorway and routes:
         poly = routes[0].get("polyline", "")
         if poly:
-            near_exit = polyline_passes_near(poly, MOTORWAY_EXIT["lat"], MOTORWAY_EXIT["lng"], 500)
+            exit_ = center.motorway["exit"]
+            near_exit = polyline_passes_near(poly, exit_["lat"], exit_["lng"], 500)
             logger.info("Motorway check: near_exit=%s", near_exit)
             if not near_exit:
                 logger.warning("Route polyline does NOT pass near motorway exit!")
 
-    # Save to MongoDB
-    if routes:
-        await routes_col.insert_many([{**r, "type": "generated"} for r in routes])
-
     return {
-        "start": START_ADDRESS,
+        "start": center.address,
+        "center": center.id,
         "include_motorway": include_motorway,
+        "engine": engine,
         "routes_count": len(routes),
         "routes": routes,
     }
 
 
+@router.get("/generate")
+async def generate_route(
+    include_motorway: bool = True,
+    fresh: bool = False,
+    engine: Literal["google", "local"] | None = None,
+    center: Center = Depends(center_param),
+    settings: Settings = Depends(get_settings),
+):
+    """
+    Generate a driving test route (loop) from the test centre's address.
+    With or without motorway section.
+    Routes vary each time via random villa waypoints.
+    Target: 25-35 min round trip.
+    Served from the pre-generated route pool when possible; fresh=true
+    (or an empty pool) falls back to a live call. engine=local routes over
+    the seeded OSM graph instead of Google; the pool only holds routes from
+    the default ROUTING_ENGINE and the default centre.
+    """
+    use_pool = (not fresh and (engine or settings.ROUTING_ENGINE) == settings.ROUTING_ENGINE
+                and center.id == default_center_id())
+    result = route_pool.pop(include_motorway) if use_pool else None
+    if result is None:
+        result = await compute_route(include_motorway, settings, engine, center)
+        result["source"] = "live"
+    else:
+        result["source"] = "pool"
+
+    # Save to MongoDB
+    routes = result["routes"]
+    if routes:
+        with profiling.phase("save"):
+            await routes_col.insert_many([{**r, "type": "generated"} for r in routes])
+
+    return json_response(result)
+
+
+@router.get("/generate-batch")
+async def generate_route_batch(
+    n: int = Query(10, ge=1),
+    include_motorway: bool = True,
+    engine: Literal["google", "local"] | None = None,
+    center: Center = Depends(center_param),
+    settings: Settings = Depends(get_settings),
+):
+    """
+    Generate n routes concurrently (bounded by BATCH_CONCURRENCY and the
+    ROUTES_RATE_PER_SECOND token bucket) and stream them back as NDJSON,
+    one line per route in completion order. All routes are saved in one
+    bulk write at the end; the last line is a {"done": true} summary.
+    """
+    n = min(n, settings.BATCH_MAX_ROUTES)
+    sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    bucket = routes_bucket(settings)
+
+    async def one(i: int) -> dict:
+        async with sem:
+            await bucket.acquire()
+            try:
+                result = await compute_route(include_motorway, settings, engine, center)
+            except Exception as exc:
+                logger.error("Batch route %d failed: %s", i, exc)
+                result = {"include_motorway": include_motorway, "routes_count": 0,
+                          "routes": [], "error": str(exc)}
+        result["batch_index"] = i
+        return result
+
+    async def stream():
+        tasks = [asyncio.create_task(one(i)) for i in range(n)]
+        generated = []
+        failed = 0
+        try:
+            for fut in asyncio.as_completed(tasks):
+                result = await fut
+                if result["routes"]:
+                    generated.extend(result["routes"])
+                else:
+                    failed += 1
+                yield dumps(result) + b"\n"
+        finally:
+            # Client went away mid-stream: don't keep paying for routes
+            for t in tasks:
+                t.cancel()
+
+        if generated:
+            await routes_col.insert_many([{**r, "type": "generated"} for r in generated])
+        yield dumps({"done": True, "requested": n, "saved": len(generated), "failed": failed}) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/saved")
-async def get_saved_routes():
-    """Get all previously saved routes."""
-    routes = await routes_col.find({}, {"_id": 0}).to_list(100)
-    return {"count": len(routes), "routes": routes}
+async def get_saved_routes(center: str | None = None):
+    """Get all previously saved routes, optionally only one test centre's."""
+    query = center_filter(center) if center else {}
+    routes = await routes_col.find(query, {"_id": 0}).to_list(100)
+    return json_response({"count": len(routes), "routes": routes})
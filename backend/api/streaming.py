@@ -0,0 +1,96 @@
+"""
+Layer responses as Sections (a list in the response and the query filling it),
+read whole by load_sections() or streamed by stream_layer()
+(?stream=ndjson|json on the overpass layer endpoints).
+
+Instead of to_list() and one JSON object, the Motor cursor is read in
+batches of STREAM_BATCH documents and each batch is written out before the
+next is fetched, so per-request memory stays flat however big the layer is,
+and the client can draw the first markers while the rest downloads.
+- ndjson: one document per line (application/x-ndjson); layers with two
+  lists (hojre-vigepligt) tag each line with "layer"
+- json: the same object the endpoint normally returns, as a chunked JSON
+  array per list with the counts at the end
+The snapshot cache (layer_cache.py) isn't involved: a cached whole layer
+is already in memory, streaming is for large or spatially filtered reads.
+"""
+from dataclasses import dataclass
+from typing import AsyncIterator, Literal
+from fastapi.responses import StreamingResponse
+from api.filters import ensure_polylines
+import profiling
+from responses import dumps
+
+STREAM_BATCH = 1000
+
+StreamFormat = Literal["ndjson", "json"]
+
+
+@dataclass
+class Section:
+    """One list in a layer response and the query that fills it."""
+    key: str  # e.g. "roads"
+    count_key: str  # e.g. "count"
+    col: object
+    query: dict
+    projection: dict
+    limit: int
+    # format=polyline roads: fill in polylines missing from older docs
+    polylines: bool = False
+
+
+async def load_sections(sections: list[Section]) -> dict:
+    """The usual response object: every section's count, then its documents."""
+    counts, lists = {}, {}
+    for section in sections:
+        with profiling.phase("mongo"):
+            docs = await section.col.find(section.query, section.projection).to_list(section.limit)
+        if section.polylines:
+            await ensure_polylines(section.col, docs)
+        counts[section.count_key] = len(docs)
+        lists[section.key] = docs
+    return {**counts, **lists}
+
+
+async def _batches(section: Section) -> AsyncIterator[list[dict]]:
+    cursor = section.col.find(section.query, section.projection, batch_size=STREAM_BATCH).limit(section.limit)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= STREAM_BATCH:
+            if section.polylines:
+                await ensure_polylines(section.col, batch)
+            yield batch
+            batch = []
+    if batch:
+        if section.polylines:
+            await ensure_polylines(section.col, batch)
+        yield batch
+
+
+async def _ndjson(sections: list[Section]) -> AsyncIterator[bytes]:
+    tag = len(sections) > 1
+    for section in sections:
+        async for batch in _batches(section):
+            if tag:
+                batch = [{"layer": section.key, **doc} for doc in batch]
+            yield b"\n".join(dumps(doc) for doc in batch) + b"\n"
+
+
+async def _json(sections: list[Section]) -> AsyncIterator[bytes]:
+    counts = {}
+    for i, section in enumerate(sections):
+        yield (b"{" if i == 0 else b",") + dumps(section.key) + b":["
+        n = 0
+        async for batch in _batches(section):
+            yield (b"," if n else b"") + b",".join(dumps(doc) for doc in batch)
+            n += len(batch)
+        yield b"]"
+        counts[section.count_key] = n
+    yield b"," + dumps(counts)[1:]
+
+
+def stream_layer(sections: list[Section], fmt: StreamFormat) -> StreamingResponse:
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson(sections), media_type="application/x-ndjson")
+    return StreamingResponse(_json(sections), media_type="application/json")
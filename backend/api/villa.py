@@ -1,35 +1,40 @@
-import math
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Request
 from db import db
+from geo import haversine
+from layer_cache import layer_response
+from api.filters import LayerParams, ensure_polylines
+from responses import json_response
 
 router = APIRouter()
 
 villa_col = db["villa_streets"]
 
-START_LAT = 55.634464
-START_LNG = 12.650135
 
+# Fields exposed to ?fields= (distance_m is computed, not stored)
+VILLA_FIELDS = {"osm_id", "name", "lat", "lng", "highway_type", "geometry", "distance_m"}
 
-def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Haversine distance in meters."""
-    R = 6371000
-    dLat = math.radians(lat2 - lat1)
-    dLng = math.radians(lng2 - lng1)
-    a = (math.sin(dLat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dLng / 2) ** 2)
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-
-@router.get("/areas")
-async def get_villa_areas():
-    """All villa streets from MongoDB, sorted by distance from start."""
-    streets = await villa_col.find({}, {"_id": 0}).to_list(10000)
+async def _load_villa_areas(params: LayerParams, query: dict | None = None) -> dict:
+    projection = params.projection(VILLA_FIELDS)
+    trim = []
+    if params.fields:
+        # Distance sorting needs the centre point even if it isn't requested
+        trim = [f for f in ("lat", "lng") if f not in params.fields]
+        projection.pop("distance_m", None)
+        projection.update({f: 1 for f in trim})
+    streets = await villa_col.find(params.scoped(query), projection).to_list(10000)
+    if params.format == "polyline" and (not params.fields or "geometry" in params.fields):
+        await ensure_polylines(villa_col, streets)
 
     for s in streets:
-        s["distance_m"] = round(haversine(START_LAT, START_LNG, s["lat"], s["lng"]))
+        s["distance_m"] = round(haversine(params.center.lat, params.center.lng, s["lat"], s["lng"]))
+        for f in trim:
+            del s[f]
 
     streets.sort(key=lambda s: s["distance_m"])
+    if params.fields and "distance_m" not in params.fields:
+        for s in streets:
+            del s["distance_m"]
 
     return {
         "villa_streets_count": len(streets),
@@ -37,3 +42,19 @@ async def get_villa_areas():
         "villa_streets": streets,
         "neighborhoods": [],
     }
+
+
+@router.get("/areas")
+async def get_villa_areas(request: Request, params: LayerParams = Depends()):
+    """
+    Villa streets from MongoDB (optionally within radius/bbox), sorted by distance from the centre's start.
+    fields=name,distance_m gives the list view without any geometry.
+    Not streamable: the distance sort needs every street first.
+    """
+    if params.stream:
+        raise HTTPException(status_code=400, detail="stream is not supported for villa areas")
+    query = params.area("location")
+    if query:
+        return json_response(await _load_villa_areas(params, query))
+    return await layer_response(request, params.center.id, params.cache_key("villa_areas"),
+                                lambda: _load_villa_areas(params))
@@ -0,0 +1,165 @@
+"""
+Benchmark: API endpoints under concurrent load, against local stand-ins (see stand_ins.py).
+By default the app runs in-process (httpx ASGITransport, no sockets) on a
+database seeded from the synthetic town (bench_seed.run_seed), and Google
+Routes calls are answered by the fake upstream, so /generate measures our
+own work. --base-url benchmarks a running API instead: seed its database
+and start it with ROUTES_API_URL pointing at `python bench/stand_ins.py`.
+Reports p50/p95/p99 latency and throughput per endpoint. "memory" Mongo
+(mongomock) has no geo queries, so the bbox cases need --mongo <URI>.
+
+Run from backend/: python bench/bench_api.py [--requests 200] [--concurrency 10] [--only layers,tiles]
+                   [--mongo memory|mongodb://localhost] [--base-url http://localhost:8000]
+                   [--json api.json] [--baseline api.json]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stand_ins  # noqa: E402
+import report  # noqa: E402
+from bench_seed import run_seed  # noqa: E402
+
+
+class Case:
+    def __init__(self, name: str, group: str, method: str, paths: list[str], body: dict | None = None,
+                 geo: bool = False):
+        self.name = name
+        self.group = group
+        self.method = method
+        # Requests cycle through these (e.g. neighbouring tiles)
+        self.paths = paths
+        self.body = body
+        self.geo = geo
+
+    async def call(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.request(self.method, self.paths[i % len(self.paths)], json=self.body)
+
+
+def build_cases(town: stand_ins.Town, upstream: stand_ins.FakeUpstream) -> list[Case]:
+    from centers import get_center
+    from tiles import tile_xy
+    center = get_center()
+    # A loop through three villa-ish stops, as /generate would produce
+    stops = [(center.lat + 0.012, center.lng + 0.01), (center.lat - 0.008, center.lng + 0.02),
+             (center.lat - 0.01, center.lng - 0.015)]
+
+    def ll(lat, lng):
+        return {"location": {"latLng": {"latitude": lat, "longitude": lng}}}
+
+    route = upstream.compute_routes({"origin": ll(center.lat, center.lng), "destination": ll(center.lat, center.lng),
+                                     "intermediates": [ll(*s) for s in stops]})["routes"][0]
+    x, y = (int(v) for v in tile_xy(center.lat, center.lng, 14))
+    tiles = [f"/api/overpass/tiles/14/{x + dx}/{y + dy}" for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    d = 0.01
+    bbox = f"{center.lng - d},{center.lat - d},{center.lng + d},{center.lat + d}"
+
+    return [
+        Case("speed-limits", "layers", "GET", ["/api/overpass/speed-limits"]),
+        Case("speed-limits polyline", "layers", "GET", ["/api/overpass/speed-limits?format=polyline"]),
+        Case("speed-limits bbox", "layers", "GET", [f"/api/overpass/speed-limits?bbox={bbox}"], geo=True),
+        Case("hojre-vigepligt", "layers", "GET", ["/api/overpass/hojre-vigepligt"]),
+        Case("intersections", "layers", "GET", ["/api/overpass/intersections"]),
+        Case("google-speed-limits", "layers", "GET", ["/api/overpass/google-speed-limits"]),
+        Case("villa areas", "layers", "GET", ["/api/villa/areas"]),
+        Case("tiles z14", "tiles", "GET", tiles),
+        Case("speed-lookup", "lookup", "POST", ["/api/overpass/speed-lookup"],
+             {"polyline": route["polyline"]["encodedPolyline"], "step_m": 50}),
+        Case("junction-events", "lookup", "POST", ["/api/overpass/junction-events"],
+             {"legs": route["legs"], "polyline": route["polyline"]["encodedPolyline"]}),
+        Case("generate google", "routes", "GET", ["/api/routes/generate?fresh=true&engine=google"]),
+        Case("generate local", "routes", "GET", ["/api/routes/generate?fresh=true&engine=local"]),
+    ]
+
+
+async def run_case(client: httpx.AsyncClient, case: Case, requests: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        await case.call(client, i)
+    latencies: list[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                resp = await case.call(client, i)
+                failed = resp.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return report.latency_summary(latencies, time.perf_counter() - start, errors)
+
+
+async def bench(args) -> dict[str, dict]:
+    from centers import get_center
+    center = get_center()
+    town = stand_ins.Town(center.lat, center.lng, center.radius_m, spacing_m=args.spacing)
+    upstream = stand_ins.FakeUpstream(town, args.routes_fixtures, args.latency_ms)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        database = stand_ins.install_database(args.mongo)
+        stand_ins.install_upstream(upstream)
+        if args.mongo != "memory":
+            await database.client.drop_database(database.name)
+        print(f"Seeding {town.n}x{town.n} street town...")
+        await run_seed(database, full=True, memory=False)
+        upstream.calls.clear()
+        import main as app_module
+        transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    async with client:
+        for case in build_cases(town, upstream):
+            if only and case.name not in only and case.group not in only:
+                continue
+            if case.geo and args.mongo == "memory" and not args.base_url:
+                print(f"  {case.name}: skipped (needs --mongo <URI>)")
+                continue
+            results[case.name] = await run_case(client, case, args.requests, args.concurrency, args.warmup)
+            print(f"  {case.name}: p95 {results[case.name]['p95_ms']} ms")
+    if upstream.calls:
+        print(f"Stand-in calls during the run: {dict(upstream.calls)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per endpoint first")
+    parser.add_argument("--only", help="comma-separated case names or groups (layers, tiles, lookup, routes)")
+    parser.add_argument("--mongo", default="memory", help='"memory" (mongomock) or a mongodb:// URI')
+    parser.add_argument("--db-name", default="koereprove_bench", help="dropped and reseeded with a URI")
+    parser.add_argument("--base-url", help="benchmark a running API instead of the in-process app")
+    parser.add_argument("--routes-fixtures", help="directory of recorded computeRoutes responses (*.json)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every stand-in response")
+    parser.add_argument("--spacing", type=float, default=120, help="street spacing of the synthetic town (m)")
+    report.add_output_args(parser)
+    args = parser.parse_args()
+
+    stand_ins.configure(args.mongo, args.db_name)
+    results = asyncio.run(bench(args))
+    print()
+    report.print_table(results, ["requests", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rps"])
+    meta = {"target": args.base_url or "in-process", "mongo": "memory" if args.mongo == "memory" else "server",
+            "requests": args.requests, "concurrency": args.concurrency, "spacing": args.spacing}
+    report.finish(args, "api", meta, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: scalar polyline helpers (old routes.py code) vs the NumPy toolkit.
+Builds long synthetic multi-leg loop routes around the test centre.
+
+Run from backend/: python bench/bench_polyline.py [--legs 6] [--points 4000]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import polyline  # noqa: E402
+
+START_LAT = 55.634464
+START_LNG = 12.650135
+MOTORWAY_EXIT = (55.629318, 12.603788)
+
+
+# --- old scalar implementations, kept here as the baseline ---
+
+def scalar_haversine(lat1, lng1, lat2, lng2):
+    R = 6371000
+    dLat = math.radians(lat2 - lat1)
+    dLng = math.radians(lng2 - lng1)
+    a = (math.sin(dLat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dLng / 2) ** 2)
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def scalar_decode(encoded):
+    points = []
+    index = 0
+    lat = 0
+    lng = 0
+    while index < len(encoded):
+        for is_lng in (False, True):
+            shift = 0
+            result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if is_lng:
+                lng += delta
+            else:
+                lat += delta
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+
+def scalar_passes_near(encoded, lat, lng, max_dist_m):
+    for plat, plng in scalar_decode(encoded):
+        if scalar_haversine(plat, plng, lat, lng) < max_dist_m:
+            return True
+    return False
+
+
+def scalar_cumulative(points):
+    out = [0.0]
+    for (a, b), (c, d) in zip(points, points[1:]):
+        out.append(out[-1] + scalar_haversine(a, b, c, d))
+    return out
+
+
+def synthetic_route(legs: int, points_per_leg: int, seed: int = 1) -> str:
+    """Random-walk loop of `legs` legs that never comes near the motorway exit."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.00015, size=(legs * points_per_leg, 2))
+    path = np.cumsum(steps, axis=0)
+    path -= np.linspace(0, 1, len(path))[:, None] * path[-1]  # close the loop
+    path += (START_LAT, START_LNG)
+    return polyline.encode(path)
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legs", type=int, default=6)
+    parser.add_argument("--points", type=int, default=4000, help="points per leg")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    enc = synthetic_route(args.legs, args.points)
+    pts = polyline.decode(enc)
+    pts_list = scalar_decode(enc)
+    print(f"Route: {args.legs} legs, {len(pts)} points, {len(enc)} chars")
+
+    cases = [
+        ("decode", lambda: scalar_decode(enc), lambda: polyline.decode(enc)),
+        ("encode", None, lambda: polyline.encode(pts)),
+        ("passes_near (miss, full scan)",
+         lambda: scalar_passes_near(enc, *MOTORWAY_EXIT, 1),
+         lambda: polyline.passes_near(polyline.decode(enc), *MOTORWAY_EXIT, 1)),
+        ("cumulative distance", lambda: scalar_cumulative(pts_list), lambda: polyline.cumulative_distance(pts)),
+        ("resample 10m", None, lambda: polyline.resample(pts, 10)),
+    ]
+    print(f"{'case':32} {'scalar ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for name, scalar, vec in cases:
+        v = timeit(vec, args.repeat)
+        if scalar is None:
+            print(f"{name:32} {'-':>10} {v:10.2f} {'-':>8}")
+            continue
+        s = timeit(scalar, args.repeat)
+        print(f"{name:32} {s:10.2f} {v:10.2f} {s / v:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
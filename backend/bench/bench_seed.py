@@ -0,0 +1,167 @@
+"""
+Benchmark: the seed phases of seed.py against local stand-ins (see stand_ins.py).
+Overpass and HERE are answered from a synthetic town (or a recorded seed
+response cache with --fixtures), MongoDB is in-process (--mongo memory) or
+a local server. Each phase runs on its own and reports wall time and peak
+Python memory (tracemalloc, NumPy buffers included; --no-memory skips it,
+as tracing slows pure-Python code down); the process max RSS is printed
+at the end. Seeding is in swap mode (seed.py --full) with --mongo memory
+and incremental against a server; --full / --incremental pick one. Every
+mongomock upsert scans the collection, so incremental seeding into
+"memory" grows quadratically with the town and mostly measures mongomock
+(a few thousand documents take minutes). --runs 2 seeds again on top of
+the first run, which in incremental mode measures the reseed where
+nothing changed.
+The HERE phase needs the flexpolyline package to decode the fake spans.
+
+Run from backend/: python bench/bench_seed.py [--mongo memory|mongodb://localhost] [--fixtures .seed_cache]
+                   [--spacing 120] [--full|--incremental] [--runs 2] [--no-memory] [--json seed.json] [--baseline seed.json]
+"""
+import argparse
+import asyncio
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stand_ins  # noqa: E402
+import report  # noqa: E402
+
+# phase -> collection it writes (for the document count)
+PHASE_COLLECTIONS = {
+    "signed_intersections": "signed_intersections",
+    "hojre_vigepligt": "hojre_vigepligt",
+    "speed_limits": "speed_limits",
+    "villa_streets": "villa_streets",
+    "road_graph": "road_ways",
+    "here_speed_limits": "google_speed_limits",
+    "map_tiles": "map_tiles",
+}
+
+
+async def run_seed(database, center: str | None = None, full: bool = False,
+                   quiet: bool = True, memory: bool = True) -> dict[str, dict]:
+    """Every seed phase in turn on `database`; phase -> {wall_s, peak_mb, docs, upstream calls}."""
+    import seed
+    from centers import get_center, center_filter
+    from datasets import bump_dataset_version, read_dataset_version
+
+    seed.db = database
+    seed.CENTER = get_center(center)
+    seed.SEED_MODE = "swap" if full else "incremental"
+    seed._changed.clear()
+    seed._changes.clear()
+    upstream = stand_ins.current_upstream
+    state = {}
+
+    async def map_tiles():
+        await bump_dataset_version(database, [seed.CENTER.id], seed._changes)
+        await seed.seed_map_tiles(await read_dataset_version(database, seed.CENTER.id))
+
+    phases = [
+        ("signed_intersections", lambda: seed.seed_signed_intersections()),
+        ("hojre_vigepligt", lambda: seed.seed_hojre_vigepligt(state["signed_intersections"])),
+        ("speed_limits", lambda: seed.seed_speed_limits()),
+        ("villa_streets", lambda: seed.seed_villa_streets()),
+        ("road_graph", lambda: seed.seed_road_graph()),
+        ("here_speed_limits", lambda: seed.seed_here_speed_limits()),
+        ("map_tiles", map_tiles),
+    ]
+    results = {}
+    for name, phase in phases:
+        # Each phase pays for its own extracts
+        seed.cache._inflight.clear()
+        calls_before = dict(upstream.calls) if upstream else {}
+        gc.collect()
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+            state[name] = await phase()
+        wall = time.perf_counter() - start
+        metrics = {"wall_s": round(wall, 3)}
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            metrics["peak_mb"] = round(peak / 2 ** 20, 1)
+        metrics.update({
+            "docs": await database[PHASE_COLLECTIONS[name]].count_documents(center_filter(seed.CENTER.id)),
+        })
+        if upstream:
+            metrics["upstream"] = sum(upstream.calls.values()) - sum(calls_before.values())
+        results[name] = metrics
+    return results
+
+
+def max_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def bench(args) -> dict[str, dict]:
+    database = stand_ins.install_database(args.mongo)
+    if not args.fixtures:
+        town = stand_ins.town_for(args.center, spacing_m=args.spacing)
+        print(f"Town: {town.n}x{town.n} streets, {len(town.ways)} ways, {len(town.nodes)} nodes")
+        stand_ins.install_upstream(stand_ins.FakeUpstream(town, latency_ms=args.latency_ms))
+    if args.mongo != "memory":
+        await database.client.drop_database(database.name)
+
+    results = {}
+    for run in range(1, args.runs + 1):
+        phases = await run_seed(database, args.center, full=swap_mode(args), quiet=not args.verbose,
+                                memory=not args.no_memory)
+        label = "" if args.runs == 1 else ("cold " if run == 1 else f"reseed{run - 1} ")
+        for name, metrics in phases.items():
+            results[label + name] = metrics
+        results[label + "total"] = {"wall_s": round(sum(m["wall_s"] for m in phases.values()), 3)}
+        if not args.no_memory:
+            results[label + "total"]["peak_mb"] = max(m["peak_mb"] for m in phases.values())
+    return results
+
+
+def swap_mode(args) -> bool:
+    """--full, --incremental, or by default swap for mongomock (see the module docstring)."""
+    return args.full or (args.mongo == "memory" and not args.incremental)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mongo", default="memory", help='"memory" (mongomock) or a mongodb:// URI')
+    parser.add_argument("--db-name", default="koereprove_bench", help="dropped and reseeded with a URI")
+    parser.add_argument("--fixtures", help="recorded seed response cache to replay (SEED_CACHE_DIR layout)")
+    parser.add_argument("--center", help="test centre id (default DEFAULT_CENTER)")
+    parser.add_argument("--spacing", type=float, default=120, help="street spacing of the synthetic town (m)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every stand-in response")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--full", action="store_true", help="swap mode (seed.py --full; default with --mongo memory)")
+    mode.add_argument("--incremental", action="store_true",
+                      help="incremental mode (default with a server; slow under mongomock)")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (cleaner wall times)")
+    parser.add_argument("--verbose", action="store_true", help="show the seed phases' own output")
+    report.add_output_args(parser)
+    args = parser.parse_args()
+
+    stand_ins.configure(args.mongo, args.db_name, args.fixtures)
+    results = asyncio.run(bench(args))
+    print()
+    report.print_table(results, ["wall_s", "peak_mb", "docs", "upstream"])
+    rss = max_rss_mb()
+    if rss is not None:
+        print(f"\nMax RSS: {rss:.0f} MB")
+    meta = {"mongo": "memory" if args.mongo == "memory" else "server", "fixtures": bool(args.fixtures),
+            "spacing": args.spacing, "full": swap_mode(args), "runs": args.runs, "memory": not args.no_memory}
+    report.finish(args, "seed", meta, results)
+
+
+if __name__ == "__main__":
+    main()
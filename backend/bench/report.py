@@ -0,0 +1,90 @@
+"""
+Result tables and baseline comparison for bench_api.py and bench_seed.py.
+
+Results are saved as JSON ({"kind", "meta", "results": {name: metrics}})
+with --json; --baseline compares a run against a saved one and exits
+non-zero when a metric got worse by more than --tolerance, so a benchmark
+run can gate a deploy.
+"""
+import json
+import sys
+import numpy as np
+
+# metric -> smallest absolute change that counts (below it is noise)
+REGRESSION_METRICS = {
+    "p95_ms": 1.0,
+    "p99_ms": 2.0,
+    "wall_s": 0.05,
+    "peak_mb": 1.0,
+}
+
+
+def latency_summary(latencies_s: list[float], wall_s: float, errors: int) -> dict:
+    ms = np.asarray(latencies_s) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(ms.max()), 2) if len(ms) else 0.0,
+        "rps": round(len(ms) / wall_s, 1) if wall_s > 0 else 0.0,
+    }
+
+
+def print_table(results: dict[str, dict], columns: list[str]):
+    width = max([len(name) for name in results] + [8])
+    print(f"{'':{width}} " + " ".join(f"{c:>10}" for c in columns))
+    for name, metrics in results.items():
+        cells = []
+        for c in columns:
+            v = metrics.get(c, "")
+            cells.append(f"{v:>10.2f}" if isinstance(v, float) else f"{v!s:>10}")
+        print(f"{name:{width}} " + " ".join(cells))
+
+
+def save(path: str, kind: str, meta: dict, results: dict[str, dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "meta": meta, "results": results}, f, indent=2)
+    print(f"\nSaved {path}")
+
+
+def compare(path: str, kind: str, results: dict[str, dict], tolerance: float) -> list[str]:
+    """Regressions against the saved run at `path`, one line each."""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("kind") != kind:
+        sys.exit(f"{path} holds {baseline.get('kind')} results, not {kind}")
+    regressions = []
+    for name, metrics in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        for metric, floor in REGRESSION_METRICS.items():
+            if metric not in metrics or metric not in old:
+                continue
+            new_v, old_v = metrics[metric], old[metric]
+            if new_v > old_v * (1 + tolerance) and new_v - old_v > floor:
+                regressions.append(f"{name}: {metric} {old_v} -> {new_v} (+{(new_v / old_v - 1) * 100 if old_v else 100:.0f}%)")
+    return regressions
+
+
+def finish(args, kind: str, meta: dict, results: dict[str, dict]):
+    """--json / --baseline handling shared by the bench scripts."""
+    if args.json:
+        save(args.json, kind, meta, results)
+    if args.baseline:
+        regressions = compare(args.baseline, kind, results, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+def add_output_args(parser):
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --json; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs the baseline (0.2 = 20%%)")
@@ -0,0 +1,423 @@
+"""
+Local stand-ins for the services the API and the seed scripts talk to, so
+they can be benchmarked without Google, HERE, Overpass or MongoDB Atlas.
+
+- configure(): environment for a benchmark run (dummy API keys, a separate
+  DB_NAME, no route pool, no HERE rate limit). Call it before importing any
+  backend module: the settings are read once.
+- install_database(): "memory" swaps db.py's collections for an in-process
+  mongomock database (pip install mongomock-motor); a mongodb:// URI uses
+  that server instead.
+- Town: a synthetic, deterministic street grid around a test centre
+  (residential blocks, tertiary/primary arterials, signals, give-way and
+  stop signs, footways), big enough to exercise every seed phase.
+- FakeUpstream: an httpx transport answering Overpass queries (a small
+  evaluator over the Town), HERE routes and Google computeRoutes (recorded
+  responses from a directory, or routes along the Town's streets).
+  install_upstream() puts it behind http_client.get_client().
+
+Standalone fake Routes API for benchmarking an API running elsewhere
+(start that API with ROUTES_API_URL=http://127.0.0.1:8099/directions/v2:computeRoutes):
+  python bench/stand_ins.py --port 8099 [--routes-fixtures DIR]
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qs
+import httpx
+import numpy as np
+
+BACKEND = Path(__file__).resolve().parent.parent
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+M_PER_DEG_LAT = 111320
+
+# Filled in by install_database("memory") / install_upstream()
+memory_client = None
+current_upstream = None
+
+
+def configure(mongo: str = "memory", db_name: str = "koereprove_bench", fixtures: str | None = None):
+    """Benchmark environment; `fixtures` replays a recorded seed response cache instead of the Town."""
+    os.environ.setdefault("G_API_KEY", "bench")
+    os.environ.setdefault("HERE_API_KEY", "bench")
+    os.environ["MONGODB_URI"] = "mongodb://localhost:27017" if mongo == "memory" else mongo
+    os.environ["DB_NAME"] = db_name
+    os.environ["ROUTE_POOL_SIZE"] = "0"
+    os.environ["HERE_RATE_PER_SECOND"] = "1000"
+    if fixtures:
+        os.environ["SEED_CACHE_MODE"] = "offline"
+        os.environ["SEED_CACHE_DIR"] = str(Path(fixtures).resolve())
+    else:
+        os.environ["SEED_CACHE_MODE"] = "off"
+
+
+def install_database(mongo: str = "memory"):
+    """The database the API modules use (patched in for "memory")."""
+    global memory_client
+    import db as db_module
+    if mongo != "memory":
+        return db_module.db
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--mongo memory needs mongomock-motor (pip install mongomock-motor), or pass a mongodb:// URI")
+    memory_client = AsyncMongoMockClient()
+    database = memory_client[db_module.settings.DB_NAME]
+    db_module.client = memory_client
+    db_module.db = database
+    for name, value in list(vars(db_module).items()):
+        if name.endswith("_col"):
+            setattr(db_module, name, database[value.name])
+    return database
+
+
+# --- synthetic town ---------------------------------------------------------
+
+class Town:
+    """
+    Square grid of streets `spacing_m` apart covering the centre's seed
+    radius. Every 16th street is primary (60), every 8th tertiary (50), the
+    rest residential, every 5th of those a signed 30 zone. Junction nodes
+    plus one mid-block node per block; ways span BLOCKS_PER_WAY blocks.
+    """
+    BLOCKS_PER_WAY = 4
+
+    def __init__(self, lat: float, lng: float, radius_m: float, spacing_m: float = 120, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        n = int(2 * radius_m / spacing_m) + 1
+        self.n = n
+        offsets = (np.arange(n) - n // 2) * spacing_m
+        self.rows = lat + offsets / M_PER_DEG_LAT
+        self.cols = lng + offsets / (M_PER_DEG_LAT * math.cos(math.radians(lat)))
+        self.kinds = [self._kind(k) for k in range(n)]
+
+        # id -> (lat, lng, tags)
+        self.nodes: dict[int, tuple[float, float, dict]] = {}
+        for i in range(n):
+            for j in range(n):
+                self.nodes[self.junction(i, j)] = (float(self.rows[i]), float(self.cols[j]),
+                                                   self._junction_tags(i, j, rng))
+                if j + 1 < n:
+                    self.nodes[self._mid(0, i, j)] = (float(self.rows[i]), float(self.cols[j:j + 2].mean()), {})
+                if i + 1 < n:
+                    self.nodes[self._mid(1, i, j)] = (float(self.rows[i:i + 2].mean()), float(self.cols[j]), {})
+
+        self.ways: list[dict] = []
+        for k in range(n):
+            for start in range(0, n - 1, self.BLOCKS_PER_WAY):
+                end = min(start + self.BLOCKS_PER_WAY, n - 1)
+                self._street(0, k, start, end, rng)
+                self._street(1, k, start, end, rng)
+        # Footpaths cutting diagonally across some blocks
+        for i in range(n - 1):
+            for j in range(n - 1):
+                if rng.random() < 0.03:
+                    self._add_way([self.junction(i, j), self.junction(i + 1, j + 1)], {"highway": "footway"})
+
+    @staticmethod
+    def _kind(k: int) -> tuple[str, str]:
+        if k % 16 == 0:
+            return "primary", "60"
+        if k % 8 == 0:
+            return "tertiary", "50"
+        return "residential", "30" if k % 5 == 0 else ""
+
+    def junction(self, i: int, j: int) -> int:
+        return 1 + i * self.n + j
+
+    def _mid(self, axis: int, i: int, j: int) -> int:
+        return 1 + (1 + axis) * self.n * self.n + i * self.n + j
+
+    def _junction_tags(self, i: int, j: int, rng) -> dict:
+        a, b = self.kinds[i][0], self.kinds[j][0]
+        if a != "residential" and b != "residential":
+            return {"highway": "traffic_signals"}
+        if a != b:
+            roll = rng.random()
+            return {"highway": "give_way"} if roll < 0.7 else {"highway": "stop"} if roll < 0.8 else {}
+        if rng.random() < 0.02:
+            return {"highway": "crossing", "crossing": "uncontrolled"}
+        return {}
+
+    def _street(self, axis: int, k: int, start: int, end: int, rng):
+        """Way along row k (axis 0) or column k (axis 1) from block `start` to `end`."""
+        nodes = []
+        for m in range(start, end + 1):
+            i, j = (k, m) if axis == 0 else (m, k)
+            nodes.append(self.junction(i, j))
+            if m < end:
+                nodes.append(self._mid(axis, i, j))
+        highway, maxspeed = self.kinds[k]
+        tags = {"highway": highway, "name": f"{'Vej' if axis == 0 else 'Allé'} {k}"}
+        if maxspeed:
+            tags["maxspeed"] = maxspeed
+        if highway == "residential":
+            if rng.random() < 0.1:
+                tags["sidewalk"] = "both"
+            if rng.random() < 0.02:
+                tags["surface"] = "sett"
+        self._add_way(nodes, tags)
+
+    def _add_way(self, nodes: list[int], tags: dict):
+        self.ways.append({"id": 10_000_000 + len(self.ways), "nodes": nodes, "tags": tags})
+
+    def speed_at(self, i: int, j: int, axis: int) -> int:
+        """km/h on the street through junction (i, j) along `axis`."""
+        _, maxspeed = self.kinds[i if axis == 0 else j]
+        return int(maxspeed or 50)
+
+    def _index(self, lat: float, lng: float) -> tuple[int, int]:
+        return int(np.abs(self.rows - lat).argmin()), int(np.abs(self.cols - lng).argmin())
+
+    def path(self, a: tuple[float, float], b: tuple[float, float]) -> list[tuple[float, float, int]]:
+        """Street path from a to b: along a's row, then b's column; (lat, lng, km/h) per node."""
+        (i0, j0), (i1, j1) = self._index(*a), self._index(*b)
+        out = []
+        step = 1 if j1 >= j0 else -1
+        for j in range(j0, j1, step):
+            out.append((self.rows[i0], self.cols[j], self.speed_at(i0, j, 0)))
+            mid = self.nodes[self._mid(0, i0, min(j, j + step))]
+            out.append((mid[0], mid[1], self.speed_at(i0, j, 0)))
+        step = 1 if i1 >= i0 else -1
+        for i in range(i0, i1, step):
+            out.append((self.rows[i], self.cols[j1], self.speed_at(i, j1, 1)))
+            mid = self.nodes[self._mid(1, min(i, i + step), j1)]
+            out.append((mid[0], mid[1], self.speed_at(i, j1, 1)))
+        out.append((self.rows[i1], self.cols[j1], self.speed_at(i1, j1, 0)))
+        return [(float(la), float(ln), s) for la, ln, s in out]
+
+    # Overpass QL, just the subset seed.py uses
+
+    _STATEMENT = re.compile(r"\b(node|way)((?:\[[^\]]*\])*)\(([^)]*)\)")
+    _FILTER = re.compile(r'\["([^"]+)"(?:(=|!=|~|!~)"([^"]*)")?\]')
+
+    @staticmethod
+    def _matches(tags: dict, filters: list[tuple[str, str, str]]) -> bool:
+        for key, op, value in filters:
+            v = tags.get(key)
+            if not op:
+                ok = v is not None
+            elif op == "=":
+                ok = v == value
+            elif op == "!=":
+                ok = v != value
+            elif op == "~":
+                ok = v is not None and re.search(value, v) is not None
+            else:
+                ok = v is None or re.search(value, v) is None
+            if not ok:
+                return False
+        return True
+
+    def _node_element(self, node_id: int) -> dict:
+        lat, lng, tags = self.nodes[node_id]
+        el = {"type": "node", "id": node_id, "lat": lat, "lon": lng}
+        if tags:
+            el["tags"] = tags
+        return el
+
+    def overpass(self, query: str) -> dict:
+        """Elements for an Overpass query; area clauses are ignored (the Town is the area)."""
+        geom = re.search(r"out\s+body\s+geom", query) is not None
+        ways: dict[int, dict] = {}
+        nodes: dict[int, None] = {}
+        for kind, filter_text, arg in self._STATEMENT.findall(query):
+            filters = self._FILTER.findall(filter_text)
+            if kind == "node" and arg.strip() == "w":
+                # node(w): the nodes of the ways selected so far replace the result
+                nodes = dict.fromkeys(n for w in ways.values() for n in w["nodes"])
+                ways = {}
+            elif kind == "way":
+                ways.update((w["id"], w) for w in self.ways if self._matches(w["tags"], filters))
+            else:
+                nodes.update((nid, None) for nid, (_, _, tags) in self.nodes.items()
+                             if filters and self._matches(tags, filters))
+        elements = [self._node_element(nid) for nid in nodes]
+        for w in ways.values():
+            el = {"type": "way", "id": w["id"], "nodes": w["nodes"], "tags": w["tags"]}
+            if geom:
+                el["geometry"] = [{"lat": self.nodes[n][0], "lon": self.nodes[n][1]} for n in w["nodes"]]
+            elements.append(el)
+        return {"version": 0.6, "elements": elements}
+
+
+# --- fake upstream services --------------------------------------------------
+
+_FLEX_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def _flex_unsigned(value: int) -> str:
+    out = []
+    while value > 0x1F:
+        out.append(_FLEX_ALPHABET[(value & 0x1F) | 0x20])
+        value >>= 5
+    out.append(_FLEX_ALPHABET[value])
+    return "".join(out)
+
+
+def flexpolyline_encode(points: list[tuple[float, float]], precision: int = 5) -> str:
+    """HERE flexible polyline (2D), as returned by the Routing API."""
+    out = [_flex_unsigned(1), _flex_unsigned(precision)]
+    factor = 10 ** precision
+    last = [0, 0]
+    for point in points:
+        for k in range(2):
+            value = round(point[k] * factor)
+            delta = value - last[k]
+            last[k] = value
+            zigzag = delta << 1
+            out.append(_flex_unsigned(~zigzag if delta < 0 else zigzag))
+    return "".join(out)
+
+
+def _densify(path: list[tuple[float, float, int]], step_m: float = 20) -> list[tuple[float, float, int]]:
+    """Extra vertices every ~step_m, like a real route polyline."""
+    out = []
+    for (la0, ln0, s), (la1, ln1, _) in zip(path, path[1:]):
+        dist = math.hypot((la1 - la0) * M_PER_DEG_LAT,
+                          (ln1 - ln0) * M_PER_DEG_LAT * math.cos(math.radians(la0)))
+        parts = max(1, int(dist // step_m))
+        out.extend((la0 + (la1 - la0) * t / parts, ln0 + (ln1 - ln0) * t / parts, s) for t in range(parts))
+    out.append(path[-1])
+    return out
+
+
+class FakeUpstream:
+    """httpx handler for Overpass (any mirror), HERE routes and Google computeRoutes."""
+
+    def __init__(self, town: Town, routes_fixtures: str | None = None, latency_ms: float = 0):
+        self.town = town
+        self.latency = latency_ms / 1000
+        self.calls: Counter = Counter()
+        self.recorded = []
+        if routes_fixtures:
+            for path in sorted(Path(routes_fixtures).glob("*.json")):
+                self.recorded.append(json.loads(path.read_text(encoding="utf-8")))
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.url.path.endswith("/interpreter"):
+            self.calls["overpass"] += 1
+            query = parse_qs(request.content.decode("utf-8")).get("data", [""])[0]
+            return httpx.Response(200, json=await asyncio.to_thread(self.town.overpass, query))
+        if request.url.host == "router.hereapi.com":
+            self.calls["here"] += 1
+            return httpx.Response(200, json=self.here(request.url.params))
+        if request.url.path.endswith(":computeRoutes"):
+            self.calls["routes"] += 1
+            return httpx.Response(200, json=self.compute_routes(json.loads(request.content)))
+        return httpx.Response(404, json={"error": f"no stand-in for {request.url}"})
+
+    def here(self, params) -> dict:
+        origin = tuple(float(v) for v in params["origin"].split(","))
+        dest = tuple(float(v) for v in params["destination"].split(","))
+        path = _densify(self.town.path(origin, dest))
+        spans = []
+        for offset, (_, _, speed) in enumerate(path):
+            if not spans or spans[-1]["speedLimit"] != round(speed / 3.6, 2):
+                spans.append({"offset": offset, "speedLimit": round(speed / 3.6, 2)})
+        return {"routes": [{"sections": [{
+            "polyline": flexpolyline_encode([(la, ln) for la, ln, _ in path]), "spans": spans}]}]}
+
+    def compute_routes(self, body: dict) -> dict:
+        """A recorded response (round-robin), else a loop along the Town's streets through the waypoints."""
+        if self.recorded:
+            return self.recorded[self.calls["routes"] % len(self.recorded)]
+        import polyline
+
+        def latlng(wp: dict) -> tuple[float, float]:
+            ll = wp["location"]["latLng"]
+            return ll["latitude"], ll["longitude"]
+
+        stops = [latlng(body["origin"])] + [latlng(w) for w in body.get("intermediates", [])] + [latlng(body["destination"])]
+        legs, all_pts, total_m, total_s = [], [], 0.0, 0.0
+        for a, b in zip(stops, stops[1:]):
+            path = _densify(self.town.path(a, b))
+            pts = np.array([(la, ln) for la, ln, _ in path])
+            along = polyline.cumulative_distance(pts)
+            speeds = np.array([s for _, _, s in path], dtype=np.float64)
+            seconds = float(np.sum(np.diff(along) / (speeds[:-1] / 3.6))) if len(pts) > 1 else 0.0
+            # One step per ~250 m
+            cuts = np.unique(np.searchsorted(along, np.arange(0, along[-1], 250)).tolist() + [len(pts) - 1])
+            steps = []
+            for s0, s1 in zip(cuts, cuts[1:]):
+                seg = pts[s0:s1 + 1]
+                steps.append({
+                    "distanceMeters": int(along[s1] - along[s0]),
+                    "polyline": {"encodedPolyline": polyline.encode(seg)},
+                    "startLocation": {"latLng": {"latitude": seg[0][0], "longitude": seg[0][1]}},
+                    "endLocation": {"latLng": {"latitude": seg[-1][0], "longitude": seg[-1][1]}},
+                    "navigationInstruction": {"maneuver": "STRAIGHT", "instructions": "Fortsæt ligeud"},
+                    "localizedValues": {"distance": {"text": f"{int(along[s1] - along[s0])} m"}},
+                })
+            legs.append({
+                "distanceMeters": int(along[-1]),
+                "duration": f"{int(seconds)}s",
+                "polyline": {"encodedPolyline": polyline.encode(pts)},
+                "steps": steps,
+            })
+            all_pts.append(pts)
+            total_m += float(along[-1])
+            total_s += seconds
+        return {"routes": [{
+            "distanceMeters": int(total_m),
+            "duration": f"{int(total_s)}s",
+            "polyline": {"encodedPolyline": polyline.encode(np.concatenate(all_pts))},
+            "legs": legs,
+        }]}
+
+
+def town_for(center_id: str | None = None, spacing_m: float = 120) -> Town:
+    from centers import get_center
+    center = get_center(center_id)
+    return Town(center.lat, center.lng, center.radius_m, spacing_m=spacing_m)
+
+
+def install_upstream(upstream: FakeUpstream):
+    """Route http_client.get_client() (API and seed scripts) to the stand-ins."""
+    global current_upstream
+    import http_client
+    current_upstream = upstream
+    # Through the real per-host transport, so /metrics sees the stand-in calls as upstream ones
+    transport = http_client.HostLimitedTransport(httpx.MockTransport(upstream),
+                                                 per_host=http_client.get_settings().HTTP_MAX_PER_HOST)
+    http_client._client = httpx.AsyncClient(transport=transport)
+
+
+def routes_app(upstream: FakeUpstream):
+    """ASGI app serving the fake computeRoutes endpoint."""
+    from fastapi import FastAPI, Request
+
+    app = FastAPI(title="Fake Google Routes API")
+
+    @app.post("/directions/v2:computeRoutes")
+    async def compute_routes(request: Request):
+        upstream.calls["routes"] += 1
+        if upstream.latency:
+            await asyncio.sleep(upstream.latency)
+        return upstream.compute_routes(await request.json())
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Google Routes API for benchmarks")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--routes-fixtures", help="directory of recorded computeRoutes responses (*.json)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--spacing", type=float, default=120, help="street spacing of the synthetic town (m)")
+    args = parser.parse_args()
+    configure()
+    upstream = FakeUpstream(town_for(spacing_m=args.spacing), args.routes_fixtures, args.latency_ms)
+    uvicorn.run(routes_app(upstream), host="127.0.0.1", port=args.port)
@@ -0,0 +1,78 @@
+"""
+Driving-test centres served by this deployment.
+
+Each centre has its start point, the radius its layers are seeded for and,
+optionally, the motorway section used by include_motorway routes. Seeded
+documents carry a `center` field (first key of the layer indexes), and the
+API's per-dataset caches are keyed by centre, so adding a centre adds its
+own data without touching the others.
+Documents seeded before centres existed have no `center` field; they
+belong to the default centre (see center_filter()).
+"""
+from fastapi import HTTPException, Query
+from config import get_settings
+
+
+class Center:
+    def __init__(self, id: str, name: str, address: str, lat: float, lng: float,
+                 radius_m: float = 4000, motorway: dict | None = None):
+        self.id = id
+        self.name = name
+        self.address = address
+        self.lat = lat
+        self.lng = lng
+        self.radius_m = radius_m
+        # {"exit", "roundabout", "via": [[...], [...]]} or None (no motorway routes)
+        self.motorway = motorway
+
+    @property
+    def start(self) -> dict:
+        return {"lat": self.lat, "lng": self.lng}
+
+    def summary(self) -> dict:
+        return {"id": self.id, "name": self.name, "address": self.address, "lat": self.lat,
+                "lng": self.lng, "radius_m": self.radius_m, "motorway": self.motorway is not None}
+
+
+CENTERS: dict[str, Center] = {c.id: c for c in [
+    Center(
+        "amager", "Køreprøve Amager", "Vindblæs Alle 2, 2770 Kastrup, Denmark",
+        55.634464, 12.650135, radius_m=4000,
+        motorway={
+            # E20 motorway waypoints — real driving test checkpoints
+            "exit": {"lat": 55.629318, "lng": 12.603788},  # west off-ramp
+            "roundabout": {"lat": 55.6180, "lng": 12.6050},  # Tårnby rundkørsel — locks route to surface roads
+            # Two route variations — via points (pass-through on E20 only)
+            "via": [
+                [{"lat": 55.633517, "lng": 12.656518},   # entry east
+                 {"lat": 55.630170, "lng": 12.641366}],  # mid checkpoint
+                [{"lat": 55.630433, "lng": 12.655834},   # entry east
+                 {"lat": 55.630201, "lng": 12.628568}],  # mid checkpoint
+            ],
+        },
+    ),
+]}
+
+
+def default_center_id() -> str:
+    return get_settings().DEFAULT_CENTER
+
+
+def get_center(center_id: str | None = None) -> Center:
+    """Centre by id (default centre for None); KeyError if unknown."""
+    return CENTERS[center_id or default_center_id()]
+
+
+def center_filter(center_id: str) -> dict:
+    """Mongo filter for a centre's documents (the default centre also owns untagged ones)."""
+    if center_id == default_center_id():
+        return {"center": {"$in": [center_id, None]}}
+    return {"center": center_id}
+
+
+def center_param(center: str | None = Query(None, description="Test centre id (GET /api/centers)")) -> Center:
+    """FastAPI dependency: the requested centre, 404 if unknown."""
+    try:
+        return get_center(center)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown test centre: {center}")
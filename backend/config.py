@@ -8,6 +8,47 @@ class Settings(BaseSettings):
     DB_NAME: str = "Koereprove"
     FRONTEND_URL: str = "http://localhost:5173"
     HERE_API_KEY: str = ""
+    # Test centre used when a request or seed run doesn't name one (centers.py)
+    DEFAULT_CENTER: str = "amager"
+    # Default /api/routes/generate backend: "google" or "local" (offline OSM graph)
+    ROUTING_ENGINE: str = "google"
+    # Google Routes endpoint (bench/stand_ins.py serves a fake one for benchmarks)
+    ROUTES_API_URL: str = "https://routes.googleapis.com/directions/v2:computeRoutes"
+    # How often the API re-reads the dataset version written by seeding
+    LAYER_VERSION_CHECK_SECONDS: float = 30
+    # GET /metrics (Prometheus text format) and the instrumentation behind it
+    METRICS_ENABLED: bool = True
+    # Per-request profiling with ?profile=1 / X-Profile: 1 (profiling.py); off in production
+    PROFILING_ENABLED: bool = False
+    PROFILE_DIR: str = ".profiles"
+    PROFILE_KEEP: int = 50
+    PROFILE_INTERVAL_SECONDS: float = 0.001
+    # Pre-generated routes kept per motorway variant. Opt-in: while enabled every
+    # process keeps paying for Routes calls to replace expired routes, used or not
+    ROUTE_POOL_SIZE: int = 0
+    ROUTE_POOL_MAX_AGE_SECONDS: float = 900
+    # Shared outbound HTTP client (Google / HERE / Overpass)
+    HTTP_TIMEOUT_SECONDS: float = 30
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 10
+    OVERPASS_TIMEOUT_SECONDS: float = 120
+    HTTP_MAX_CONNECTIONS: int = 40
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_SECONDS: float = 60
+    HTTP_MAX_PER_HOST: int = 10
+    HTTP2_ENABLED: bool = True
+    # /api/routes/generate-batch
+    BATCH_MAX_ROUTES: int = 50
+    BATCH_CONCURRENCY: int = 5
+    ROUTES_RATE_PER_SECOND: float = 5
+    # Seed scripts' Overpass/HERE response cache: "use", "refresh", "offline" or "off"
+    SEED_CACHE_MODE: str = "use"
+    SEED_CACHE_DIR: str = ".seed_cache"
+    SEED_CACHE_TTL_SECONDS: float = 24 * 3600
+    # HERE speed-limit harvesting in seed.py
+    HERE_DIRECTIONS: int = 24
+    HERE_CONCURRENCY: int = 6
+    HERE_RATE_PER_SECOND: float = 5
+    HERE_MAX_RETRIES: int = 4
 
     class Config:
         env_file = ("../.env", ".env")
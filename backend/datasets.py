@@ -0,0 +1,87 @@
+"""
+Dataset version shared by the seed scripts and the API.
+
+Every reseed and every bulk edit bumps a single counter in the
+`dataset_meta` collection, which the API polls to notice changes.
+Each test centre also has its own counter ("layers:<centre>"), bumped
+together with the global one when that centre's data changes; cached
+layer snapshots, in-memory indexes and stored map tiles are tagged with
+it, so reseeding one centre leaves the other centres' caches valid.
+A bump can carry the layer changes behind it (layer_change()); they are
+logged in `dataset_changes` under the centre version they land in, which
+is what /api/bootstrap sends a client holding an older version token.
+Takes the database as an argument so the seed scripts can use their own client.
+"""
+from pymongo import ReturnDocument
+
+META_COLLECTION = "dataset_meta"
+LAYERS_DOC_ID = "layers"
+CHANGES_COLLECTION = "dataset_changes"
+# Centre versions kept in the change log; older tokens get everything again
+CHANGE_LOG_VERSIONS = 100
+# Keys per change log document (a reseed can touch tens of thousands)
+CHANGE_KEYS_PER_DOC = 10000
+
+
+def _doc_id(center: str | None) -> str:
+    return LAYERS_DOC_ID if center is None else f"{LAYERS_DOC_ID}:{center}"
+
+
+async def read_dataset_version(database, center: str | None = None) -> int:
+    """Global dataset version, or one centre's."""
+    doc = await database[META_COLLECTION].find_one({"_id": _doc_id(center)})
+    return int(doc["version"]) if doc else 0
+
+
+async def _bump(database, doc_id: str) -> int:
+    doc = await database[META_COLLECTION].find_one_and_update(
+        {"_id": doc_id},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["version"])
+
+
+def layer_change(center: str, layer: str, upserted=(), deleted=(), reset: bool = False) -> dict:
+    """One layer's part of a bump: keys written and removed, or reset=True for "reload it all"."""
+    return {"center": center, "layer": layer, "upserted": list(upserted), "deleted": list(deleted), "reset": reset}
+
+
+async def _log_changes(database, center: str, version: int, changes: list[dict]):
+    col = database[CHANGES_COLLECTION]
+    docs = []
+    for change in changes:
+        upserted, deleted = change["upserted"], change["deleted"]
+        for i in range(0, max(len(upserted), len(deleted), 1), CHANGE_KEYS_PER_DOC):
+            docs.append({"center": center, "version": version, "layer": change["layer"], "reset": change["reset"],
+                         "upserted": upserted[i:i + CHANGE_KEYS_PER_DOC],
+                         "deleted": deleted[i:i + CHANGE_KEYS_PER_DOC]})
+    if docs:
+        await col.insert_many(docs)
+    await col.delete_many({"center": center, "version": {"$lte": version - CHANGE_LOG_VERSIONS}})
+    await col.create_index([("center", 1), ("version", 1)])
+
+
+async def bump_dataset_version(database, centers: list[str] = (), changes: list[dict] = ()) -> int:
+    """
+    Increment the versions of the changed `centers`, then the global one; returns the global value.
+    `changes` are logged before the bump, so whoever reads the new version
+    finds its changes (reading them one version early only repeats them).
+    """
+    for center in centers:
+        own = [c for c in changes if c["center"] == center]
+        if own:
+            await _log_changes(database, center, await read_dataset_version(database, center) + 1, own)
+        await _bump(database, _doc_id(center))
+    return await _bump(database, LAYERS_DOC_ID)
+
+
+async def read_changes(database, center: str, since: int) -> list[dict] | None:
+    """Logged changes after centre version `since`, oldest first; None when the log no longer reaches back that far."""
+    current = await read_dataset_version(database, center)
+    if since > current or since < current - CHANGE_LOG_VERSIONS:
+        return None
+    return await database[CHANGES_COLLECTION].find(
+        {"center": center, "version": {"$gt": since}}, {"_id": 0},
+    ).sort("version", 1).to_list(None)
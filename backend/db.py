@@ -1,8 +1,12 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import get_settings
+import metrics
 
 settings = get_settings()
-client = AsyncIOMotorClient(settings.MONGODB_URI)
+client = AsyncIOMotorClient(
+    settings.MONGODB_URI,
+    event_listeners=[metrics.MongoCommandListener()] if settings.METRICS_ENABLED else [],
+)
 db = client[settings.DB_NAME]
 
 # Collections
@@ -11,3 +15,15 @@ villa_col = db["villa_streets"]
 hojre_col = db["hojre_vigepligt"]
 routes_col = db["routes"]
 google_speed_col = db["google_speed_limits"]
+road_ways_col = db["road_ways"]
+map_tiles_col = db["map_tiles"]
+
+# Internal fields (GeoJSON for 2dsphere indexes, centre partition key) that API responses leave out
+LAYER_PROJECTION = {"_id": 0, "location": 0, "path": 0, "center": 0}
+
+
+async def _collection_sizes():
+    for name in await db.list_collection_names():
+        metrics.MONGO_COLLECTION_DOCS.set(await db[name].estimated_document_count(), collection=name)
+
+metrics.register_collector(_collection_sizes)
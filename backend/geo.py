@@ -0,0 +1,118 @@
+import math
+
+EARTH_RADIUS_M = 6371000
+# Metres per degree of latitude (good enough for a few km around Amager)
+M_PER_DEG_LAT = 111320
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Haversine distance in meters between two points."""
+    dLat = math.radians(lat2 - lat1)
+    dLng = math.radians(lng2 - lng1)
+    a = (math.sin(dLat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dLng / 2) ** 2)
+    return EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GridIndex:
+    """
+    Uniform grid over (lat, lng) points for radius queries.
+    Cells are `cell_m` metres square, so a query only has to look at the
+    handful of cells around the query point instead of every point.
+    """
+
+    def __init__(self, points: list[dict], cell_m: float = 300, ref_lat: float | None = None):
+        self.points = points
+        self.cell_m = cell_m
+        if ref_lat is None:
+            ref_lat = sum(p["lat"] for p in points) / len(points) if points else 0.0
+        self._deg_lat = cell_m / M_PER_DEG_LAT
+        self._deg_lng = cell_m / (M_PER_DEG_LAT * math.cos(math.radians(ref_lat)))
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        for i, p in enumerate(points):
+            self._cells.setdefault(self._cell(p["lat"], p["lng"]), []).append(i)
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return int(math.floor(lat / self._deg_lat)), int(math.floor(lng / self._deg_lng))
+
+    def within(self, lat: float, lng: float, radius_m: float) -> list[dict]:
+        """All points within radius_m of (lat, lng)."""
+        ci, cj = self._cell(lat, lng)
+        reach = int(math.ceil(radius_m / self.cell_m))
+        found = []
+        for i in range(ci - reach, ci + reach + 1):
+            for j in range(cj - reach, cj + reach + 1):
+                for idx in self._cells.get((i, j), ()):
+                    p = self.points[idx]
+                    if haversine(lat, lng, p["lat"], p["lng"]) < radius_m:
+                        found.append(p)
+        return found
+
+    def count_within(self, lat: float, lng: float, radius_m: float) -> int:
+        return len(self.within(lat, lng, radius_m))
+
+    def nearest(self, lat: float, lng: float, max_m: float) -> tuple[dict, float] | None:
+        """Closest point within max_m and its distance, or None."""
+        best = None
+        best_d = max_m
+        for p in self.within(lat, lng, max_m):
+            d = haversine(lat, lng, p["lat"], p["lng"])
+            if d < best_d:
+                best, best_d = p, d
+        return (best, best_d) if best is not None else None
+
+
+# --- GeoJSON helpers (MongoDB 2dsphere) ---
+
+def geo_point(lat: float, lng: float) -> dict:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def geo_line(points: list[dict]) -> dict | None:
+    """LineString from [{"lat", "lng"}]; None if it has fewer than 2 distinct vertices."""
+    coords = []
+    for p in points:
+        c = [p["lng"], p["lat"]]
+        if not coords or coords[-1] != c:
+            coords.append(c)
+    if len(coords) < 2:
+        return None
+    return {"type": "LineString", "coordinates": coords}
+
+
+def parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    """Parse "minLng,minLat,maxLng,maxLat" (west,south,east,north)."""
+    parts = [float(x) for x in bbox.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    w, s, e, n = parts
+    if w >= e or s >= n:
+        raise ValueError("bbox min must be below max")
+    return w, s, e, n
+
+
+def bbox_polygon(w: float, s: float, e: float, n: float) -> dict:
+    return {"type": "Polygon", "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}
+
+
+def spatial_filter(field: str, lat: float | None = None, lng: float | None = None,
+                   radius: float | None = None, bbox: str | None = None,
+                   lines: bool = False) -> dict | None:
+    """
+    Mongo filter on a 2dsphere `field` for a radius (metres) or bbox query.
+    Point fields use $geoWithin; line fields use $nearSphere / $geoIntersects
+    so a road matches as soon as any part of it is inside the area.
+    Returns None when no spatial parameters were given.
+    """
+    if bbox:
+        polygon = bbox_polygon(*parse_bbox(bbox))
+        op = "$geoIntersects" if lines else "$geoWithin"
+        return {field: {op: {"$geometry": polygon}}}
+    if lat is None or lng is None or radius is None:
+        return None
+    if radius <= 0:
+        raise ValueError("radius must be positive")
+    if lines:
+        return {field: {"$nearSphere": {"$geometry": geo_point(lat, lng), "$maxDistance": radius}}}
+    return {field: {"$geoWithin": {"$centerSphere": [[lng, lat], radius / EARTH_RADIUS_M]}}}
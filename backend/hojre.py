@@ -0,0 +1,88 @@
+"""
+Højre vigepligt classification, shared by seed.py and seed_remaining.py.
+
+One pipeline over a way_graph.WayGraph: a junction node is any node on
+two or more distinct ways that also appears in the node extract; then
+each check in turn rejects nodes and counts them under its skip reason.
+- strict (seed.py): villa-quarter junctions only — not signed, no poison
+  (roundabout, cobblestones, sidewalk/cycleway tags, crossings, signs),
+  residential ways only, none of them touching footway/cycleway/etc.
+- loose (seed_remaining.py): not signed.
+"""
+from geo import geo_point
+from osm_tables import NodeTable, WayTable
+from way_graph import WayGraph, in_set, only_types, poisoned, tainted_by
+
+# Poison flags (uint8 bits in osm_tables)
+WAY_ROUNDABOUT = 1
+WAY_BAD_SURFACE = 2
+WAY_SIDEWALK_ON_ROAD = 4
+NODE_SIGN = 8
+NODE_CROSSING = 16
+
+DISQUALIFYING_SURFACES = {"cobblestone", "paving_stones", "sett", "unhewn_cobblestone"}
+INFRA_TYPES = {"footway", "cycleway", "pedestrian", "path", "steps", "crossing"}
+
+
+def way_flags(tags: dict) -> int:
+    flags = 0
+    if tags.get("junction", "") in ("roundabout", "circular"):
+        flags |= WAY_ROUNDABOUT
+    if tags.get("surface", "") in DISQUALIFYING_SURFACES:
+        flags |= WAY_BAD_SURFACE
+    sidewalk = tags.get("sidewalk", "no")
+    cycleway_tag = tags.get("cycleway", "no")
+    has_infra_tags = sidewalk not in ("no", "none", "") or cycleway_tag not in ("no", "none", "")
+    if tags.get("highway", "") == "residential" and has_infra_tags:
+        flags |= WAY_SIDEWALK_ON_ROAD
+    return flags
+
+
+def node_flags(tags: dict) -> int:
+    flags = 0
+    if tags.get("highway", "") in ("crossing", "give_way", "stop", "traffic_signals"):
+        flags |= NODE_SIGN
+    if tags.get("crossing"):
+        flags |= NODE_CROSSING
+    return flags
+
+
+def classify(ways: WayTable, nodes: NodeTable, signed_ids: set, strict: bool = True) -> tuple[list[dict], dict]:
+    """Højre vigepligt seed documents and skip-reason counts."""
+    graph = WayGraph(ways)
+    if not len(graph):
+        return [], {}
+    rows = nodes.positions(graph.node_ids)
+
+    checks = [("signed", in_set(graph, signed_ids))]
+    if strict:
+        residential = graph.type_mask(["residential"])
+        checks += [
+            ("poison", poisoned(graph, rows, nodes)),
+            # ALL road types at this node must be residential only
+            ("not_pure_residential", ~only_types(graph, residential)),
+            # None of the connecting residential ways should be tainted (touch infra)
+            ("way_touches_infra", tainted_by(graph, graph.ways_of_type(residential), graph.type_mask(INFRA_TYPES))),
+        ]
+
+    keep = (rows >= 0) & (graph.way_count >= 2)
+    skip_reasons = {}
+    for reason, failed in checks:
+        hit = keep & failed
+        if hit.any():
+            skip_reasons[reason] = int(hit.sum())
+        keep &= ~failed
+
+    _, lat, lng, _ = nodes.arrays()
+    hojre = []
+    for i in keep.nonzero()[0].tolist():
+        la, ln = float(lat[rows[i]]), float(lng[rows[i]])
+        hojre.append({
+            "osm_id": int(graph.node_ids[i]),
+            "lat": la,
+            "lng": ln,
+            "type": "hojre_vigepligt",
+            "way_count": int(graph.way_count[i]),
+            "location": geo_point(la, ln),
+        })
+    return hojre, skip_reasons
@@ -0,0 +1,123 @@
+"""
+Shared outbound HTTP client for Google Routes, HERE and Overpass.
+
+One pooled httpx.AsyncClient per process keeps connections alive between
+calls, so repeated requests to the same host skip DNS/TCP/TLS setup.
+The API opens it in the FastAPI lifespan; the seed scripts get it lazily
+and call close_client() when they're done.
+"""
+import asyncio
+import logging
+import time
+import httpx
+from config import get_settings
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives back its per-host slot when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per host on top of the pool-wide limits, and times them for /metrics."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int, record: bool = True):
+        self._transport = transport
+        self._per_host = per_host
+        self._record = record
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = self._semaphores[host] = asyncio.Semaphore(self._per_host)
+        await sem.acquire()
+        # Timed from here to the response headers, so waiting for a slot
+        # doesn't count as upstream latency and streamed bodies don't either
+        start = time.perf_counter()
+        status = None
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = response.status_code
+        except BaseException:
+            sem.release()
+            raise
+        finally:
+            if self._record:
+                metrics.record_external(metrics.external_service(host, request.url.path), status,
+                                        time.perf_counter() - start)
+        if response.is_closed:
+            # Body already in memory (e.g. httpx.MockTransport): nothing will close it again
+            sem.release()
+            return response
+        # Hold the slot until the body is closed, like the connection itself,
+        # without reading it here: client.stream() callers get it chunk by chunk
+        response.stream = _ReleasingStream(response.stream, sem.release)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_client() -> httpx.AsyncClient:
+    settings = get_settings()
+    http2 = settings.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED but the h2 package is missing; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+    )
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=1),
+        per_host=settings.HTTP_MAX_PER_HOST,
+        record=settings.METRICS_ENABLED,
+    )
+    timeout = httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_client() -> httpx.AsyncClient:
+    """The process-wide client, created on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
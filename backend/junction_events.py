@@ -0,0 +1,142 @@
+"""
+Ordered junction events along a route.
+
+The højre vigepligt and signed-intersection points of a test centre are
+loaded once per dataset version. For a route, its step polylines go into a SegmentIndex;
+each junction near the route's bounding box is matched against the route
+segments within MATCH_M, and the hits become events ordered by distance
+along the route, tagged with the leg/step they fall in. A loop that passes
+the same junction twice gets two events.
+"""
+import asyncio
+import logging
+import numpy as np
+import polyline
+from db import db
+from centers import center_filter, default_center_id
+from layer_cache import on_dataset_change
+
+logger = logging.getLogger(__name__)
+
+# A junction node this close to the route polyline is on the route
+MATCH_M = 20
+# Hits on the same junction further apart than this along the route are separate passes
+REPASS_GAP_M = 100
+
+
+class JunctionIndex:
+    def __init__(self, junctions: list[dict]):
+        self.junctions = junctions
+        self.lat = np.array([j["lat"] for j in junctions], dtype=np.float64)
+        self.lng = np.array([j["lng"] for j in junctions], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.junctions)
+
+    def events(self, lines: list[np.ndarray], owners: list[tuple[int, int] | None]) -> list[dict]:
+        """
+        Junction events along consecutive route pieces `lines` (each an (N, 2)
+        array); owners[i] is the (leg, step) of lines[i], or None.
+        """
+        lines = [np.asarray(line, dtype=np.float64).reshape(-1, 2) for line in lines]
+        pts = [line for line in lines if len(line)]
+        if not pts or not len(self.junctions):
+            return []
+        route = np.concatenate(pts)
+
+        # Junctions near the route's bounding box only
+        pad_lat = MATCH_M / 111320.0
+        pad_lng = pad_lat / max(np.cos(np.radians(route[:, 0].mean())), 0.01)
+        near = np.flatnonzero(
+            (self.lat >= route[:, 0].min() - pad_lat) & (self.lat <= route[:, 0].max() + pad_lat) &
+            (self.lng >= route[:, 1].min() - pad_lng) & (self.lng <= route[:, 1].max() + pad_lng))
+        if not len(near):
+            return []
+
+        index = polyline.SegmentIndex(lines)
+        along = [polyline.cumulative_distance(line) for line in lines]
+        offsets = np.concatenate(([0.0], np.cumsum([a[-1] if len(a) else 0.0 for a in along])))
+
+        events = []
+        for j in near.tolist():
+            hits = index.within(self.lat[j], self.lng[j], MATCH_M)
+            if not hits:
+                continue
+            # (distance along route, offset from route, line) per matched segment
+            placed = sorted(
+                (offsets[li] + along[li][seg] + t * (along[li][seg + 1] - along[li][seg]), dist, li)
+                for li, seg, dist, t in hits)
+            passes = [[placed[0]]]
+            for hit in placed[1:]:
+                if hit[0] - passes[-1][-1][0] > REPASS_GAP_M:
+                    passes.append([hit])
+                else:
+                    passes[-1].append(hit)
+            junction = self.junctions[j]
+            for hits_in_pass in passes:
+                d_along, dist, li = min(hits_in_pass, key=lambda h: h[1])
+                owner = owners[li] if li < len(owners) else None
+                events.append({
+                    "type": junction["type"],
+                    "osm_id": junction.get("osm_id"),
+                    "lat": junction["lat"],
+                    "lng": junction["lng"],
+                    "distance_along_m": round(float(d_along), 1),
+                    "offset_m": round(dist, 1),
+                    "leg_index": owner[0] if owner else None,
+                    "step_index": owner[1] if owner else None,
+                })
+        events.sort(key=lambda e: e["distance_along_m"])
+        for i, e in enumerate(events):
+            e["order"] = i
+        return events
+
+    def events_for_polyline(self, encoded: str) -> list[dict]:
+        return self.events([polyline.decode(encoded)], [None])
+
+    def events_for_legs(self, legs: list[dict], fallback: str = "") -> list[dict]:
+        """Events for Google-style legs, built from the step polylines (finer than the overview)."""
+        lines, owners = [], []
+        for li, leg in enumerate(legs):
+            for si, step in enumerate(leg.get("steps", [])):
+                lines.append(polyline.decode(step.get("polyline", {}).get("encodedPolyline", "")))
+                owners.append((li, si))
+        if not any(len(line) for line in lines):
+            return self.events_for_polyline(fallback)
+        return self.events(lines, owners)
+
+
+# centre id -> index over that centre's junctions
+_indexes: dict[str, JunctionIndex] = {}
+_locks: dict[str, asyncio.Lock] = {}
+
+
+async def get_junction_index(center: str | None = None) -> JunctionIndex:
+    center = center or default_center_id()
+    index = _indexes.get(center)
+    if index is not None:
+        return index
+    async with _locks.setdefault(center, asyncio.Lock()):
+        if center not in _indexes:
+            scope = center_filter(center)
+            projection = {"_id": 0, "osm_id": 1, "lat": 1, "lng": 1, "type": 1}
+            hojre, signed = await asyncio.gather(
+                db["hojre_vigepligt"].find(scope, projection).to_list(None),
+                db["signed_intersections"].find(scope, projection).to_list(None),
+            )
+            for doc in hojre:
+                doc.setdefault("type", "hojre_vigepligt")
+            _indexes[center] = JunctionIndex([d for d in hojre + signed if "lat" in d and "lng" in d])
+            logger.info("Junction index %s: %d hojre, %d signed", center, len(hojre), len(signed))
+    return _indexes[center]
+
+
+def invalidate_junction_index(center: str | None = None):
+    """Drop a centre's cached copy (every centre's without one)."""
+    if center is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(center, None)
+
+
+on_dataset_change(invalidate_junction_index)
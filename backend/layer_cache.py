@@ -0,0 +1,143 @@
+"""
+Process-level snapshot cache for the static map layers.
+
+Each layer is kept as pre-serialized JSON bytes tagged with its test
+centre's dataset version. Requests are answered straight from memory,
+with ETag / If-None-Match support so unchanged layers cost a 304.
+The global dataset version is re-read from MongoDB at most every
+LAYER_VERSION_CHECK_SECONDS, so reseeds from another process are picked up
+without a database round trip per request; when it moved, the centres'
+versions are read to find which changed. Only those centres' snapshots
+are dropped and only they are passed to the on_dataset_change listeners
+(speed lookup, junction index, road graph, villa tables), so reseeding
+one centre leaves the others warm.
+Gzip/brotli variants of a snapshot are compressed once, on the first
+request accepting them, and served with their own ETag.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+from fastapi import Request, Response
+from config import get_settings
+from datasets import read_dataset_version, bump_dataset_version
+from db import db
+from centers import CENTERS
+import profiling
+from responses import accepted_encoding, compress, dumps
+
+# "<centre>:<layer>..." key -> {"version": int, "body": bytes, "etag": str, "variants": {encoding: bytes}}
+_snapshots: dict[str, dict] = {}
+_locks: dict[str, asyncio.Lock] = {}
+_listeners: list[Callable[[str], None]] = []
+
+_version: int | None = None
+_center_versions: dict[str, int] = {}
+_checked_at = 0.0
+_refresh_lock = asyncio.Lock()
+
+
+def on_dataset_change(fn: Callable[[str], None]):
+    """Register a callback run with a centre id whenever that centre's dataset version changes."""
+    _listeners.append(fn)
+
+
+def _drop_center(center: str):
+    for key in [k for k in _snapshots if k.startswith(f"{center}:")]:
+        del _snapshots[key]
+    for fn in _listeners:
+        fn(center)
+
+
+async def _refresh(force: bool = False):
+    global _version, _checked_at
+    async with _refresh_lock:
+        version = await read_dataset_version(db)
+        # Centre counters are bumped before the global one, so they're current for `version`
+        if force or version != _version:
+            for center in CENTERS:
+                center_version = await read_dataset_version(db, center)
+                if center in _center_versions and _center_versions[center] != center_version:
+                    _drop_center(center)
+                _center_versions[center] = center_version
+        _version = version
+        _checked_at = time.monotonic()
+
+
+async def current_version() -> int:
+    """Global dataset version: changes whenever any centre's data does."""
+    ttl = get_settings().LAYER_VERSION_CHECK_SECONDS
+    if _version is None or time.monotonic() - _checked_at > ttl:
+        await _refresh()
+    return _version
+
+
+async def center_version(center: str) -> int:
+    await current_version()
+    return _center_versions.get(center, 0)
+
+
+async def invalidate_layers(centers: set[str] | list[str] = (), changes: list[dict] = ()):
+    """Bump the edited centres' dataset versions after an edit, logging `changes`, and drop their snapshots."""
+    await bump_dataset_version(db, sorted(centers), changes)
+    await _refresh(force=True)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag in tags
+
+
+async def get_snapshot(center: str, key: str, build: Callable[[], Awaitable[dict]]) -> dict:
+    """Snapshot `key` (which starts with "<center>:") for the centre's current version."""
+    version = await center_version(center)
+    snap = _snapshots.get(key)
+    if snap is not None and snap["version"] == version:
+        return snap
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        snap = _snapshots.get(key)
+        if snap is None or snap["version"] != version:
+            with profiling.phase("load"):
+                data = await build()
+            with profiling.phase("encode"):
+                body = dumps(data)
+            snap = {
+                "version": version,
+                "body": body,
+                "etag": f'"{key}-v{version}"',
+                "variants": {},
+            }
+            _snapshots[key] = snap
+    return snap
+
+
+async def _variant(key: str, snap: dict, encoding: str) -> bytes:
+    body = snap["variants"].get(encoding)
+    if body is None:
+        async with _locks.setdefault(f"{key}:{encoding}", asyncio.Lock()):
+            body = snap["variants"].get(encoding)
+            if body is None:
+                with profiling.phase("compress"):
+                    body = await asyncio.to_thread(compress, snap["body"], encoding)
+                snap["variants"][encoding] = body
+    return body
+
+
+async def layer_response(request: Request, center: str, key: str, build: Callable[[], Awaitable[dict]]) -> Response:
+    """Serve a cached layer snapshot (precompressed if accepted), or 304 if the client already has it."""
+    snap = await get_snapshot(center, key, build)
+    encoding = accepted_encoding(request)
+    etag = snap["etag"] if encoding is None else f'{snap["etag"][:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    # Either representation means the client has this version
+    if etag_matches(request, etag) or etag_matches(request, snap["etag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return Response(content=snap["body"], media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(content=await _variant(key, snap, encoding), media_type="application/json", headers=headers)
@@ -0,0 +1,343 @@
+"""
+Offline routing engine over the seeded OSM road graph (`road_ways`).
+
+The graph is a compact CSR adjacency (one array slice of outgoing edges
+per node) with travel times from maxspeed tags, falling back to Danish
+defaults per highway type. Queries run A* with a straight-line /
+top-speed heuristic. route() returns the same JSON shape as Google's
+computeRoutes, so generate_route shapes both backends the same way.
+RoadGraph has no database dependency and can be built from plain dicts.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import numpy as np
+import polyline
+from db import road_ways_col
+from centers import center_filter, default_center_id
+from osm import parse_maxspeed
+from layer_cache import on_dataset_change
+
+logger = logging.getLogger(__name__)
+
+# Default speeds (km/h) when a way has no usable maxspeed tag
+DEFAULT_SPEEDS = {
+    "motorway": 110, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 50,
+    "secondary": 50, "secondary_link": 40,
+    "tertiary": 50, "tertiary_link": 40,
+    "unclassified": 50, "residential": 40,
+    "living_street": 15, "service": 20,
+}
+MOTORWAY_TYPES = {"motorway", "motorway_link"}
+# Cost multiplier on motorway edges when avoiding highways, like Google's
+# avoidHighways: via points on the E20 still pull the route onto it
+MOTORWAY_PENALTY = 8.0
+
+# Turn angle (degrees, + = right) -> Google maneuver name
+MANEUVERS = [
+    (-150, "UTURN_LEFT"), (-60, "TURN_LEFT"), (-20, "TURN_SLIGHT_LEFT"),
+    (20, "STRAIGHT"), (60, "TURN_SLIGHT_RIGHT"), (150, "TURN_RIGHT"), (181, "UTURN_RIGHT"),
+]
+INSTRUCTIONS = {
+    "DEPART": "Kør ad {name}",
+    "STRAIGHT": "Fortsæt ad {name}",
+    "TURN_SLIGHT_LEFT": "Hold til venstre ad {name}",
+    "TURN_LEFT": "Drej til venstre ad {name}",
+    "UTURN_LEFT": "Foretag en U-vending ad {name}",
+    "TURN_SLIGHT_RIGHT": "Hold til højre ad {name}",
+    "TURN_RIGHT": "Drej til højre ad {name}",
+    "UTURN_RIGHT": "Foretag en U-vending ad {name}",
+}
+
+
+def _fmt_distance(m: float) -> str:
+    return f"{m / 1000:.1f} km".replace(".", ",") if m >= 1000 else f"{int(round(m))} m"
+
+
+def _fmt_duration(s: float) -> str:
+    return f"{max(1, int(round(s / 60)))} min."
+
+
+class RoadGraph:
+    def __init__(self, ways: list[dict]):
+        node_index: dict[int, int] = {}
+        lats: list[float] = []
+        lngs: list[float] = []
+        src: list[int] = []
+        dst: list[int] = []
+        edge_way: list[int] = []
+        self.way_names: list[str] = []
+        self.way_types: list[str] = []
+        way_speeds: list[float] = []
+
+        for w in ways:
+            nodes = w.get("nodes") or []
+            geometry = w.get("geometry") or []
+            if len(nodes) < 2 or len(nodes) != len(geometry):
+                continue
+            wi = len(self.way_names)
+            hw = w.get("highway_type", "")
+            self.way_names.append(w.get("name") or w.get("ref") or "")
+            self.way_types.append(hw)
+            way_speeds.append(parse_maxspeed(w.get("maxspeed")) or DEFAULT_SPEEDS.get(hw, 50))
+
+            idx = []
+            for nid, p in zip(nodes, geometry):
+                i = node_index.get(nid)
+                if i is None:
+                    i = node_index[nid] = len(lats)
+                    lats.append(p["lat"])
+                    lngs.append(p["lng"])
+                idx.append(i)
+            direction = w.get("oneway", 0)
+            for a, b in zip(idx, idx[1:]):
+                if direction >= 0:
+                    src.append(a)
+                    dst.append(b)
+                    edge_way.append(wi)
+                if direction <= 0:
+                    src.append(b)
+                    dst.append(a)
+                    edge_way.append(wi)
+
+        self.node_ids = np.fromiter(node_index.keys(), dtype=np.int64, count=len(node_index))
+        self.lat = np.asarray(lats, dtype=np.float64)
+        self.lng = np.asarray(lngs, dtype=np.float64)
+        src_a = np.asarray(src, dtype=np.int64)
+        dst_a = np.asarray(dst, dtype=np.int64)
+        way_a = np.asarray(edge_way, dtype=np.int64)
+        speeds = np.asarray(way_speeds, dtype=np.float64)
+
+        # CSR: edges sorted by source node, indptr[i]:indptr[i+1] are node i's edges
+        order = np.argsort(src_a, kind="stable")
+        src_a, dst_a, way_a = src_a[order], dst_a[order], way_a[order]
+        self.indptr = np.searchsorted(src_a, np.arange(len(lats) + 1)).astype(np.int64)
+        self.dst = dst_a
+        self.edge_way = way_a
+        self.length = polyline.haversine(self.lat[src_a], self.lng[src_a], self.lat[dst_a], self.lng[dst_a])
+        self.time = self.length / (speeds[way_a] / 3.6) if len(way_a) else np.empty(0)
+        self.is_motorway = np.array([self.way_types[w] in MOTORWAY_TYPES for w in way_a], dtype=bool)
+        self.max_speed_ms = float(speeds.max() / 3.6) if len(speeds) else 1.0
+
+        # Local metric projection for snapping and the A* heuristic
+        self._ref_lat = float(self.lat.mean()) if len(lats) else 0.0
+        k = math.radians(1.0) * polyline.EARTH_RADIUS_M
+        self.x = self.lng * k * math.cos(math.radians(self._ref_lat))
+        self.y = self.lat * k
+        self._routable = np.flatnonzero(np.diff(self.indptr) > 0)
+
+        # Python lists for the hot A* loop (numpy scalar access is slow there)
+        self._indptr_l = self.indptr.tolist()
+        self._dst_l = self.dst.tolist()
+        self._time_l = self.time.tolist()
+        self._motorway_l = self.is_motorway.tolist()
+        self._x_l = self.x.tolist()
+        self._y_l = self.y.tolist()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.dst)
+
+    def nearest_nodes(self, lat: float, lng: float, k: int = 5) -> list[int]:
+        """The k closest nodes with at least one outgoing edge."""
+        if not len(self._routable):
+            return []
+        kk = math.radians(1.0) * polyline.EARTH_RADIUS_M
+        qx = lng * kk * math.cos(math.radians(self._ref_lat))
+        qy = lat * kk
+        d2 = (self.x[self._routable] - qx) ** 2 + (self.y[self._routable] - qy) ** 2
+        k = min(k, len(d2))
+        best = np.argpartition(d2, k - 1)[:k]
+        return self._routable[best[np.argsort(d2[best])]].tolist()
+
+    def shortest_path(self, s: int, t: int, avoid_motorway: bool = True) -> tuple[list[int], list[int]] | None:
+        """A* from node s to t. Returns (nodes, edge indices) or None if unreachable."""
+        if s == t:
+            return [s], []
+        indptr, dst, time_, motorway = self._indptr_l, self._dst_l, self._time_l, self._motorway_l
+        xs, ys = self._x_l, self._y_l
+        tx, ty = xs[t], ys[t]
+        # Straight line at top speed never overestimates the remaining time
+        inv_v = 0.999 / self.max_speed_ms
+
+        g = {s: 0.0}
+        prev: dict[int, tuple[int, int]] = {}  # node -> (previous node, edge)
+        closed = set()
+        heap = [(math.hypot(xs[s] - tx, ys[s] - ty) * inv_v, s)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == t:
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            gu = g[u]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = dst[e]
+                if v in closed:
+                    continue
+                cost = time_[e]
+                if avoid_motorway and motorway[e]:
+                    cost *= MOTORWAY_PENALTY
+                gv = gu + cost
+                if gv < g.get(v, math.inf):
+                    g[v] = gv
+                    prev[v] = (u, e)
+                    heapq.heappush(heap, (gv + math.hypot(xs[v] - tx, ys[v] - ty) * inv_v, v))
+        else:
+            return None
+        nodes = [t]
+        edges = []
+        v = t
+        while v != s:
+            v, e = prev[v]
+            edges.append(e)
+            nodes.append(v)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def _route_between(self, a: dict, b: dict, avoid_motorway: bool):
+        # A few snapping candidates in case the closest node is a dead end
+        for s in self.nearest_nodes(a["lat"], a["lng"], k=3):
+            for t in self.nearest_nodes(b["lat"], b["lng"], k=3):
+                found = self.shortest_path(s, t, avoid_motorway)
+                if found is not None:
+                    return found
+        return None
+
+    def _bearing(self, u: int, v: int) -> float:
+        return math.degrees(math.atan2(self.x[v] - self.x[u], self.y[v] - self.y[u]))
+
+    def _steps(self, nodes: list[int], edges: list[int]) -> list[dict]:
+        """Group the edge sequence into Google-style steps, one per road name."""
+        groups: list[list[int]] = []
+        for i, e in enumerate(edges):
+            name = self.way_names[self.edge_way[e]]
+            if groups and self.way_names[self.edge_way[edges[groups[-1][0]]]] == name:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+
+        steps = []
+        for gi, group in enumerate(groups):
+            first, last = group[0], group[-1]
+            step_nodes = nodes[first:last + 2]
+            step_edges = [edges[i] for i in group]
+            distance = float(self.length[step_edges].sum())
+            duration = float(self.time[step_edges].sum())
+            if gi == 0:
+                maneuver = "DEPART"
+            else:
+                turn = self._bearing(nodes[first], nodes[first + 1]) - self._bearing(nodes[first - 1], nodes[first])
+                turn = (turn + 180) % 360 - 180
+                maneuver = next(m for limit, m in MANEUVERS if turn < limit)
+            name = self.way_names[self.edge_way[edges[first]]] or "vejen"
+            pts = np.column_stack((self.lat[step_nodes], self.lng[step_nodes]))
+            steps.append({
+                "distanceMeters": int(round(distance)),
+                "staticDuration": f"{int(round(duration))}s",
+                "polyline": {"encodedPolyline": polyline.encode(pts)},
+                "startLocation": {"latLng": {"latitude": float(pts[0, 0]), "longitude": float(pts[0, 1])}},
+                "endLocation": {"latLng": {"latitude": float(pts[-1, 0]), "longitude": float(pts[-1, 1])}},
+                "navigationInstruction": {
+                    "maneuver": maneuver,
+                    "instructions": INSTRUCTIONS[maneuver].format(name=name),
+                },
+                "localizedValues": {
+                    "distance": {"text": _fmt_distance(distance)},
+                    "staticDuration": {"text": _fmt_duration(duration)},
+                },
+            })
+        return steps
+
+    def route(self, origin: dict, destination: dict, intermediates: list[dict],
+              avoid_motorway: bool = True) -> dict:
+        """
+        Route origin -> intermediates -> destination. Intermediates with
+        "via": True are pass-through and don't start a new leg (like Google).
+        Returns {"routes": [...]} in computeRoutes shape, or {"error": ...}.
+        """
+        stops = [{**origin, "via": False}] + intermediates + [{**destination, "via": False}]
+        legs_nodes: list[list[int]] = [[]]
+        legs_edges: list[list[int]] = [[]]
+        for a, b in zip(stops, stops[1:]):
+            found = self._route_between(a, b, avoid_motorway)
+            if found is None:
+                return {"error": {"message": f"No local route to {b['lat']:.5f},{b['lng']:.5f}"}}
+            nodes, edges = found
+            if legs_nodes[-1]:
+                nodes = nodes[1:]
+            legs_nodes[-1].extend(nodes)
+            legs_edges[-1].extend(edges)
+            if b is not stops[-1] and not b.get("via"):
+                legs_nodes.append([nodes[-1]] if nodes else [legs_nodes[-1][-1]])
+                legs_edges.append([])
+
+        legs = []
+        all_pts = []
+        total_distance = 0.0
+        total_duration = 0.0
+        for nodes, edges in zip(legs_nodes, legs_edges):
+            distance = float(self.length[edges].sum()) if edges else 0.0
+            duration = float(self.time[edges].sum()) if edges else 0.0
+            pts = np.column_stack((self.lat[nodes], self.lng[nodes]))
+            all_pts.append(pts if not all_pts else pts[1:])
+            total_distance += distance
+            total_duration += duration
+            legs.append({
+                "distanceMeters": int(round(distance)),
+                "duration": f"{int(round(duration))}s",
+                "polyline": {"encodedPolyline": polyline.encode(pts)},
+                "steps": self._steps(nodes, edges),
+            })
+
+        return {"routes": [{
+            "distanceMeters": int(round(total_distance)),
+            "duration": f"{int(round(total_duration))}s",
+            "polyline": {"encodedPolyline": polyline.encode(np.concatenate(all_pts))},
+            "legs": legs,
+        }]}
+
+
+# centre id -> road graph of that centre's road_ways
+_graphs: dict[str, RoadGraph] = {}
+_locks: dict[str, asyncio.Lock] = {}
+
+
+async def get_graph(center: str | None = None) -> RoadGraph:
+    """A centre's road graph built from `road_ways`, loaded once per dataset version."""
+    center = center or default_center_id()
+    graph = _graphs.get(center)
+    if graph is not None:
+        return graph
+    async with _locks.setdefault(center, asyncio.Lock()):
+        if center not in _graphs:
+            ways = await road_ways_col.find(
+                center_filter(center), {"_id": 0, "nodes": 1, "geometry": 1, "highway_type": 1,
+                                        "maxspeed": 1, "oneway": 1, "name": 1, "ref": 1},
+            ).to_list(None)
+            # Off the event loop, like the speed lookup and junction index
+            graph = await asyncio.to_thread(RoadGraph, ways)
+            logger.info("Local road graph %s: %d nodes, %d edges from %d ways",
+                        center, graph.node_count, graph.edge_count, len(ways))
+            _graphs[center] = graph
+    return _graphs[center]
+
+
+def invalidate_graph(center: str | None = None):
+    """Drop a centre's cached copy (every centre's without one)."""
+    if center is None:
+        _graphs.clear()
+    else:
+        _graphs.pop(center, None)
+
+
+on_dataset_change(invalidate_graph)
@@ -1,15 +1,44 @@
 import traceback
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from config import get_settings
-from api.routes import router as routes_router
+from api.routes import router as routes_router, compute_route
 from api.villa import router as villa_router
 from api.overpass import router as overpass_router
+from api.bootstrap import router as bootstrap_router
+from waypoints import refresh_villa_weights
+from route_pool import route_pool
+from http_client import get_client, close_client
+from centers import CENTERS, default_center_id
+import metrics
+import profiling
+from responses import FastJSONResponse, StreamingGZipMiddleware
 
 settings = get_settings()
 
-app = FastAPI(title="Køreprøve Amager API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled outbound client for Google Routes (warm keep-alive connections)
+    get_client()
+    # Build the villa/hojre waypoint table once instead of per route request
+    try:
+        await refresh_villa_weights()
+    except Exception as exc:
+        print(f"Villa weight warm-up failed (will retry on first request): {exc}")
+    route_pool.start(
+        lambda include_motorway: compute_route(include_motorway, settings),
+        size=settings.ROUTE_POOL_SIZE,
+        max_age=settings.ROUTE_POOL_MAX_AGE_SECONDS,
+    )
+    yield
+    await route_pool.stop()
+    await close_client()
+
+
+app = FastAPI(title="Køreprøve Amager API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 allowed_origins = [
     settings.FRONTEND_URL,
@@ -29,12 +58,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Dynamic responses (routes, streamed layers); snapshots and tiles come precompressed
+app.add_middleware(StreamingGZipMiddleware, minimum_size=1024, compresslevel=5)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+if settings.METRICS_ENABLED:
+    # Outermost, so CORS preflights and error responses are counted too
+    app.add_middleware(metrics.MetricsMiddleware)
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     tb = traceback.format_exc()
     print(f"ERROR on {request.url}: {exc}\n{tb}")
+    metrics.HTTP_EXCEPTIONS.inc(route=metrics.route_template(request.scope), exception=type(exc).__name__)
     return JSONResponse(
         status_code=500,
         content={"error": str(exc), "detail": tb},
@@ -63,8 +100,40 @@ if os.path.isdir(_orient_assets):
 app.include_router(routes_router, prefix="/api/routes", tags=["routes"])
 app.include_router(villa_router, prefix="/api/villa", tags=["villa"])
 app.include_router(overpass_router, prefix="/api/overpass", tags=["overpass"])
+app.include_router(bootstrap_router, prefix="/api/bootstrap", tags=["bootstrap"])
+
+
+@app.get("/api/centers")
+async def list_centers():
+    """Test centres served by this deployment; pass `center=<id>` to the layer and route endpoints."""
+    return {"default": default_center_id(), "centers": [c.summary() for c in CENTERS.values()]}
+
+
+async def _route_pool_ready():
+    for variant, ready in route_pool.stats().items():
+        metrics.ROUTE_POOL_READY.set(ready, variant=variant)
+
+metrics.register_collector(_route_pool_ready)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape target: request, MongoDB and upstream API latencies (see metrics.py)."""
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(await metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/profiles/{name}", include_in_schema=False)
+async def profile_report(name: str):
+    """A stored per-request profile (name from the X-Profile-Report header): pyinstrument HTML, or cProfile .prof."""
+    path = profiling.report_path(name) if settings.PROFILING_ENABLED else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile")
+    media_type = "text/html" if path.suffix == ".html" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type)
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "route_pool": route_pool.stats()}
@@ -0,0 +1,277 @@
+"""
+Prometheus metrics in the text exposition format, served at GET /metrics.
+
+- HTTP: per-route latency histogram, request counts by status and
+  in-flight gauge (MetricsMiddleware), unhandled exceptions
+- MongoDB: per-collection command latency and documents returned, from
+  pymongo command monitoring (MongoCommandListener, registered on the
+  motor client in db.py), plus collection sizes read at scrape time
+- External APIs (Google Routes, HERE, Overpass): latency, status codes and
+  429s, recorded by http_client's transport
+- /api/routes/generate: time per phase of compute_route()
+No client library: the few metric types needed are below. Updates take a
+lock, as pymongo calls the listener from motor's worker threads.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Latency buckets in seconds, from a cached layer to a slow Overpass extract
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: list["_Metric"] = []
+# Run before rendering, to refresh gauges that are read rather than tracked
+_collectors: list[Callable[[], Awaitable[None]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(v)}"' for name, v in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{self._label_text(k)} {v}" for k, v in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # one count per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def register_collector(fn: Callable[[], Awaitable[None]]):
+    _collectors.append(fn)
+
+
+async def render() -> str:
+    for collect in _collectors:
+        try:
+            await collect()
+        except Exception:
+            # A failing collector leaves its gauges at their last values
+            pass
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- HTTP ---
+
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                          ("method", "route"))
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status",
+                        ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ("route",))
+HTTP_EXCEPTIONS = Counter("http_unhandled_exceptions_total", "Requests that ended in the global exception handler",
+                          ("route", "exception"))
+
+
+def route_template(scope) -> str:
+    """Path template of the route a request goes to ("unmatched" otherwise), to keep label values bounded."""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "") or "unmatched"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_* for every request (streamed bodies until their last chunk)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_template(scope)
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_DURATION.observe(time.perf_counter() - start, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+
+# --- MongoDB ---
+
+MONGO_DURATION = Histogram("mongodb_command_duration_seconds", "MongoDB command latency by collection",
+                           ("collection", "command"))
+MONGO_DOCUMENTS = Counter("mongodb_documents_returned_total", "Documents returned by find/aggregate/getMore",
+                          ("collection",))
+MONGO_FAILURES = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ("collection", "command"))
+MONGO_COLLECTION_DOCS = Gauge("mongodb_collection_documents", "Estimated documents per collection (at scrape)",
+                              ("collection",))
+
+# Commands whose first field names the collection
+_COLLECTION_COMMANDS = {"find", "aggregate", "count", "distinct", "insert", "update", "delete",
+                        "findAndModify", "createIndexes", "drop"}
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) -> collection, between started and succeeded/failed
+        self._pending: dict[tuple, str] = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name == "getMore":
+            collection = event.command.get("collection")
+        elif name in _COLLECTION_COMMANDS:
+            collection = event.command.get(name)
+        else:
+            return
+        if isinstance(collection, str):
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_DURATION.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            MONGO_DOCUMENTS.inc(len(batch), collection=collection)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_DURATION.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        MONGO_FAILURES.inc(collection=collection, command=event.command_name)
+
+# --- External APIs ---
+
+EXTERNAL_DURATION = Histogram("external_request_duration_seconds", "Outbound API latency to the response headers",
+                              ("service",))
+EXTERNAL_RESPONSES = Counter("external_responses_total", "Outbound API responses by status (\"error\" = no response)",
+                             ("service", "status"))
+EXTERNAL_RATE_LIMITED = Counter("external_rate_limited_total", "Outbound API 429 responses", ("service",))
+
+_SERVICES = {"routes.googleapis.com": "google_routes", "router.hereapi.com": "here"}
+
+
+def external_service(host: str, path: str) -> str:
+    if host in _SERVICES:
+        return _SERVICES[host]
+    if path.endswith("/interpreter") or "overpass" in host:
+        return "overpass"
+    return host
+
+
+def record_external(service: str, status: int | None, seconds: float):
+    EXTERNAL_DURATION.observe(seconds, service=service)
+    EXTERNAL_RESPONSES.inc(service=service, status="error" if status is None else str(status))
+    if status == 429:
+        EXTERNAL_RATE_LIMITED.inc(service=service)
+
+# --- Route generation ---
+
+ROUTE_PHASE = Histogram("route_generation_phase_seconds", "Time per compute_route() phase", ("phase", "engine"))
+ROUTE_POOL_READY = Gauge("route_pool_ready", "Pre-generated routes ready per variant", ("variant",))
@@ -0,0 +1,36 @@
+"""OSM tag helpers shared by the seed scripts and the API."""
+
+# Highway types a car can drive on (what the local road graph is built from)
+DRIVABLE_TYPES = [
+    "motorway", "motorway_link", "trunk", "trunk_link",
+    "primary", "primary_link", "secondary", "secondary_link",
+    "tertiary", "tertiary_link", "unclassified", "residential",
+    "living_street", "service",
+]
+
+
+def parse_maxspeed(raw) -> int | None:
+    """'50', '30 km/h' -> int; anything else (signals, 'DK:urban', ...) -> None."""
+    if raw is None:
+        return None
+    if isinstance(raw, (int, float)):
+        return int(raw) if raw > 0 else None
+    try:
+        speed = int(str(raw).split()[0])
+    except (ValueError, IndexError):
+        return None
+    return speed if 0 < speed <= 150 else None
+
+
+def oneway_direction(tags: dict) -> int:
+    """1 = forward only, -1 = backward only, 0 = both ways."""
+    oneway = str(tags.get("oneway", "")).lower()
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway == "-1":
+        return -1
+    if oneway == "no":
+        return 0
+    if tags.get("junction") in ("roundabout", "circular") or tags.get("highway") == "motorway":
+        return 1
+    return 0
@@ -0,0 +1,160 @@
+"""
+Streaming Overpass ingestion into compact array tables.
+
+iter_elements() walks the "elements" array of a gzip-compressed Overpass
+response one element at a time with ijson (in requirements.txt; memory
+stays flat however large the extract). Without it json.load gives the
+same elements with the whole document in memory.
+
+WayTable and NodeTable keep only what the classifiers need, as flat arrays:
+int64 ids, way node lists in CSR form, interned highway-type codes and
+uint8 flag bitmasks. Per-node questions ("which highway types meet here?")
+become NumPy reductions over the (node, way) incidence pairs instead of a
+dict of Python sets per node.
+"""
+import gzip
+import json
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+import numpy as np
+
+try:
+    import ijson
+except ImportError:  # optional: falls back to json.load
+    ijson = None
+
+# Highway-type codes are bit positions in a uint64 mask; the last one is shared overflow
+MAX_CODES = 64
+
+
+def iter_elements(path: str | Path) -> Iterator[dict]:
+    """Elements of an Overpass JSON response stored as gzip at `path`."""
+    with gzip.open(path, "rb") as f:
+        if ijson is not None:
+            yield from ijson.items(f, "elements.item", use_float=True)
+        else:
+            yield from json.load(f).get("elements", [])
+
+
+class Codes:
+    """Interns strings (highway types) to small integer codes."""
+
+    def __init__(self):
+        self.names: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = min(len(self.names), MAX_CODES - 1)
+            if len(self.names) < MAX_CODES:
+                self.names.append(name)
+            self._codes[name] = code
+        return code
+
+    def mask(self, names: Iterable[str]) -> np.uint64:
+        """Bitmask of the codes of `names` (unknown names contribute nothing)."""
+        bits = 0
+        for name in names:
+            if name in self._codes:
+                bits |= 1 << self._codes[name]
+        return np.uint64(bits)
+
+
+class WayTable:
+    """Ways as parallel arrays: ids, highway code, flags, and their nodes in CSR form."""
+
+    def __init__(self):
+        self.highway_codes = Codes()
+        self.ids = array("q")
+        self.highway = array("B")
+        self.flags = array("B")
+        self.offsets = array("q", [0])
+        self.nodes = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, way_id: int, highway: str, nodes: list[int], flags: int = 0):
+        self.ids.append(way_id)
+        self.highway.append(self.highway_codes.code(highway))
+        self.flags.append(flags)
+        self.nodes.extend(nodes)
+        self.offsets.append(len(self.nodes))
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[dict], flags: Callable[[dict], int] | None = None) -> "WayTable":
+        """Table of the ways in `elements`; flags(tags) gives each way's flag bits."""
+        table = cls()
+        for el in elements:
+            if el.get("type") != "way":
+                continue
+            tags = el.get("tags", {})
+            table.add(el["id"], tags.get("highway", ""), el.get("nodes", []),
+                      flags(tags) if flags else 0)
+        return table
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, highway codes, flags, offsets) as NumPy views."""
+        return (np.frombuffer(self.ids, dtype=np.int64), np.frombuffer(self.highway, dtype=np.uint8),
+                np.frombuffer(self.flags, dtype=np.uint8), np.frombuffer(self.offsets, dtype=np.int64))
+
+    def incidence(self) -> tuple[np.ndarray, np.ndarray]:
+        """Distinct (node id, way index) pairs, sorted by node id."""
+        _, _, _, offsets = self.arrays()
+        nodes = np.frombuffer(self.nodes, dtype=np.int64)
+        way_idx = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(offsets))
+        order = np.lexsort((way_idx, nodes))
+        nodes, way_idx = nodes[order], way_idx[order]
+        # Closed ways list their first node twice
+        distinct = np.ones(len(nodes), dtype=bool)
+        distinct[1:] = (nodes[1:] != nodes[:-1]) | (way_idx[1:] != way_idx[:-1])
+        return nodes[distinct], way_idx[distinct]
+
+
+class NodeTable:
+    """Nodes as parallel arrays sorted by id: ids, lat, lng, flags."""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.lat = array("d")
+        self.lng = array("d")
+        self.flags = array("B")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[dict], flags: Callable[[dict], int] | None = None) -> "NodeTable":
+        table = cls()
+        for el in elements:
+            if el.get("type") != "node":
+                continue
+            table.ids.append(el["id"])
+            table.lat.append(el["lat"])
+            table.lng.append(el["lon"])
+            table.flags.append(flags(el.get("tags", {})) if flags else 0)
+        table._sort()
+        return table
+
+    def _sort(self):
+        ids = np.frombuffer(self.ids, dtype=np.int64)
+        if np.any(ids[1:] < ids[:-1]):
+            order = np.argsort(ids, kind="stable")
+            for name, code in (("ids", "q"), ("lat", "d"), ("lng", "d"), ("flags", "B")):
+                values = np.frombuffer(getattr(self, name), dtype=np.dtype(code))[order]
+                setattr(self, name, array(code, values.tobytes()))
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, lat, lng, flags) as NumPy views."""
+        return (np.frombuffer(self.ids, dtype=np.int64), np.frombuffer(self.lat, dtype=np.float64),
+                np.frombuffer(self.lng, dtype=np.float64), np.frombuffer(self.flags, dtype=np.uint8))
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Row of each id in the table, -1 where absent."""
+        own = np.frombuffer(self.ids, dtype=np.int64)
+        if not len(own):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(own, ids), len(own) - 1)
+        return np.where(own[pos] == ids, pos, -1)
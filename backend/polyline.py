@@ -0,0 +1,236 @@
+"""
+NumPy polyline toolkit.
+
+Google encoded polylines are decoded to / encoded from float arrays of
+shape (N, 2) holding (lat, lng), and all distance helpers work on whole
+arrays at once instead of looping over points in Python.
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+# Longest chunk sequence a 32-bit zigzag value can need
+_MAX_CHUNKS = 7
+
+
+def decode(encoded: str, precision: int = 5) -> np.ndarray:
+    """Decode a Google encoded polyline into an (N, 2) float array of (lat, lng); ValueError if malformed."""
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+    chars = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = chars < 0x20
+    if chars.min() < 0 or chars.max() > 0x3F or not ends[-1]:
+        raise ValueError("malformed encoded polyline")
+    # Each value is a run of 5-bit chunks, least significant first, ending
+    # with the first chunk below 0x20
+    starts = np.concatenate(([0], np.flatnonzero(ends)[:-1] + 1))
+    pos = np.arange(len(chars)) - np.repeat(starts, np.diff(np.append(starts, len(chars))))
+    values = np.add.reduceat((chars & 0x1F) << (5 * pos), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    coords = np.cumsum(deltas[: len(deltas) // 2 * 2].reshape(-1, 2), axis=0)
+    return coords / 10.0 ** precision
+
+
+def encode(points: np.ndarray, precision: int = 5) -> str:
+    """Encode an (N, 2) array of (lat, lng) as a Google polyline string."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return ""
+    ints = np.round(points * 10.0 ** precision).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=0).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # Split each value into 5-bit chunks; all but the last get the 0x20 flag
+    chunks = (values[:, None] >> (5 * np.arange(_MAX_CHUNKS))) & 0x1F
+    bits = np.maximum(1, np.ceil(np.log2(values + 1) / 5).astype(np.int64))
+    k = np.arange(_MAX_CHUNKS)
+    chunks = np.where(k < (bits - 1)[:, None], chunks | 0x20, chunks) + 63
+    return chunks[k < bits[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+
+def haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Vectorized haversine distance in metres; inputs broadcast."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _project(points: np.ndarray, ref_lat: float) -> np.ndarray:
+    """Equirectangular projection to metres around ref_lat (fine at city scale)."""
+    k = np.radians(1.0) * EARTH_RADIUS_M
+    return np.column_stack((points[:, 1] * k * np.cos(np.radians(ref_lat)), points[:, 0] * k))
+
+
+def segment_distances(points: np.ndarray, lat: float, lng: float) -> np.ndarray:
+    """Distance in metres from (lat, lng) to each segment points[i] -> points[i+1]."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        return haversine(points[:, 0], points[:, 1], lat, lng)
+    xy = _project(points, lat)
+    q = _project(np.array([[lat, lng]]), lat)[0]
+    a, b = xy[:-1], xy[1:]
+    ab = b - a
+    len2 = np.einsum("ij,ij->i", ab, ab)
+    t = np.einsum("ij,ij->i", q - a, ab) / np.where(len2 > 0, len2, 1.0)
+    closest = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+    return np.hypot(*(closest - q).T)
+
+
+def distance_to_point(points: np.ndarray, lat: float, lng: float) -> float:
+    """Shortest distance in metres from (lat, lng) to the polyline."""
+    if len(points) == 0:
+        return float("inf")
+    return float(segment_distances(points, lat, lng).min())
+
+
+def passes_near(points: np.ndarray, lat: float, lng: float, max_dist_m: float) -> bool:
+    return distance_to_point(points, lat, lng) < max_dist_m
+
+
+def cumulative_distance(points: np.ndarray) -> np.ndarray:
+    """Distance along the polyline at each vertex, starting at 0."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0:
+        return np.empty(0)
+    seg = haversine(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    return np.concatenate(([0.0], np.cumsum(seg)))
+
+
+def resample(points: np.ndarray, step_m: float) -> np.ndarray:
+    """Points every step_m metres along the polyline (end point included)."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        return points.copy()
+    along = cumulative_distance(points)
+    total = along[-1]
+    targets = np.append(np.arange(0.0, total, step_m), total)
+    return np.column_stack((np.interp(targets, along, points[:, 0]),
+                            np.interp(targets, along, points[:, 1])))
+
+
+def simplify(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker simplification; keeps vertices further than tolerance_m from the simplified line."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3 or tolerance_m <= 0:
+        return points.copy()
+    xy = _project(points, float(points[:, 0].mean()))
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = xy[i], xy[j]
+        ab = b - a
+        rel = xy[i + 1:j] - a
+        len2 = ab @ ab
+        if len2 > 0:
+            t = np.clip(rel @ ab / len2, 0.0, 1.0)
+            d = np.hypot(*(rel - t[:, None] * ab).T)
+        else:
+            d = np.hypot(*rel.T)
+        k = int(d.argmax())
+        if d[k] > tolerance_m:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return points[keep]
+
+
+def point_at(points: np.ndarray, dist_m: float) -> tuple[float, float]:
+    """(lat, lng) dist_m metres along the polyline (clamped to its ends)."""
+    points = np.asarray(points, dtype=np.float64)
+    along = cumulative_distance(points)
+    d = min(max(dist_m, 0.0), along[-1])
+    return float(np.interp(d, along, points[:, 0])), float(np.interp(d, along, points[:, 1]))
+
+
+class SegmentIndex:
+    """
+    Uniform grid over the segments of many polylines, for nearest-segment
+    queries. Each segment is registered in every cell its bounding box
+    touches; a query checks the cells within reach with one vectorized
+    point-to-segment distance over the candidates.
+    """
+
+    def __init__(self, lines: list[np.ndarray], cell_m: float = 50, ref_lat: float | None = None):
+        lines = [np.asarray(line, dtype=np.float64).reshape(-1, 2) for line in lines]
+        if ref_lat is None:
+            lats = [line[:, 0].mean() for line in lines if len(line)]
+            ref_lat = float(np.mean(lats)) if lats else 0.0
+        self.ref_lat = ref_lat
+        self.cell_m = cell_m
+
+        a_parts, b_parts, line_ids, seg_ids = [], [], [], []
+        for li, line in enumerate(lines):
+            if len(line) < 2:
+                continue
+            xy = _project(line, ref_lat)
+            a_parts.append(xy[:-1])
+            b_parts.append(xy[1:])
+            line_ids.append(np.full(len(line) - 1, li, dtype=np.int64))
+            seg_ids.append(np.arange(len(line) - 1, dtype=np.int64))
+        if a_parts:
+            self.a = np.concatenate(a_parts)
+            self.b = np.concatenate(b_parts)
+            self.line_id = np.concatenate(line_ids)
+            self.seg_id = np.concatenate(seg_ids)
+        else:
+            self.a = self.b = np.empty((0, 2))
+            self.line_id = self.seg_id = np.empty(0, dtype=np.int64)
+
+        lo = np.floor(np.minimum(self.a, self.b) / cell_m).astype(np.int64)
+        hi = np.floor(np.maximum(self.a, self.b) / cell_m).astype(np.int64)
+        cells: dict[tuple[int, int], list[int]] = {}
+        for s, (x0, y0, x1, y1) in enumerate(np.column_stack((lo, hi)).tolist()):
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cells.setdefault((cx, cy), []).append(s)
+        self._cells = {k: np.asarray(v, dtype=np.int64) for k, v in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self.a)
+
+    def _candidates(self, q: np.ndarray, radius_m: float) -> np.ndarray:
+        cx, cy = np.floor(q / self.cell_m).astype(np.int64)
+        reach = int(np.ceil(radius_m / self.cell_m))
+        found = [self._cells[(i, j)]
+                 for i in range(cx - reach, cx + reach + 1)
+                 for j in range(cy - reach, cy + reach + 1)
+                 if (i, j) in self._cells]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def _distances(self, q: np.ndarray, segs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(distance, position 0..1 along segment) from q to each candidate segment."""
+        a, b = self.a[segs], self.b[segs]
+        ab = b - a
+        len2 = np.einsum("ij,ij->i", ab, ab)
+        t = np.clip(np.einsum("ij,ij->i", q - a, ab) / np.where(len2 > 0, len2, 1.0), 0.0, 1.0)
+        return np.hypot(*(a + t[:, None] * ab - q).T), t
+
+    def nearest(self, lat: float, lng: float, max_m: float) -> tuple[int, int, float, float] | None:
+        """(line index, segment index, distance m, t along segment) of the closest segment within max_m."""
+        q = _project(np.array([[lat, lng]]), self.ref_lat)[0]
+        segs = self._candidates(q, max_m)
+        if not len(segs):
+            return None
+        d, t = self._distances(q, segs)
+        k = int(d.argmin())
+        if d[k] > max_m:
+            return None
+        s = segs[k]
+        return int(self.line_id[s]), int(self.seg_id[s]), float(d[k]), float(t[k])
+
+    def within(self, lat: float, lng: float, max_m: float) -> list[tuple[int, int, float, float]]:
+        """All segments within max_m, as (line index, segment index, distance m, t)."""
+        q = _project(np.array([[lat, lng]]), self.ref_lat)[0]
+        segs = self._candidates(q, max_m)
+        if not len(segs):
+            return []
+        d, t = self._distances(q, segs)
+        hit = d <= max_m
+        return list(zip(self.line_id[segs[hit]].tolist(), self.seg_id[segs[hit]].tolist(),
+                        d[hit].tolist(), t[hit].tolist()))
@@ -0,0 +1,185 @@
+"""
+Opt-in per-request profiling (PROFILING_ENABLED).
+
+A request asks for it with `?profile=1` or an `X-Profile: 1` header:
+- the request runs under pyinstrument's sampling profiler (async-aware, so
+  awaited Mongo/Google time shows up under the awaiting frame; it is in
+  requirements.txt), or under cProfile if pyinstrument isn't installed
+- the report (pyinstrument HTML, or a cProfile .prof for snakeviz/flameprof)
+  is stored under PROFILE_DIR, named in the X-Profile-Report header and
+  served by GET /api/profiles/{name}; `profile=html` returns the report
+  instead of the normal response body (pyinstrument only)
+- the response gets a Server-Timing header with the phases recorded
+  through phase()/record() (compute_route's waypoints/routing/annotate, the
+  layer cache's load/encode), plus the total until the response started
+
+One request is profiled at a time (a profiler hooks the whole thread);
+others asking meanwhile get Server-Timing and "X-Profile: busy".
+"""
+import asyncio
+import cProfile
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from urllib.parse import parse_qs
+from config import get_settings
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional; falls back to cProfile
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+# (phase, seconds) for the request being profiled; None outside one
+_timings: ContextVar[list | None] = ContextVar("server_timings", default=None)
+_busy = False
+
+REPORT_NAME = re.compile(r"^[\w.-]+\.(html|prof)$")
+
+
+def record(name: str, seconds: float):
+    """Add a phase to the current request's Server-Timing (no-op unless it's profiled)."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def server_timing(timings: list[tuple[str, float]]) -> str:
+    """Server-Timing header value, repeated phases summed, in first-seen order."""
+    totals: dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def report_path(name: str) -> Path | None:
+    """Stored report by name, if it exists (names are checked, so no path traversal)."""
+    if not REPORT_NAME.match(name):
+        return None
+    path = Path(get_settings().PROFILE_DIR) / name
+    return path if path.is_file() else None
+
+
+def _requested(scope) -> str | None:
+    for key, value in scope["headers"]:
+        if key == b"x-profile":
+            return value.decode("latin-1").strip().lower() or None
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+    return values[-1].strip().lower() if values else None
+
+
+class _Session:
+    """The profiler for one request, and where its report goes."""
+
+    def __init__(self, path: str):
+        slug = re.sub(r"[^\w]+", "-", path).strip("-")[:60] or "root"
+        suffix = "html" if Profiler else "prof"
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:6]}.{suffix}"
+        if Profiler:
+            self._profiler = Profiler(interval=get_settings().PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if Profiler:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if Profiler:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def html(self) -> bytes | None:
+        return self._profiler.output_html().encode("utf-8") if Profiler else None
+
+    def save(self):
+        settings = get_settings()
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        if Profiler:
+            (directory / self.name).write_text(self._profiler.output_html(), encoding="utf-8")
+        else:
+            self._profiler.dump_stats(directory / self.name)
+        # Keep the newest PROFILE_KEEP reports
+        reports = sorted(p for p in directory.iterdir() if REPORT_NAME.match(p.name))
+        for old in reports[:-settings.PROFILE_KEEP]:
+            old.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running opted-in requests under a profiler (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _busy
+        mode = _requested(scope) if scope["type"] == "http" else None
+        if mode in (None, "0", "false"):
+            await self.app(scope, receive, send)
+            return
+
+        timings: list[tuple[str, float]] = []
+        token = _timings.set(timings)
+        session = None if _busy else _Session(scope["path"])
+        inline = session is not None and mode == "html" and Profiler is not None
+        start = time.perf_counter()
+        # With profile=html the app's own response is swallowed
+        held: list[dict] = []
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings.append(("total", time.perf_counter() - start))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                if session is None:
+                    headers.append((b"x-profile", b"busy"))
+                elif not inline:
+                    headers.append((b"x-profile-report", session.name.encode("latin-1")))
+                message = {**message, "headers": headers}
+            if inline:
+                held.append(message)
+            else:
+                await send(message)
+
+        if session is not None:
+            _busy = True
+            session.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            if session is not None:
+                session.stop()
+                _busy = False
+        if session is None:
+            return
+        if inline:
+            body = session.html()
+            headers = [(k, v) for k, v in held[0]["headers"] if k == b"server-timing"] if held else []
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": headers + [(b"content-type", b"text/html; charset=utf-8"),
+                                              (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await asyncio.to_thread(session.save)
+        except OSError as exc:
+            logger.warning("Could not store profile %s: %s", session.name, exc)
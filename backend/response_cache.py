@@ -0,0 +1,170 @@
+"""
+Content-addressed on-disk cache for the seed scripts' Overpass and HERE responses.
+
+A response is stored under sha256(endpoint + request) as gzip-compressed
+JSON, where `endpoint` names the service ("overpass", not the mirror that
+happened to answer) and `request` is the query text or the URL without its
+API key. Modes:
+- "use":      fresh cache entries (younger than the TTL) are served from disk,
+              everything else is fetched and written back
+- "refresh":  always fetch, and overwrite the cache
+- "offline":  replay from disk only, regardless of age; a miss returns None
+- "off":      no disk access at all
+Within a run, identical requests share one fetch even when issued
+concurrently, so the same Overpass extract is never downloaded twice.
+fetch_file() is the variant for extracts too large to hold as one object:
+the raw body is streamed to a gzip file and handed back for incremental
+parsing (in "off" mode a temporary file, deleted when the caller is done).
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+
+MODES = ("use", "refresh", "offline", "off")
+
+
+class ResponseCache:
+    def __init__(self, directory: str | Path, ttl_seconds: float, mode: str = "use"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {MODES}")
+        directory = Path(directory)
+        if not directory.is_absolute():
+            directory = Path(__file__).resolve().parent / directory
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key(endpoint: str, request: str) -> str:
+        return hashlib.sha256(f"{endpoint}\n{request}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def _fresh(self, path: Path) -> bool:
+        try:
+            age = time.time() - path.stat().st_mtime
+        except OSError:
+            return False
+        return self.mode == "offline" or age <= self.ttl_seconds
+
+    def _read(self, key: str) -> dict | None:
+        path = self._path(key)
+        if not self._fresh(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, key: str, endpoint: str, request: str, response: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"endpoint": endpoint, "request": request, "response": response}, f)
+        os.replace(tmp, path)
+
+    async def fetch(self, endpoint: str, request: str,
+                    fetch: Callable[[], Awaitable[dict | None]]) -> dict | None:
+        """
+        Response for (endpoint, request), from disk or via fetch().
+        fetch() returns None on failure; failures are not cached.
+        """
+        key = self.key(endpoint, request)
+        return await self._shared(key, lambda: self._load(key, endpoint, request, fetch))
+
+    @asynccontextmanager
+    async def fetch_file(self, endpoint: str, request: str,
+                         download: Callable[[Path], Awaitable[bool]]) -> AsyncIterator[Path | None]:
+        """
+        async with: gzip file holding the raw response body for (endpoint,
+        request), or None on failure. download(path) streams the body into
+        `path` (gzip-compressed) and returns True on success. In "off" mode
+        the file is a temporary one of this caller's, deleted on exit.
+        """
+        if self.mode == "off":
+            self.misses += 1
+            fd, name = tempfile.mkstemp(suffix=".raw.gz")
+            os.close(fd)
+            path = Path(name)
+            try:
+                yield path if await download(path) else None
+            finally:
+                path.unlink(missing_ok=True)
+            return
+        key = self.key(endpoint, request)
+        yield await self._shared("raw:" + key, lambda: self._load_file(key, endpoint, download))
+
+    async def _shared(self, key: str, load: Callable[[], Awaitable]):
+        """Run load() once per key per run; concurrent and later callers get its result."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await load()
+        except asyncio.CancelledError:
+            self._inflight.pop(key, None)
+            future.cancel()
+            raise
+        except BaseException as exc:
+            self._inflight.pop(key, None)
+            # Waiters get the real error; retrieved here so an unawaited future isn't logged
+            future.set_exception(exc)
+            future.exception()
+            raise
+        future.set_result(response)
+        if response is None:
+            # Let a later caller retry
+            self._inflight.pop(key, None)
+        return response
+
+    async def _load(self, key: str, endpoint: str, request: str, fetch) -> dict | None:
+        if self.mode in ("use", "offline"):
+            cached = await asyncio.to_thread(self._read, key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        if self.mode == "offline":
+            self.misses += 1
+            print(f"  [cache] offline miss for {endpoint} ({key[:12]})")
+            return None
+        self.misses += 1
+        response = await fetch()
+        if response is not None and self.mode != "off":
+            await asyncio.to_thread(self._write, key, endpoint, request, response)
+        return response
+
+    async def _load_file(self, key: str, endpoint: str, download) -> Path | None:
+        path = self.directory / key[:2] / f"{key}.raw.gz"
+        if self.mode in ("use", "offline") and self._fresh(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        if self.mode == "offline":
+            print(f"  [cache] offline miss for {endpoint} ({key[:12]})")
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        if not await download(tmp):
+            tmp.unlink(missing_ok=True)
+            return None
+        os.replace(tmp, path)
+        return path
+
+    def summary(self) -> str:
+        return f"{self.hits} from cache, {self.misses} not ({self.mode}, {self.directory})"
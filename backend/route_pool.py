@@ -0,0 +1,110 @@
+"""
+Background pool of pre-generated routes for /api/routes/generate.
+
+A worker keeps ROUTE_POOL_SIZE ready routes for both motorway variants
+(0 by default: the pool is opt-in, as it spends Google Routes quota).
+Only results whose first route is within_target are kept, and routes older
+than ROUTE_POOL_MAX_AGE_SECONDS are dropped so traffic-aware durations
+don't go stale. Popping a route wakes the worker to refill right away.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = (True, False)  # include_motorway
+# Give up on a fill round after this many off-target / failed attempts
+MAX_ATTEMPTS_PER_FILL = 4
+ERROR_BACKOFF_SECONDS = 60
+
+
+class RoutePool:
+    def __init__(self):
+        self.size = 0
+        self.max_age = 0.0
+        self._routes: dict[bool, deque] = {v: deque() for v in VARIANTS}
+        self._generate: Callable[[bool], Awaitable[dict]] | None = None
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self, generate: Callable[[bool], Awaitable[dict]], size: int, max_age: float):
+        """Start the refill worker; `generate(include_motorway)` returns a /generate body."""
+        if size <= 0:
+            logger.info("Route pool disabled (ROUTE_POOL_SIZE=0)")
+            return
+        self.size = size
+        self.max_age = max_age
+        self._generate = generate
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _prune(self, include_motorway: bool):
+        q = self._routes[include_motorway]
+        cutoff = time.monotonic() - self.max_age
+        while q and q[0][0] < cutoff:
+            q.popleft()
+
+    def pop(self, include_motorway: bool) -> dict | None:
+        """Newest-first ready route for this variant, or None if the pool is empty."""
+        if self._task is None:
+            return None
+        self._prune(include_motorway)
+        q = self._routes[include_motorway]
+        if not q:
+            self._wake.set()
+            return None
+        _, result = q.pop()
+        self._wake.set()
+        return result
+
+    def stats(self) -> dict:
+        return {("motorway" if v else "no_motorway"): len(self._routes[v]) for v in VARIANTS}
+
+    async def _fill(self, include_motorway: bool) -> bool:
+        """Top up one variant. Returns False if generation kept failing."""
+        q = self._routes[include_motorway]
+        failures = 0
+        while len(q) < self.size and failures < MAX_ATTEMPTS_PER_FILL:
+            try:
+                result = await self._generate(include_motorway)
+            except Exception as exc:
+                logger.warning("Route pool: generation failed: %s", exc)
+                failures += 1
+                continue
+            routes = result.get("routes", [])
+            if not routes or not routes[0].get("within_target"):
+                failures += 1
+                continue
+            q.append((time.monotonic(), result))
+        return len(q) >= self.size
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            healthy = True
+            for variant in VARIANTS:
+                self._prune(variant)
+                healthy = await self._fill(variant) and healthy
+            if not healthy:
+                # Don't hammer the API while it keeps failing, even if woken
+                await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+                continue
+            # Sleep until a route is popped or pooled routes start expiring
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.max_age / 2)
+            except asyncio.TimeoutError:
+                pass
+
+
+route_pool = RoutePool()
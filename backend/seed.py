@@ -1,12 +1,36 @@
 """
 One-time seed script: query Overpass API locally and store results in MongoDB.
 Run this once: python seed.py
+Reruns only write what changed in OSM; python seed.py --full rebuilds every
+layer in a staging collection and swaps it in.
+Overpass/HERE responses are cached on disk (SEED_CACHE_*): --offline replays
+them without network, --refresh-cache downloads everything again.
+--center <id> seeds another test centre from centers.py into the same
+collections (documents carry a `center` field).
 """
-import httpx
 import asyncio
+import gzip
+import json
+import math
 import random
+from pathlib import Path
+import httpx
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 from config import get_settings
+from datasets import bump_dataset_version, read_dataset_version, layer_change
+from geo import geo_point, geo_line
+import polyline
+from http_client import get_client, close_client
+from osm import DRIVABLE_TYPES, oneway_direction
+from tiles import build_tiles
+from seed_store import GEO_INDEXES, create_indexes, store_layer, describe, changed, change_entry
+from centers import CENTERS, center_filter, get_center
+from response_cache import ResponseCache
+from rate_limit import TokenBucket
+from osm_tables import NodeTable, WayTable, iter_elements
+from speed_layer import build_speed_layer
+import hojre
 
 settings = get_settings()
 client = AsyncIOMotorClient(settings.MONGODB_URI)
@@ -19,21 +43,80 @@ OVERPASS_ENDPOINTS = [
     "https://overpass.openstreetmap.ru/api/interpreter",
 ]
 
-START_LAT = 55.634464
-START_LNG = 12.650135
-RADIUS = 4000
+# Test centre being seeded (--center <id>, see centers.py)
+CENTER = get_center()
+
+# Overpass/HERE responses: shared within a run, cached on disk across runs
+cache = ResponseCache(settings.SEED_CACHE_DIR, settings.SEED_CACHE_TTL_SECONDS, settings.SEED_CACHE_MODE)
+
+
+def maxspeed_query() -> str:
+    """Roads with a mapped maxspeed; used by both the OSM and the merged speed layers."""
+    return f"""
+    [out:json][timeout:60];
+    (
+      way["highway"]["maxspeed"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
+    );
+    out body geom;
+    """
+
+# "incremental" diffs against the stored layers; --full rebuilds them via staging collections
+SEED_MODE = "incremental"
+# Collections that changed during this run, and what changed (for the change log)
+_changed: set[str] = set()
+_changes: list[dict] = []
+
+
+async def ensure_geo_indexes(name: str):
+    await create_indexes(db[name], name)
+
 
-_query_count = 0
+async def store(name: str, docs: list[dict], key: str = "osm_id") -> dict:
+    """Store a freshly seeded layer for CENTER (see seed_store) and report what changed."""
+    for doc in docs:
+        doc["center"] = CENTER.id
+    stats = await store_layer(db, name, docs, key=key, mode=SEED_MODE, scope=center_filter(CENTER.id))
+    if changed(stats):
+        _changed.add(name)
+        _changes.append(change_entry(CENTER.id, name, stats))
+    print(f"  {name}: {describe(stats)}")
+    return stats
 
 
 async def query_overpass(query: str, max_retries: int = 8) -> dict:
-    global _query_count
-    _query_count += 1
+    # Whitespace-insensitive key: the same query indented differently is the same extract
+    data = await cache.fetch("overpass", " ".join(query.split()),
+                             lambda: _fetch_overpass(query, max_retries))
+    return data if data is not None else {"elements": []}
 
-    # Polite delay between queries to avoid rate limits
-    if _query_count > 1:
-        await asyncio.sleep(5)
 
+def query_overpass_file(query: str, max_retries: int = 8):
+    """
+    Like query_overpass(), for the big extracts: `async with` gives a gzip
+    file the response was streamed to (cached like the rest), or None, for
+    osm_tables.iter_elements().
+    """
+    return cache.fetch_file("overpass", " ".join(query.split()),
+                                  lambda path: _download_overpass(query, path, max_retries))
+
+
+async def _fetch_overpass(query: str, max_retries: int) -> dict | None:
+    async def read(resp: httpx.Response) -> dict:
+        return json.loads(await resp.aread())
+    return await _overpass_request(query, max_retries, read)
+
+
+async def _download_overpass(query: str, path: Path, max_retries: int) -> bool:
+    async def read(resp: httpx.Response) -> bool:
+        with gzip.open(path, "wb", compresslevel=6) as f:
+            async for chunk in resp.aiter_bytes():
+                f.write(chunk)
+        return True
+    return bool(await _overpass_request(query, max_retries, read))
+
+
+async def _overpass_request(query: str, max_retries: int, read):
+    """Try the mirrors in turn; read(resp) consumes a streamed 200 response. None if all fail."""
     endpoints = OVERPASS_ENDPOINTS[:]
     random.shuffle(endpoints)
 
@@ -46,35 +129,32 @@ async def query_overpass(query: str, max_retries: int = 8) -> dict:
         url = endpoints[attempt % len(endpoints)]
         short = url.split("//")[1].split("/")[0]
         print(f"  [{short}] attempt {attempt+1}...")
+        status = None
         try:
-            async with httpx.AsyncClient(timeout=120, follow_redirects=True) as c:
-                resp = await c.post(url, data={"data": query}, headers=headers)
-                if resp.status_code == 200:
-                    return resp.json()
-                if resp.status_code == 429:
-                    print(f"  [{short}] rate limited, waiting 30s...")
-                    await asyncio.sleep(30)
-                else:
-                    print(f"  [{short}] status {resp.status_code}, rotating...")
+            async with get_client().stream(
+                "POST", url, data={"data": query}, headers=headers,
+                timeout=settings.OVERPASS_TIMEOUT_SECONDS, follow_redirects=True,
+            ) as resp:
+                status = resp.status_code
+                if status == 200:
+                    return await read(resp)
+            if status == 429:
+                print(f"  [{short}] rate limited, waiting 30s...")
+                await asyncio.sleep(30)
+            else:
+                print(f"  [{short}] status {status}, rotating...")
         except Exception as e:
             print(f"  [{short}] error: {type(e).__name__}, rotating...")
         wait = 5 + attempt * 3
         await asyncio.sleep(wait)
 
     print("  ALL endpoints exhausted after retries")
-    return {"elements": []}
+    return None
 
 
 async def seed_speed_limits():
     print("\n=== SPEED LIMITS ===")
-    query = f"""
-    [out:json][timeout:60];
-    (
-      way["highway"]["maxspeed"](around:{RADIUS},{START_LAT},{START_LNG});
-    );
-    out body geom;
-    """
-    data = await query_overpass(query)
+    data = await query_overpass(maxspeed_query())
 
     roads = []
     for el in data.get("elements", []):
@@ -82,18 +162,21 @@ async def seed_speed_limits():
         geometry = el.get("geometry", [])
         if not geometry:
             continue
-        roads.append({
+        points = [{"lat": p["lat"], "lng": p["lon"]} for p in geometry]
+        road = {
             "osm_id": el["id"],
             "name": tags.get("name", "Unavngivet"),
             "maxspeed": tags.get("maxspeed", "50"),
             "highway_type": tags.get("highway", ""),
-            "geometry": [{"lat": p["lat"], "lng": p["lon"]} for p in geometry],
-        })
-
-    col = db["speed_limits"]
-    await col.drop()
-    if roads:
-        await col.insert_many(roads)
+            "geometry": points,
+            "polyline": polyline.encode([[p["lat"], p["lng"]] for p in points]),
+        }
+        path = geo_line(points)
+        if path:
+            road["path"] = path
+        roads.append(road)
+
+    await store("speed_limits", roads)
     print(f"  Stored {len(roads)} roads with speed limits")
     return len(roads)
 
@@ -103,9 +186,9 @@ async def seed_signed_intersections():
     query = f"""
     [out:json][timeout:60];
     (
-      node["highway"="traffic_signals"](around:{RADIUS},{START_LAT},{START_LNG});
-      node["highway"="give_way"](around:{RADIUS},{START_LAT},{START_LNG});
-      node["highway"="stop"](around:{RADIUS},{START_LAT},{START_LNG});
+      node["highway"="traffic_signals"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
+      node["highway"="give_way"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
+      node["highway"="stop"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     );
     out body;
     """
@@ -128,12 +211,10 @@ async def seed_signed_intersections():
             "lat": el["lat"],
             "lng": el["lon"],
             "type": t,
+            "location": geo_point(el["lat"], el["lon"]),
         })
 
-    col = db["signed_intersections"]
-    await col.drop()
-    if signed:
-        await col.insert_many(signed)
+    await store("signed_intersections", signed)
     print(f"  Stored {len(signed)} signed intersections")
     return {el["osm_id"] for el in signed}
 
@@ -145,146 +226,37 @@ async def seed_hojre_vigepligt(signed_ids: set):
     - No footway/cycleway/pedestrian shares any node with the connecting residential ways
     - Connecting residential ways have no sidewalk/cycleway tags
     - No signs, roundabouts, cobblestone surfaces
+    Both Overpass extracts are streamed into osm_tables and classified by hojre.classify().
     """
     print("\n=== HØJRE VIGEPLIGT (villa quarter residential junctions only) ===")
-    from collections import defaultdict
 
     # Fetch residential + nearby infra + bigger roads in one query
     query = f"""
     [out:json][timeout:120];
     (
-      way["highway"~"residential|tertiary|secondary|primary|trunk|motorway|service|track|footway|cycleway|pedestrian|path|steps|living_street|unclassified"](around:{RADIUS},{START_LAT},{START_LNG});
+      way["highway"~"residential|tertiary|secondary|primary|trunk|motorway|service|track|footway|cycleway|pedestrian|path|steps|living_street|unclassified"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     );
     out body;
     """
-    data = await query_overpass(query)
-
-    DISQUALIFYING_SURFACES = {"cobblestone", "paving_stones", "sett", "unhewn_cobblestone"}
-    INFRA_TYPES = {"footway", "cycleway", "pedestrian", "path", "steps", "crossing"}
-
-    # Per node: which highway types touch it, which way IDs
-    node_road_types: dict[int, set] = {}
-    node_way_ids: dict[int, set] = {}
-    node_poison: dict[int, set] = {}
-
-    # Per way: its node list and tags
-    way_nodes: dict[int, list[int]] = {}
-    residential_way_ids: set[int] = set()
-
-    # All nodes that belong to infrastructure ways (footway/cycleway/etc.)
-    infra_nodes: set[int] = set()
-
-    for el in data.get("elements", []):
-        if el["type"] != "way":
-            continue
-        tags = el.get("tags", {})
-        hw = tags.get("highway", "")
-        way_id = el["id"]
-        nodes = el.get("nodes", [])
-        way_nodes[way_id] = nodes
-        is_roundabout = tags.get("junction", "") in ("roundabout", "circular")
-        surface = tags.get("surface", "")
-        sidewalk = tags.get("sidewalk", "no")
-        cycleway_tag = tags.get("cycleway", "no")
-        has_infra_tags = sidewalk not in ("no", "none", "") or cycleway_tag not in ("no", "none", "")
-
-        if hw == "residential":
-            residential_way_ids.add(way_id)
-
-        # Collect all nodes on infrastructure ways
-        if hw in INFRA_TYPES:
-            infra_nodes.update(nodes)
-
-        for nid in nodes:
-            if nid not in node_road_types:
-                node_road_types[nid] = set()
-                node_way_ids[nid] = set()
-                node_poison[nid] = set()
-            node_road_types[nid].add(hw)
-            node_way_ids[nid].add(way_id)
-            if is_roundabout:
-                node_poison[nid].add("roundabout")
-            if surface in DISQUALIFYING_SURFACES:
-                node_poison[nid].add("surface")
-            if hw == "residential" and has_infra_tags:
-                node_poison[nid].add("sidewalk_on_road")
-
-    print(f"  {len(infra_nodes)} infrastructure nodes (footway/cycleway/pedestrian)")
-    print(f"  {len(residential_way_ids)} residential ways")
-
-    # For each residential way, check if ANY of its nodes is also on an infra way
-    # If so, ALL nodes on that way are "tainted" — it's not a pure villa street
-    tainted_way_ids: set[int] = set()
-    for wid in residential_way_ids:
-        nodes = way_nodes.get(wid, [])
-        for nid in nodes:
-            if nid in infra_nodes:
-                tainted_way_ids.add(wid)
-                break
-
-    print(f"  {len(tainted_way_ids)} residential ways touch a footway/cycleway (tainted)")
-
     # Get node coordinates
     nodes_query = f"""
     [out:json][timeout:90];
-    way["highway"="residential"](around:{RADIUS},{START_LAT},{START_LNG});
+    way["highway"="residential"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     node(w);
     out body;
     """
-    nodes_data = await query_overpass(nodes_query)
-    all_nodes = {el["id"]: el for el in nodes_data.get("elements", []) if el["type"] == "node"}
+    async with query_overpass_file(query) as ways_file, query_overpass_file(nodes_query) as nodes_file:
+        if ways_file is None or nodes_file is None:
+            print("  SKIPPED — Overpass extract unavailable")
+            return
+        ways = await asyncio.to_thread(WayTable.from_elements, iter_elements(ways_file), hojre.way_flags)
+        nodes = await asyncio.to_thread(NodeTable.from_elements, iter_elements(nodes_file), hojre.node_flags)
+    print(f"  {len(ways)} ways, {len(nodes)} residential nodes")
+    junctions, skip_reasons = await asyncio.to_thread(hojre.classify, ways, nodes, signed_ids)
 
-    # Check node-level tags
-    for nid, el in all_nodes.items():
-        tags = el.get("tags", {})
-        node_hw = tags.get("highway", "")
-        if node_hw in ("crossing", "give_way", "stop", "traffic_signals"):
-            if nid not in node_poison:
-                node_poison[nid] = set()
-            node_poison[nid].add(f"node:{node_hw}")
-        if tags.get("crossing"):
-            if nid not in node_poison:
-                node_poison[nid] = set()
-            node_poison[nid].add("crossing")
-
-    hojre = []
-    skip_reasons = defaultdict(int)
-    for nid, road_types in node_road_types.items():
-        if nid not in all_nodes:
-            continue
-        way_ids = node_way_ids.get(nid, set())
-        if len(way_ids) < 2:
-            continue
-        if nid in signed_ids:
-            skip_reasons["signed"] += 1
-            continue
-        if node_poison.get(nid):
-            skip_reasons["poison"] += 1
-            continue
-        # ALL road types at this node must be residential only
-        if road_types != {"residential"}:
-            skip_reasons["not_pure_residential"] += 1
-            continue
-        # None of the connecting residential ways should be tainted (touch infra)
-        if way_ids & tainted_way_ids:
-            skip_reasons["way_touches_infra"] += 1
-            continue
-
-        el = all_nodes[nid]
-        hojre.append({
-            "osm_id": nid,
-            "lat": el["lat"],
-            "lng": el["lon"],
-            "type": "hojre_vigepligt",
-            "way_count": len(way_ids),
-        })
-
-    col = db["hojre_vigepligt"]
-    await col.drop()
-    if hojre:
-        await col.insert_many(hojre)
-    print(f"  Stored {len(hojre)} højre vigepligt junctions (out of {len(all_nodes)} residential nodes)")
-    print(f"  Skip reasons: {dict(skip_reasons)}")
+    await store("hojre_vigepligt", junctions)
+    print(f"  Stored {len(junctions)} højre vigepligt junctions (out of {len(nodes)} residential nodes)")
+    print(f"  Skip reasons: {skip_reasons}")
 
 
 def decode_here_polyline(encoded: str) -> list[tuple[float, float]]:
@@ -295,117 +267,145 @@ def decode_here_polyline(encoded: str) -> list[tuple[float, float]]:
     return [(lat, lng) for lat, lng, *_ in flexpolyline.decode(encoded)]
 
 
+def here_route_pairs(directions: int) -> list[tuple[tuple[float, float], tuple[float, float]]]:
+    """
+    Route pairs through the area: centre <-> each of `directions` edge points,
+    opposite edges, and quarter-turn chords that cross off-centre.
+    """
+    edge_points = []
+    for k in range(directions):
+        angle = 2 * math.pi * k / directions
+        dlat = (CENTER.radius_m / 111000) * math.cos(angle)
+        dlng = (CENTER.radius_m / (111000 * math.cos(math.radians(CENTER.lat)))) * math.sin(angle)
+        edge_points.append((round(CENTER.lat + dlat, 6), round(CENTER.lng + dlng, 6)))
+    center = (CENTER.lat, CENTER.lng)
+
+    pairs = []
+    for ep in edge_points:
+        pairs.append((center, ep))
+        pairs.append((ep, center))
+    half = directions // 2
+    for i in range(half):
+        pairs.append((edge_points[i], edge_points[i + half]))
+    quarter = directions // 4
+    if quarter > 1:
+        for i in range(directions):
+            pairs.append((edge_points[i], edge_points[(i + quarter) % directions]))
+    return pairs
+
+
+def here_speed_points(data: dict) -> list[tuple[float, float, int]]:
+    """(lat, lng, km/h) samples from the speedLimit spans of a HERE routes response."""
+    points = []
+    for route in data.get("routes", []):
+        for section in route.get("sections", []):
+            polyline_str = section.get("polyline", "")
+            spans = section.get("spans", [])
+            if not polyline_str or not spans:
+                continue
+
+            try:
+                coords = decode_here_polyline(polyline_str)
+            except Exception:
+                continue
+
+            # Each span has offset (index into polyline) and speedLimit (m/s)
+            for si, span in enumerate(spans):
+                offset = span.get("offset", 0)
+                speed_ms = span.get("speedLimit", 0)
+                if not speed_ms or speed_ms <= 0:
+                    continue
+                speed_kmh = round(speed_ms * 3.6)
+
+                # Get coords at offset
+                if offset < len(coords):
+                    lat, lng = coords[offset]
+                    points.append((lat, lng, speed_kmh))
+
+                    # Also sample midpoint to next span for coverage
+                    next_offset = spans[si + 1]["offset"] if si + 1 < len(spans) else len(coords) - 1
+                    mid = (offset + next_offset) // 2
+                    if mid < len(coords) and mid != offset:
+                        mlat, mlng = coords[mid]
+                        points.append((mlat, mlng, speed_kmh))
+    return points
+
+
 async def seed_here_speed_limits():
     """
     One-time seed: use HERE Routing API to get speed limits across the Amager area.
     Creates routes between grid edge points through the area, collects speed limit spans.
-    Stores in google_speed_limits collection (same schema for frontend compat).
+    Pairs are fetched concurrently (HERE_CONCURRENCY), paced by a token bucket
+    (HERE_RATE_PER_SECOND) and retried with backoff on 429/5xx/network errors.
+    Merged with the OSM maxspeed tags into per-way speed runs (speed_layer.py)
+    and stored in google_speed_limits; every document keeps the point
+    fields (lat, lng, speedLimit, units, placeId) for frontend compat.
     """
     print("\n=== HERE SPEED LIMITS (one-time seed) ===")
-    import math
-
     here_key = settings.HERE_API_KEY
-    if not here_key:
+    if not here_key and cache.mode != "offline":
         print("  SKIPPED — no HERE_API_KEY in .env")
         return
 
-    # Generate edge points around the circle for route pairs
-    # Routes from various directions through the area capture all road speeds
-    edge_points = []
-    for angle_deg in range(0, 360, 30):  # 12 directions
-        angle = math.radians(angle_deg)
-        dlat = (RADIUS / 111000) * math.cos(angle)
-        dlng = (RADIUS / (111000 * math.cos(math.radians(START_LAT)))) * math.sin(angle)
-        edge_points.append((round(START_LAT + dlat, 6), round(START_LNG + dlng, 6)))
-
-    # Also add the center
-    center = (START_LAT, START_LNG)
-
-    # Create route pairs: center↔edge and cross-area
-    route_pairs = []
-    for ep in edge_points:
-        route_pairs.append((center, ep))
-        route_pairs.append((ep, center))
-    # Cross-area: opposite edges
-    for i in range(len(edge_points) // 2):
-        j = i + len(edge_points) // 2
-        route_pairs.append((edge_points[i], edge_points[j]))
-
-    print(f"  {len(route_pairs)} route pairs to query")
+    route_pairs = here_route_pairs(settings.HERE_DIRECTIONS)
+    print(f"  {len(route_pairs)} route pairs to query "
+          f"({settings.HERE_CONCURRENCY} at a time, {settings.HERE_RATE_PER_SECOND}/s)")
 
-    all_points = []  # (lat, lng, speed_kmh)
+    bucket = TokenBucket(settings.HERE_RATE_PER_SECOND)
+    sem = asyncio.Semaphore(settings.HERE_CONCURRENCY)
+    done = 0
 
-    for idx, (origin, dest) in enumerate(route_pairs):
-        url = (
+    async def fetch_here(url: str, idx: int) -> dict | None:
+        for attempt in range(settings.HERE_MAX_RETRIES):
+            await bucket.acquire()
+            retry_after = None
+            try:
+                resp = await get_client().get(url)
+                if resp.status_code == 200:
+                    return resp.json()
+                if resp.status_code != 429 and resp.status_code < 500:
+                    print(f"  Route {idx+1}: status {resp.status_code}, giving up")
+                    return None
+                print(f"  Route {idx+1}: status {resp.status_code} (attempt {attempt+1})")
+                retry_after = resp.headers.get("Retry-After")
+            except Exception as e:
+                print(f"  Route {idx+1}: error {type(e).__name__}: {e} (attempt {attempt+1})")
+            # Exponential backoff with jitter, or what the server asks for
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            await asyncio.sleep(min(delay, 30) * random.uniform(0.75, 1.25))
+        print(f"  Route {idx+1}: failed after {settings.HERE_MAX_RETRIES} attempts")
+        return None
+
+    async def harvest(idx: int, origin: tuple, dest: tuple) -> list[tuple[float, float, int]]:
+        nonlocal done
+        # Cache key leaves out the API key
+        request = (
             f"https://router.hereapi.com/v8/routes"
             f"?transportMode=car"
             f"&origin={origin[0]},{origin[1]}"
             f"&destination={dest[0]},{dest[1]}"
             f"&return=polyline,summary&spans=speedLimit"
-            f"&apikey={here_key}"
         )
-
-        try:
-            async with httpx.AsyncClient(timeout=30) as c:
-                resp = await c.get(url)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    for route in data.get("routes", []):
-                        for section in route.get("sections", []):
-                            polyline_str = section.get("polyline", "")
-                            spans = section.get("spans", [])
-                            if not polyline_str or not spans:
-                                continue
-
-                            try:
-                                coords = decode_here_polyline(polyline_str)
-                            except Exception:
-                                continue
-
-                            # Each span has offset (index into polyline) and speedLimit (m/s)
-                            for si, span in enumerate(spans):
-                                offset = span.get("offset", 0)
-                                speed_ms = span.get("speedLimit", 0)
-                                if not speed_ms or speed_ms <= 0:
-                                    continue
-                                speed_kmh = round(speed_ms * 3.6)
-
-                                # Get coords at offset
-                                if offset < len(coords):
-                                    lat, lng = coords[offset]
-                                    all_points.append((lat, lng, speed_kmh))
-
-                                    # Also sample midpoint to next span for coverage
-                                    next_offset = spans[si + 1]["offset"] if si + 1 < len(spans) else len(coords) - 1
-                                    mid = (offset + next_offset) // 2
-                                    if mid < len(coords) and mid != offset:
-                                        mlat, mlng = coords[mid]
-                                        all_points.append((mlat, mlng, speed_kmh))
-
-                    print(f"  Route {idx+1}/{len(route_pairs)}: OK ({len(all_points)} total points)")
-                elif resp.status_code == 429:
-                    print(f"  Route {idx+1}: rate limited, waiting 30s...")
-                    await asyncio.sleep(30)
-                else:
-                    print(f"  Route {idx+1}: status {resp.status_code}")
-        except Exception as e:
-            print(f"  Route {idx+1}: error {type(e).__name__}: {e}")
-
-        # Rate limit: ~10 req/s for free tier
-        await asyncio.sleep(0.2)
+        url = f"{request}&apikey={here_key}"
+        async with sem:
+            data = await cache.fetch("here", request, lambda: fetch_here(url, idx))
+        points = here_speed_points(data) if data is not None else []
+        done += 1
+        if done % 10 == 0 or done == len(route_pairs):
+            print(f"  Routes: {done}/{len(route_pairs)} done")
+        return points
+
+    # gather() keeps pair order, so the merge below is deterministic
+    harvested = await asyncio.gather(*(harvest(i, o, d) for i, (o, d) in enumerate(route_pairs)))
+    all_points = [p for points in harvested for p in points]  # (lat, lng, speed_kmh)
+    print(f"  {len(all_points)} HERE speed points from {sum(1 for h in harvested if h)} routes")
 
     # --- Phase 2: overlay OSM maxspeed data (actual mapped speed signs) ---
     # HERE misses zone 30/40 signs in villa areas and some 60 km/h roads.
     # OSM has explicit maxspeed tags from people mapping the real signs.
     print("  Fetching OSM maxspeed data for overlay...")
-    osm_query = f"""
-    [out:json][timeout:60];
-    (
-      way["highway"]["maxspeed"](around:{RADIUS},{START_LAT},{START_LNG});
-    );
-    out body geom;
-    """
-    osm_data = await query_overpass(osm_query)
+    # Same extract as seed_speed_limits(); the cache makes it one download per run
+    osm_data = await query_overpass(maxspeed_query())
 
     osm_points = []
     for el in osm_data.get("elements", []):
@@ -430,40 +430,19 @@ async def seed_here_speed_limits():
     print(f"  {len(osm_points)} OSM speed points from maxspeed tags")
 
     # Explicit overrides for known locations
-    # Start/parking area at Vindblæs Alle 2 — parking = 20 km/h
-    osm_points.append((START_LAT, START_LNG, 20))
-
-    # --- Phase 3: merge HERE + OSM, OSM overrides HERE ---
-    # First pass: HERE data
-    seen = {}
-    for lat, lng, speed in all_points:
-        key = f"{round(lat * 2000)}_{round(lng * 2000)}"  # ~50m grid
-        if key not in seen:
-            seen[key] = {"lat": round(lat, 6), "lng": round(lng, 6), "speedLimit": speed, "units": "KPH", "placeId": key}
-
-    here_count = len(seen)
-
-    # Second pass: OSM overrides (actual mapped signs beat HERE defaults)
-    osm_added = 0
-    osm_overrides = 0
-    for lat, lng, speed in osm_points:
-        key = f"{round(lat * 2000)}_{round(lng * 2000)}"
-        if key not in seen:
-            seen[key] = {"lat": round(lat, 6), "lng": round(lng, 6), "speedLimit": speed, "units": "KPH", "placeId": key}
-            osm_added += 1
-        elif seen[key]["speedLimit"] != speed:
-            seen[key]["speedLimit"] = speed
-            osm_overrides += 1
-
-    print(f"  HERE: {here_count} cells, OSM added: {osm_added}, OSM overrides: {osm_overrides}")
-
-    unique = list(seen.values())
-
-    col = db["google_speed_limits"]
-    await col.drop()
-    if unique:
-        await col.insert_many(unique)
-    print(f"  Stored {len(unique)} unique merged speed limit records")
+    # Start/parking area at the test centre — parking = 20 km/h
+    osm_points.append((CENTER.lat, CENTER.lng, 20))
+
+    # --- Phase 3: merge HERE + OSM (OSM overrides HERE) onto the drivable ways ---
+    # Same extract as seed_road_graph()
+    ways = road_graph_ways(await query_overpass(road_graph_query()))
+    docs, stats = await asyncio.to_thread(build_speed_layer, all_points, osm_points, ways)
+    print(f"  {stats['cells']} cells ({stats['osm_cells']} from OSM) from {stats['samples']} samples")
+    print(f"  {stats['snapped']} cells snapped onto {len(ways)} ways -> {stats['runs']} speed runs; "
+          f"{stats['free_cells']} off-road cells -> {stats['merged_cells']} merged cells")
+
+    await store("google_speed_limits", docs, key="placeId")
+    print(f"  Stored {len(docs)} merged speed limit records")
 
 
 async def seed_villa_streets():
@@ -471,8 +450,8 @@ async def seed_villa_streets():
     query = f"""
     [out:json][timeout:60];
     (
-      way["highway"="residential"](around:{RADIUS},{START_LAT},{START_LNG});
-      way["highway"="living_street"](around:{RADIUS},{START_LAT},{START_LNG});
+      way["highway"="residential"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
+      way["highway"="living_street"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     );
     out body geom;
     """
@@ -493,37 +472,156 @@ async def seed_villa_streets():
         center_lat = sum(p["lat"] for p in geometry) / len(geometry)
         center_lng = sum(p["lon"] for p in geometry) / len(geometry)
 
-        streets.append({
+        points = [{"lat": p["lat"], "lng": p["lon"]} for p in geometry]
+        street = {
             "osm_id": el["id"],
             "name": name,
             "lat": center_lat,
             "lng": center_lng,
             "highway_type": tags.get("highway", ""),
-            "geometry": [{"lat": p["lat"], "lng": p["lon"]} for p in geometry],
-        })
-
-    col = db["villa_streets"]
-    await col.drop()
-    if streets:
-        await col.insert_many(streets)
+            "geometry": points,
+            "polyline": polyline.encode([[p["lat"], p["lng"]] for p in points]),
+            "location": geo_point(center_lat, center_lng),
+        }
+        path = geo_line(points)
+        if path:
+            street["path"] = path
+        streets.append(street)
+
+    await store("villa_streets", streets)
     print(f"  Stored {len(streets)} unique villa streets")
 
 
-async def main(only_here: bool = False, only_hojre: bool = False, only_speed: bool = False):
+def road_graph_query() -> str:
+    """Drivable ways around CENTER; shared by the road graph and the HERE speed layer."""
+    # A bit past the seed radius so loops near the edge can still close
+    radius = CENTER.radius_m + 1000
+    types = "|".join(DRIVABLE_TYPES)
+    return f"""
+    [out:json][timeout:120];
+    (
+      way["highway"~"^({types})$"]["access"!~"^(private|no)$"](around:{radius},{CENTER.lat},{CENTER.lng});
+    );
+    out body geom;
+    """
+
+
+def road_graph_ways(data: dict) -> list[dict]:
+    ways = []
+    for el in data.get("elements", []):
+        if el["type"] != "way":
+            continue
+        tags = el.get("tags", {})
+        nodes = el.get("nodes", [])
+        geometry = el.get("geometry", [])
+        # Ways clipped by the query area can come back with gaps in geometry
+        if len(nodes) < 2 or len(nodes) != len(geometry) or any(p is None for p in geometry):
+            continue
+        ways.append({
+            "osm_id": el["id"],
+            "name": tags.get("name", ""),
+            "ref": tags.get("ref", ""),
+            "highway_type": tags.get("highway", ""),
+            "maxspeed": tags.get("maxspeed", ""),
+            "oneway": oneway_direction(tags),
+            "nodes": nodes,
+            "geometry": [{"lat": p["lat"], "lng": p["lon"]} for p in geometry],
+        })
+    return ways
+
+
+async def seed_road_graph():
+    """Drivable ways with node ids + geometry for the offline routing engine."""
+    print("\n=== ROAD GRAPH (drivable ways for local routing) ===")
+    ways = road_graph_ways(await query_overpass(road_graph_query()))
+    await store("road_ways", ways)
+    print(f"  Stored {len(ways)} drivable ways")
+
+
+async def seed_map_tiles(version: int):
+    """Pre-build CENTER's map tiles from its seeded layers, tagged with its dataset version."""
+    print("\n=== MAP TILES ===")
+    hidden = {"_id": 0, "location": 0, "path": 0}
+    scope = center_filter(CENTER.id)
+    layers = await asyncio.gather(*(
+        db[name].find(scope, hidden).to_list(None)
+        for name in ("speed_limits", "google_speed_limits", "hojre_vigepligt", "signed_intersections")
+    ))
+    tiles = await asyncio.to_thread(build_tiles, *layers)
+    docs = [
+        {"_id": f"{CENTER.id}/{z}/{x}/{y}", "center": CENTER.id, "z": z, "x": x, "y": y,
+         "version": version, "body": body}
+        for (z, x, y), body in tiles.items()
+    ]
+    # Always a full swap: a tile set is only consistent as a whole
+    await store_layer(db, "map_tiles", docs, key="_id", mode="swap", scope=scope)
+    total_kb = sum(len(d["body"]) for d in docs) / 1024
+    print(f"  Stored {len(docs)} tiles ({total_kb:.0f} KB) for {CENTER.id} dataset v{version}")
+
+
+async def backfill_geo_fields():
+    """
+    Add GeoJSON/polyline fields + 2dsphere indexes to CENTER's already seeded
+    collections (no Overpass). Only documents whose fields differ are
+    written; a collection with any is logged as reset, so clients reload it.
+    """
+    print("\n=== GEO FIELDS (backfill) ===")
+    for name, fields in GEO_INDEXES.items():
+        col = db[name]
+        ops = []
+        async for doc in col.find(center_filter(CENTER.id),
+                                  {"lat": 1, "lng": 1, "geometry": 1, "location": 1, "path": 1, "polyline": 1}):
+            update = {}
+            if "location" in fields and "lat" in doc:
+                update["location"] = geo_point(doc["lat"], doc["lng"])
+            if "path" in fields and doc.get("geometry"):
+                path = geo_line(doc["geometry"])
+                if path:
+                    update["path"] = path
+                # Compact geometry for ?format=polyline
+                update["polyline"] = polyline.encode([[p["lat"], p["lng"]] for p in doc["geometry"]])
+            update = {k: v for k, v in update.items() if doc.get(k) != v}
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if ops:
+            await col.bulk_write(ops, ordered=False)
+            _changed.add(name)
+            _changes.append(layer_change(CENTER.id, name, reset=True))
+        await ensure_geo_indexes(name)
+        print(f"  {name}: {len(ops)} docs updated")
+
+
+async def main(only_here: bool = False, only_hojre: bool = False, only_speed: bool = False,
+               only_geo: bool = False, only_graph: bool = False, full: bool = False,
+               cache_mode: str | None = None, center: str | None = None):
+    global SEED_MODE, CENTER
+    SEED_MODE = "swap" if full else "incremental"
+    CENTER = get_center(center)
+    if cache_mode:
+        cache.mode = cache_mode
     print("=" * 50)
-    print("SEEDING KØREPRØVE AMAGER DATABASE")
-    print(f"Center: {START_LAT}, {START_LNG}")
-    print(f"Radius: {RADIUS}m")
+    print("SEEDING KØREPRØVE DATABASE")
+    print(f"Center: {CENTER.id} ({CENTER.name}) {CENTER.lat}, {CENTER.lng}")
+    print(f"Radius: {CENTER.radius_m}m")
     print(f"DB: {settings.DB_NAME}")
+    print(f"Write mode: {SEED_MODE}, response cache: {cache.mode}")
     if only_here:
         print("MODE: HERE speed limits ONLY")
     elif only_hojre:
         print("MODE: Højre vigepligt ONLY")
     elif only_speed:
         print("MODE: ALL speed data ONLY (OSM + HERE)")
+    elif only_geo:
+        print("MODE: GeoJSON fields + indexes ONLY (no Overpass)")
+    elif only_graph:
+        print("MODE: Road graph ONLY")
     print("=" * 50)
 
-    if only_speed:
+    if only_geo:
+        await backfill_geo_fields()
+    elif only_graph:
+        await seed_road_graph()
+    elif only_speed:
         # Reseed both speed collections without touching other data
         await asyncio.gather(seed_speed_limits(), seed_here_speed_limits())
     elif only_here:
@@ -537,17 +635,28 @@ async def main(only_here: bool = False, only_hojre: bool = False, only_speed: bo
         signed_task = asyncio.create_task(seed_signed_intersections())
         villa_task = asyncio.create_task(seed_villa_streets())
         google_task = asyncio.create_task(seed_here_speed_limits())
+        graph_task = asyncio.create_task(seed_road_graph())
 
         # hojre needs signed_ids, so wait for signed first then fire it
         signed_ids = await signed_task
         hojre_task = asyncio.create_task(seed_hojre_vigepligt(signed_ids))
 
-        await asyncio.gather(speed_task, villa_task, hojre_task, google_task)
+        await asyncio.gather(speed_task, villa_task, hojre_task, google_task, graph_task)
+
+    if _changed:
+        # Tell running API processes to drop their cached layers
+        version = await bump_dataset_version(db, [CENTER.id], _changes)
+        print(f"  Dataset version -> {version} (changed: {', '.join(sorted(_changed))})")
+        await seed_map_tiles(await read_dataset_version(db, CENTER.id))
+    else:
+        print("  No layer changed; dataset version and map tiles left as they are")
 
+    print(f"\n  Responses: {cache.summary()}")
     print("\n" + "=" * 50)
     print("DONE!")
     print("=" * 50)
 
+    await close_client()
     client.close()
 
 
@@ -556,4 +665,15 @@ if __name__ == "__main__":
     only_here = "--here" in sys.argv
     only_hojre = "--hojre" in sys.argv
     only_speed = "--speed" in sys.argv
-    asyncio.run(main(only_here=only_here, only_hojre=only_hojre, only_speed=only_speed))
+    only_geo = "--geo" in sys.argv
+    only_graph = "--graph" in sys.argv
+    full = "--full" in sys.argv
+    # --offline replays cached responses only; --refresh-cache re-downloads everything
+    cache_mode = "offline" if "--offline" in sys.argv else "refresh" if "--refresh-cache" in sys.argv else None
+    # --center <id> seeds one test centre (default DEFAULT_CENTER)
+    center = sys.argv[sys.argv.index("--center") + 1] if "--center" in sys.argv else None
+    if center is not None and center not in CENTERS:
+        sys.exit(f"Unknown centre {center!r}; known: {', '.join(CENTERS)}")
+    asyncio.run(main(only_here=only_here, only_hojre=only_hojre, only_speed=only_speed,
+                     only_geo=only_geo, only_graph=only_graph, full=full, cache_mode=cache_mode,
+                     center=center))
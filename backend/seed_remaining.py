@@ -1,34 +1,55 @@
 """Seed the remaining collections that got rate limited."""
-import httpx
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import get_settings
+from datasets import bump_dataset_version
+from geo import geo_point, geo_line
+import polyline
+from http_client import get_client, close_client
+from seed_store import store_layer, describe, changed, change_entry
+from response_cache import ResponseCache
+from osm_tables import NodeTable, WayTable
+import hojre
+from centers import center_filter, get_center
 
 settings = get_settings()
 client = AsyncIOMotorClient(settings.MONGODB_URI)
 db = client[settings.DB_NAME]
 
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-START_LAT = 55.6295
-START_LNG = 12.6372
-RADIUS = 4000
+# Same centres as seed.py (this script used to have its own, slightly off, centre point)
+CENTER = get_center()
+
+# Shares the on-disk response cache with seed.py
+cache = ResponseCache(settings.SEED_CACHE_DIR, settings.SEED_CACHE_TTL_SECONDS, settings.SEED_CACHE_MODE)
 
 
 async def query_overpass(query: str) -> dict:
-    print(f"  Querying Overpass...")
-    async with httpx.AsyncClient(timeout=120) as c:
-        resp = await c.post(OVERPASS_URL, data={"data": query})
-        print(f"  Status: {resp.status_code}")
-        if resp.status_code != 200:
-            print(f"  {resp.text[:300]}")
-            return {"elements": []}
-        return resp.json()
+    data = await cache.fetch("overpass", " ".join(query.split()), lambda: _fetch_overpass(query))
+    return data if data is not None else {"elements": []}
 
 
-async def main():
+async def _fetch_overpass(query: str) -> dict | None:
+    print(f"  Querying Overpass...")
+    resp = await get_client().post(OVERPASS_URL, data={"data": query},
+                                   timeout=settings.OVERPASS_TIMEOUT_SECONDS)
+    print(f"  Status: {resp.status_code}")
+    if resp.status_code != 200:
+        print(f"  {resp.text[:300]}")
+        return None
+    return resp.json()
+
+
+async def main(mode: str = "incremental", cache_mode: str | None = None, center: str | None = None):
+    global CENTER
+    CENTER = get_center(center)
+    scope = center_filter(CENTER.id)
+    if cache_mode:
+        cache.mode = cache_mode
+    print(f"Center: {CENTER.id} ({CENTER.name})")
     # Get signed IDs from DB
     signed_col = db["signed_intersections"]
-    signed_docs = await signed_col.find({}, {"osm_id": 1}).to_list(10000)
+    signed_docs = await signed_col.find(scope, {"osm_id": 1}).to_list(None)
     signed_ids = {d["osm_id"] for d in signed_docs}
     print(f"Loaded {len(signed_ids)} signed intersection IDs from DB")
 
@@ -36,57 +57,46 @@ async def main():
     print("\n=== HØJRE VIGEPLIGT ===")
     junction_query = f"""
     [out:json][timeout:60];
-    way["highway"~"residential|living_street|unclassified"](around:{RADIUS},{START_LAT},{START_LNG});
+    way["highway"~"residential|living_street|unclassified"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     node(w);
     out body;
     """
     junctions = await query_overpass(junction_query)
-    all_nodes = {el["id"]: el for el in junctions.get("elements", [])}
-    print(f"  Got {len(all_nodes)} residential nodes")
+    nodes = NodeTable.from_elements(junctions.get("elements", []))
+    print(f"  Got {len(nodes)} residential nodes")
 
-    print("  Waiting 10s...")
-    await asyncio.sleep(10)
+    if cache.misses:
+        print("  Waiting 10s...")
+        await asyncio.sleep(10)
 
     ways_query = f"""
     [out:json][timeout:60];
-    way["highway"~"residential|living_street|unclassified|tertiary|secondary|primary"](around:{RADIUS},{START_LAT},{START_LNG});
+    way["highway"~"residential|living_street|unclassified|tertiary|secondary|primary"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     out body;
     """
     ways_data = await query_overpass(ways_query)
+    ways = WayTable.from_elements(ways_data.get("elements", []))
 
-    node_way_count: dict[int, int] = {}
-    for way in ways_data.get("elements", []):
-        for nid in way.get("nodes", []):
-            node_way_count[nid] = node_way_count.get(nid, 0) + 1
-
-    hojre = []
-    for nid, count in node_way_count.items():
-        if count >= 2 and nid not in signed_ids and nid in all_nodes:
-            el = all_nodes[nid]
-            hojre.append({
-                "osm_id": nid,
-                "lat": el["lat"],
-                "lng": el["lon"],
-                "type": "hojre_vigepligt",
-                "way_count": count,
-            })
-
-    col = db["hojre_vigepligt"]
-    await col.drop()
-    if hojre:
-        await col.insert_many(hojre)
-    print(f"  Stored {len(hojre)} højre vigepligt junctions")
-
-    print("  Waiting 10s...")
-    await asyncio.sleep(10)
+    # Looser than seed.py: any junction of two or more ways that isn't signed
+    junction_docs, skip_reasons = hojre.classify(ways, nodes, signed_ids, strict=False)
+
+    for doc in junction_docs:
+        doc["center"] = CENTER.id
+    hojre_stats = await store_layer(db, "hojre_vigepligt", junction_docs, mode=mode, scope=scope)
+    print(f"  Stored {len(junction_docs)} højre vigepligt junctions ({describe(hojre_stats)})")
+    print(f"  Skip reasons: {skip_reasons}")
+
+    if cache.misses:
+        print("  Waiting 10s...")
+        await asyncio.sleep(10)
 
     # VILLA STREETS
     print("\n=== VILLA KVARTERER ===")
     villa_query = f"""
     [out:json][timeout:60];
     (
-      way["highway"="residential"](around:{RADIUS},{START_LAT},{START_LNG});
-      way["highway"="living_street"](around:{RADIUS},{START_LAT},{START_LNG});
+      way["highway"="residential"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
+      way["highway"="living_street"](around:{CENTER.radius_m},{CENTER.lat},{CENTER.lng});
     );
     out body geom;
     """
@@ -105,24 +115,40 @@ async def main():
             continue
         center_lat = sum(p["lat"] for p in geometry) / len(geometry)
         center_lng = sum(p["lon"] for p in geometry) / len(geometry)
-        streets.append({
+        points = [{"lat": p["lat"], "lng": p["lon"]} for p in geometry]
+        street = {
             "osm_id": el["id"],
             "name": name,
             "lat": center_lat,
             "lng": center_lng,
             "highway_type": tags.get("highway", ""),
-            "geometry": [{"lat": p["lat"], "lng": p["lon"]} for p in geometry],
-        })
-
-    col = db["villa_streets"]
-    await col.drop()
-    if streets:
-        await col.insert_many(streets)
-    print(f"  Stored {len(streets)} villa streets")
+            "geometry": points,
+            "polyline": polyline.encode([[p["lat"], p["lng"]] for p in points]),
+            "location": geo_point(center_lat, center_lng),
+            "center": CENTER.id,
+        }
+        path = geo_line(points)
+        if path:
+            street["path"] = path
+        streets.append(street)
+
+    villa_stats = await store_layer(db, "villa_streets", streets, mode=mode, scope=scope)
+    print(f"  Stored {len(streets)} villa streets ({describe(villa_stats)})")
+
+    if changed(hojre_stats) or changed(villa_stats):
+        # Tell running API processes to drop their cached layers
+        changes = [change_entry(CENTER.id, name, stats)
+                   for name, stats in (("hojre_vigepligt", hojre_stats), ("villa_streets", villa_stats)) if changed(stats)]
+        version = await bump_dataset_version(db, [CENTER.id], changes)
+        print(f"  Dataset version -> {version}")
 
     print("\nDONE!")
+    await close_client()
     client.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    asyncio.run(main("swap" if "--full" in sys.argv else "incremental",
+                     "offline" if "--offline" in sys.argv else None,
+                     sys.argv[sys.argv.index("--center") + 1] if "--center" in sys.argv else None))
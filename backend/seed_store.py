@@ -0,0 +1,152 @@
+"""
+Writing seeded layers to MongoDB, shared by the seed scripts.
+
+store_layer() makes a collection hold exactly a freshly built list of
+documents, in one of two modes:
+- "incremental" (default): diff against what is stored, keyed on `key`
+  (osm_id for OSM elements). New and changed documents are upserted,
+  vanished ones deleted, the rest left alone. Writes scale with what
+  changed in OSM and readers never see an empty layer.
+- "swap": full rebuild. The layer is written and indexed in a staging
+  collection, then renamed over the live one in a single step.
+Layers are partitioned by test centre: `scope` (centers.center_filter())
+limits the diff, the swap and the empty-result check to one centre's
+documents, and every index starts with `center`.
+An empty result never replaces a non-empty layer: that is what a failed
+Overpass query looks like.
+Takes the database as an argument, like datasets.py.
+"""
+from pymongo import DeleteMany, InsertOne, ReplaceOne
+from datasets import layer_change
+
+MODES = ("incremental", "swap")
+STAGING_SUFFIX = "__staging"
+# Documents / operations per insert_many or bulk_write call
+BATCH_SIZE = 1000
+
+# collection -> GeoJSON fields that get a 2dsphere index
+GEO_INDEXES = {
+    "speed_limits": ["path"],
+    "signed_intersections": ["location"],
+    "hojre_vigepligt": ["location"],
+    "google_speed_limits": ["location", "path"],
+    "villa_streets": ["location", "path"],
+}
+
+
+# Partition field leading every layer index
+PARTITION_FIELD = "center"
+
+
+async def create_indexes(col, name: str, key: str | None = None):
+    """(center, 2dsphere) indexes for layer `name`, plus (center, diff key)."""
+    for field in GEO_INDEXES.get(name, []):
+        await col.create_index([(PARTITION_FIELD, 1), (field, "2dsphere")])
+    if key and key != "_id":
+        await col.create_index([(PARTITION_FIELD, 1), (key, 1)])
+
+
+async def store_layer(database, name: str, docs: list[dict], key: str = "osm_id",
+                      mode: str = "incremental", scope: dict | None = None) -> dict:
+    """
+    Store `docs` as the new contents of the `scope` part of collection `name`.
+    Returns {"inserted", "updated", "deleted", "unchanged", "kept"} counts;
+    kept=True means an empty result was ignored. "keys" holds the upserted
+    and deleted keys for the change log (datasets.py), or is None after a
+    swap, which doesn't diff.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown seed mode {mode!r}, expected one of {MODES}")
+    col = database[name]
+    scope = scope or {}
+    if not docs and await col.count_documents(scope, limit=1):
+        return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "kept": True,
+                "keys": {"upserted": [], "deleted": []}}
+    if mode == "swap":
+        return await _swap(database, name, docs, key, scope)
+    return await _incremental(col, name, docs, key, scope)
+
+
+async def _incremental(col, name: str, docs: list[dict], key: str, scope: dict) -> dict:
+    fresh = {d[key]: d for d in docs}
+    stored: dict = {}
+    duplicated = set()
+    async for doc in col.find(scope, {"_id": 0}):
+        k = doc.get(key)
+        if k in stored:
+            duplicated.add(k)
+        stored[k] = doc
+
+    ops = []
+    upserted = []
+    inserted = updated = 0
+    # Keys stored more than once (older seeds) are rewritten from scratch
+    for k in duplicated:
+        ops.append(DeleteMany({**scope, key: k}))
+        stored.pop(k)
+    for k, doc in fresh.items():
+        old = stored.get(k)
+        if old is None:
+            inserted += 1
+            upserted.append(k)
+            ops.append(InsertOne(doc) if k in duplicated else ReplaceOne({**scope, key: k}, doc, upsert=True))
+        elif old != doc:
+            updated += 1
+            upserted.append(k)
+            ops.append(ReplaceOne({**scope, key: k}, doc))
+    vanished = [k for k in stored if k not in fresh]
+    for i in range(0, len(vanished), BATCH_SIZE):
+        ops.append(DeleteMany({**scope, key: {"$in": vanished[i:i + BATCH_SIZE]}}))
+
+    # Before the writes: each upsert looks its key up, which is a collection scan without the index
+    await create_indexes(col, name, key)
+    # Ordered, so duplicate cleanup runs before the re-inserts
+    for i in range(0, len(ops), BATCH_SIZE):
+        await col.bulk_write(ops[i:i + BATCH_SIZE], ordered=True)
+    return {"inserted": inserted, "updated": updated, "deleted": len(vanished),
+            "unchanged": len(fresh) - inserted - updated, "kept": False,
+            "keys": {"upserted": upserted, "deleted": vanished}}
+
+
+async def _swap(database, name: str, docs: list[dict], key: str, scope: dict) -> dict:
+    live = database[name]
+    staging = database[name + STAGING_SUFFIX]
+    await staging.drop()
+    if not docs:
+        # Nothing to rename; this part of the live layer is empty already
+        return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "kept": False, "keys": None}
+    previous = await live.count_documents(scope)
+    if scope:
+        # Other centres' documents carry over unchanged
+        batch = []
+        async for doc in live.find({"$nor": [scope]}):
+            batch.append(doc)
+            if len(batch) == BATCH_SIZE:
+                await staging.insert_many(batch)
+                batch = []
+        if batch:
+            await staging.insert_many(batch)
+    for i in range(0, len(docs), BATCH_SIZE):
+        await staging.insert_many(docs[i:i + BATCH_SIZE])
+    await create_indexes(staging, name, key)
+    await staging.rename(name, dropTarget=True)
+    return {"inserted": len(docs), "updated": 0, "deleted": previous, "unchanged": 0, "kept": False, "keys": None}
+
+
+def describe(stats: dict) -> str:
+    if stats["kept"]:
+        return "empty result, kept the stored layer"
+    return (f"{stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['deleted']} deleted, {stats['unchanged']} unchanged")
+
+
+def changed(stats: dict) -> bool:
+    return bool(stats["inserted"] or stats["updated"] or stats["deleted"])
+
+
+def change_entry(center: str, name: str, stats: dict) -> dict:
+    """The change log entry (datasets.layer_change()) for a store_layer() result."""
+    keys = stats["keys"]
+    if keys is None:
+        return layer_change(center, name, reset=True)
+    return layer_change(center, name, keys["upserted"], keys["deleted"])
@@ -0,0 +1,216 @@
+"""
+The merged HERE/OSM speed-limit layer (`google_speed_limits`), built by seed.py.
+
+1. HERE span samples and OSM maxspeed samples are merged per level-0 cell
+   (1/2000 degree, ~50m, packed into one int64 key): OSM beats HERE,
+   otherwise the first sample wins.
+2. Each cell's sample is snapped onto the nearest drivable way segment
+   within SNAP_M (OSM beats HERE again, then the nearer sample). Segments
+   without a sample take the speed of the nearest one within MAX_FILL_M
+   along the way.
+3. Every way is run-length encoded into intervals of constant speed, one
+   document per interval instead of one per cell.
+4. Cells too far from any way are kept as cells, with 2x2 blocks of equal
+   speed merged quadtree-style up to MAX_LEVEL.
+Pure functions over numpy arrays, no database.
+"""
+import numpy as np
+import polyline
+from geo import geo_line, geo_point
+
+CELLS_PER_DEGREE = 2000
+# Keeps rows/cols non-negative so (row, col) packs into one int64
+_BIAS = 1 << 20
+# Merged cells are at most 2^MAX_LEVEL level-0 cells across (~900m)
+MAX_LEVEL = 4
+# A cell sample this close to a way segment sets that segment's speed
+SNAP_M = 25
+# Segments further than this from any sample along their way stay unknown
+MAX_FILL_M = 250
+
+HERE = 0
+OSM = 1
+SOURCES = ("here", "osm")
+
+
+def cell_rows_cols(lat, lng) -> tuple[np.ndarray, np.ndarray]:
+    """Level-0 (row, col) of points."""
+    row = np.rint(np.asarray(lat, dtype=np.float64) * CELLS_PER_DEGREE).astype(np.int64) + _BIAS
+    col = np.rint(np.asarray(lng, dtype=np.float64) * CELLS_PER_DEGREE).astype(np.int64) + _BIAS
+    return row, col
+
+
+def cell_key(row, col, level: int = 0):
+    """Key of the level `level` cell containing level-0 (row, col)."""
+    return (np.right_shift(row, level) << 32) | np.right_shift(col, level)
+
+
+def cell_center(key: int, level: int) -> tuple[float, float]:
+    row, col = key >> 32, key & 0xFFFFFFFF
+    half = ((1 << level) - 1) / 2
+    return (((row << level) + half - _BIAS) / CELLS_PER_DEGREE,
+            ((col << level) + half - _BIAS) / CELLS_PER_DEGREE)
+
+
+def merge_cells(key: np.ndarray, source: np.ndarray) -> np.ndarray:
+    """Index of the winning sample in each cell: OSM over HERE, then the first."""
+    order = np.lexsort((np.arange(len(key)), -source, key))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = key[order][1:] != key[order][:-1]
+    return order[first]
+
+
+def snap_to_ways(lines: list[np.ndarray], lat: np.ndarray, lng: np.ndarray,
+                 speed: np.ndarray, source: np.ndarray):
+    """
+    Per way, (speed, source) of each segment (speed 0 = no sample), and the
+    mask of samples that snapped to some way.
+    """
+    index = polyline.SegmentIndex(lines)
+    seg_speed = [np.zeros(max(len(line) - 1, 0), dtype=np.int64) for line in lines]
+    seg_source = [np.full(len(s), -1, dtype=np.int64) for s in seg_speed]
+    seg_dist = [np.full(len(s), np.inf) for s in seg_speed]
+    snapped = np.zeros(len(lat), dtype=bool)
+    for i, (la, ln) in enumerate(zip(lat.tolist(), lng.tolist())):
+        hit = index.nearest(la, ln, SNAP_M)
+        if hit is None:
+            continue
+        line, seg, dist, _ = hit
+        snapped[i] = True
+        if (source[i], -dist) > (seg_source[line][seg], -seg_dist[line][seg]):
+            seg_speed[line][seg] = speed[i]
+            seg_source[line][seg] = source[i]
+            seg_dist[line][seg] = dist
+    return seg_speed, seg_source, snapped
+
+
+def speed_runs(points: np.ndarray, seg_speed: np.ndarray, seg_source: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """(first vertex, last vertex, speed, source) of the constant-speed runs of one way."""
+    known = np.flatnonzero(seg_speed)
+    if not len(known):
+        return []
+    along = polyline.cumulative_distance(points)
+    mid = (along[:-1] + along[1:]) / 2
+    # Nearest sampled segment on either side, measured along the way
+    pos = np.searchsorted(mid[known], mid)
+    prev = known[np.maximum(pos - 1, 0)]
+    nxt = known[np.minimum(pos, len(known) - 1)]
+    d_prev = np.where(pos > 0, mid - mid[prev], np.inf)
+    d_next = np.where(pos < len(known), mid[nxt] - mid, np.inf)
+    exact = seg_speed > 0
+    nearest = np.where(exact, np.arange(len(mid)), np.where(d_prev <= d_next, prev, nxt))
+    reach = np.where(exact, 0.0, np.minimum(d_prev, d_next))
+    speed = np.where(reach <= MAX_FILL_M, seg_speed[nearest], 0)
+    source = seg_source[nearest]
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(speed)) + 1))
+    ends = np.append(starts[1:], len(speed))
+    run_source = np.maximum.reduceat(source, starts)
+    return [(int(a), int(b), int(speed[a]), int(s))
+            for a, b, s in zip(starts, ends, run_source) if speed[a]]
+
+
+def quadtree_cells(row: np.ndarray, col: np.ndarray, speed: np.ndarray,
+                   source: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    (level, key, speed, source) of level-0 cells after merging, bottom-up,
+    every complete 2x2 block of equal speed into its parent.
+    """
+    out = []
+    level = 0
+    while len(row):
+        key = (row << 32) | col
+        if level == MAX_LEVEL:
+            out.extend(zip([level] * len(key), key.tolist(), speed.tolist(), source.tolist()))
+            break
+        parent = ((row >> 1) << 32) | (col >> 1)
+        order = np.argsort(parent, kind="stable")
+        parents, start, count = np.unique(parent[order], return_index=True, return_counts=True)
+        lo = np.minimum.reduceat(speed[order], start)
+        hi = np.maximum.reduceat(speed[order], start)
+        merge = (count == 4) & (lo == hi)
+        stay = order[~np.repeat(merge, count)]
+        out.extend(zip([level] * len(stay), key[stay].tolist(), speed[stay].tolist(), source[stay].tolist()))
+        # OSM if any merged child came from OSM
+        merged_source = np.maximum.reduceat(source[order], start)[merge]
+        row, col = parents[merge] >> 32, parents[merge] & 0xFFFFFFFF
+        speed, source = lo[merge], merged_source
+        level += 1
+    return out
+
+
+def _run_doc(way: dict, points: np.ndarray, a: int, b: int, speed: int, source: int) -> dict:
+    pts = points[a:b + 1]
+    length = float(polyline.cumulative_distance(pts)[-1])
+    lat, lng = polyline.point_at(pts, length / 2)
+    geometry = [{"lat": float(p[0]), "lng": float(p[1])} for p in pts]
+    doc = {
+        "placeId": f"w{way['osm_id']}:{a}",
+        "osm_id": way["osm_id"],
+        "name": way.get("name", ""),
+        "speedLimit": speed,
+        "units": "KPH",
+        "source": SOURCES[source],
+        # Midpoint, for clients that draw the layer as points
+        "lat": round(lat, 6),
+        "lng": round(lng, 6),
+        "length_m": round(length, 1),
+        "geometry": geometry,
+        "polyline": polyline.encode(pts),
+        "location": geo_point(lat, lng),
+    }
+    path = geo_line(geometry)
+    if path:
+        doc["path"] = path
+    return doc
+
+
+def _cell_doc(level: int, key: int, speed: int, source: int) -> dict:
+    lat, lng = cell_center(key, level)
+    return {
+        "placeId": f"c{level}:{key}",
+        "cell": key,
+        "level": level,
+        "speedLimit": speed,
+        "units": "KPH",
+        "source": SOURCES[source],
+        "lat": round(lat, 6),
+        "lng": round(lng, 6),
+        "location": geo_point(lat, lng),
+    }
+
+
+def build_speed_layer(here_points: list[tuple[float, float, int]], osm_points: list[tuple[float, float, int]],
+                      ways: list[dict]) -> tuple[list[dict], dict]:
+    """`google_speed_limits` documents from (lat, lng, km/h) samples and drivable ways, plus counts."""
+    samples = np.array(here_points + osm_points, dtype=np.float64).reshape(-1, 3)
+    source = np.repeat(np.array([HERE, OSM], dtype=np.int64), [len(here_points), len(osm_points)])
+    row, col = cell_rows_cols(samples[:, 0], samples[:, 1])
+    win = merge_cells(cell_key(row, col), source)
+    lat, lng = samples[win, 0], samples[win, 1]
+    speed, source, row, col = samples[win, 2].astype(np.int64), source[win], row[win], col[win]
+
+    ways = [w for w in ways if len(w.get("geometry") or []) >= 2]
+    lines = [np.array([[p["lat"], p["lng"]] for p in w["geometry"]]) for w in ways]
+    seg_speed, seg_source, snapped = snap_to_ways(lines, lat, lng, speed, source)
+
+    docs = []
+    for way, points, ss, sc in zip(ways, lines, seg_speed, seg_source):
+        for a, b, s, src in speed_runs(points, ss, sc):
+            docs.append(_run_doc(way, points, a, b, s, src))
+    runs = len(docs)
+
+    free = ~snapped
+    cells = quadtree_cells(row[free], col[free], speed[free], source[free])
+    docs.extend(_cell_doc(*c) for c in cells)
+
+    stats = {
+        "samples": len(samples),
+        "cells": len(win),
+        "osm_cells": int((source == OSM).sum()),
+        "snapped": int(snapped.sum()),
+        "runs": runs,
+        "free_cells": int(free.sum()),
+        "merged_cells": len(cells),
+    }
+    return docs, stats
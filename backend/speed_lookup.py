@@ -0,0 +1,127 @@
+"""
+In-memory speed-limit lookup.
+
+Two indexes per test centre, built once per dataset version:
+- the OSM `speed_limits` ways as a SegmentIndex, so a point snaps to the
+  nearest road segment (mapped signs, same precedence as seeding: OSM wins);
+- the merged HERE/OSM `google_speed_limits` layer (speed_layer.py), used
+  when no OSM road is close enough: its per-way speed runs as a second
+  SegmentIndex, then its cells by key, coarsest level last. Point
+  documents from older seeds go into a GridIndex instead.
+"""
+import asyncio
+import logging
+import numpy as np
+import polyline
+from db import db
+from centers import center_filter, default_center_id
+from geo import GridIndex
+from speed_layer import MAX_LEVEL, cell_key, cell_rows_cols
+from layer_cache import on_dataset_change
+from osm import parse_maxspeed
+
+logger = logging.getLogger(__name__)
+
+# A point this close to an OSM road takes that road's maxspeed
+SNAP_M = 25
+# Otherwise the nearest legacy grid point within this distance (as MapScreen did)
+GRID_M = 80
+# Speed for a step is probed this far into it, past the junction it starts at
+STEP_PROBE_M = 20
+
+
+class SpeedLookup:
+    def __init__(self, roads: list[dict], grid_points: list[dict]):
+        self.roads = [r for r in roads if len(r.get("geometry") or []) >= 2]
+        self.road_speeds = [parse_maxspeed(r.get("maxspeed")) for r in self.roads]
+        self.segments = polyline.SegmentIndex(
+            [np.array([[p["lat"], p["lng"]] for p in r["geometry"]]) for r in self.roads])
+        grid_points = [p for p in grid_points if p.get("speedLimit")]
+        self.runs = [p for p in grid_points if len(p.get("geometry") or []) >= 2]
+        self.run_segments = polyline.SegmentIndex(
+            [np.array([[q["lat"], q["lng"]] for q in p["geometry"]]) for p in self.runs])
+        self.cells = {(p["level"], p["cell"]): p["speedLimit"] for p in grid_points if "cell" in p}
+        self.grid = GridIndex([p for p in grid_points if "cell" not in p and "geometry" not in p], cell_m=GRID_M)
+
+    def lookup(self, lat: float, lng: float) -> dict:
+        """{"speedLimit", "source", "distance_m", ...} for one point; speedLimit None if unknown."""
+        hit = self.segments.nearest(lat, lng, SNAP_M)
+        if hit is not None:
+            line, _, dist, _ = hit
+            speed = self.road_speeds[line]
+            if speed:
+                road = self.roads[line]
+                return {"speedLimit": speed, "source": "osm", "distance_m": round(dist, 1),
+                        "osm_id": road.get("osm_id"), "name": road.get("name", "")}
+        hit = self.run_segments.nearest(lat, lng, SNAP_M)
+        if hit is not None:
+            line, _, dist, _ = hit
+            return {"speedLimit": self.runs[line]["speedLimit"], "source": "grid", "distance_m": round(dist, 1)}
+        if self.cells:
+            row, col = cell_rows_cols(lat, lng)
+            for level in range(MAX_LEVEL + 1):
+                speed = self.cells.get((level, int(cell_key(row, col, level))))
+                if speed:
+                    return {"speedLimit": speed, "source": "grid", "distance_m": 0.0}
+        near = self.grid.nearest(lat, lng, GRID_M)
+        if near is not None:
+            point, dist = near
+            return {"speedLimit": point["speedLimit"], "source": "grid", "distance_m": round(dist, 1)}
+        return {"speedLimit": None, "source": None, "distance_m": None}
+
+    def lookup_many(self, points: np.ndarray) -> list[dict]:
+        return [{"lat": float(lat), "lng": float(lng), **self.lookup(lat, lng)} for lat, lng in points]
+
+    def lookup_step(self, encoded: str) -> dict:
+        """Speed for a route step, probed a little way into its polyline."""
+        pts = polyline.decode(encoded)
+        if not len(pts):
+            return {"speedLimit": None, "source": None, "distance_m": None}
+        length = polyline.cumulative_distance(pts)[-1]
+        lat, lng = polyline.point_at(pts, min(STEP_PROBE_M, length / 2))
+        return self.lookup(lat, lng)
+
+    def annotate_legs(self, legs: list[dict]):
+        """Add speedLimit / speedLimitSource to every step of Google-style legs, in place."""
+        for leg in legs:
+            for step in leg.get("steps", []):
+                enc = step.get("polyline", {}).get("encodedPolyline", "")
+                found = self.lookup_step(enc)
+                step["speedLimit"] = found["speedLimit"]
+                step["speedLimitSource"] = found["source"]
+
+
+# centre id -> lookup over that centre's layers
+_lookups: dict[str, SpeedLookup] = {}
+_locks: dict[str, asyncio.Lock] = {}
+
+
+async def get_speed_lookup(center: str | None = None) -> SpeedLookup:
+    center = center or default_center_id()
+    lookup = _lookups.get(center)
+    if lookup is not None:
+        return lookup
+    async with _locks.setdefault(center, asyncio.Lock()):
+        if center not in _lookups:
+            scope = center_filter(center)
+            roads, grid = await asyncio.gather(
+                db["speed_limits"].find(scope, {"_id": 0, "osm_id": 1, "name": 1, "maxspeed": 1, "geometry": 1}).to_list(None),
+                db["google_speed_limits"].find(
+                    scope, {"_id": 0, "lat": 1, "lng": 1, "speedLimit": 1, "geometry": 1, "level": 1, "cell": 1},
+                ).to_list(None),
+            )
+            lookup = await asyncio.to_thread(SpeedLookup, roads, grid)
+            _lookups[center] = lookup
+            logger.info("Speed lookup %s: %d road segments, %d grid points", center, len(lookup.segments), len(grid))
+    return _lookups[center]
+
+
+def invalidate_speed_lookup(center: str | None = None):
+    """Drop a centre's cached copy (every centre's without one)."""
+    if center is None:
+        _lookups.clear()
+    else:
+        _lookups.pop(center, None)
+
+
+on_dataset_change(invalidate_speed_lookup)
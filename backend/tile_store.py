@@ -0,0 +1,72 @@
+"""
+API-side cache of the pre-built map tiles.
+
+Each test centre's tiles for its current dataset version are loaded from
+`map_tiles` (written by seed.py) into memory once. If the stored tiles
+are from an older version — e.g. after a hojre bulk-delete — they are rebuilt in-process from
+the layer collections instead, so served tiles never lag the data.
+Gzip/brotli variants are compressed on first request and kept alongside.
+"""
+import asyncio
+import logging
+from db import db, map_tiles_col
+from layer_cache import current_version
+from datasets import read_dataset_version
+from centers import center_filter, default_center_id
+from tiles import build_tiles, parent_tile, MAX_ZOOM
+from responses import compress
+
+logger = logging.getLogger(__name__)
+
+# centre id -> (centre dataset version, tiles)
+_tiles: dict[str, tuple[int, dict[tuple[int, int, int], bytes]]] = {}
+# centre id -> global dataset version its tiles were last checked against
+_checked: dict[str, int] = {}
+_locks: dict[str, asyncio.Lock] = {}
+# centre id -> {(version, tile, encoding): compressed body}
+_variants: dict[str, dict[tuple, bytes]] = {}
+
+_LAYER_COLLECTIONS = ["speed_limits", "google_speed_limits", "hojre_vigepligt", "signed_intersections"]
+
+
+async def _load(center: str, version: int) -> dict[tuple[int, int, int], bytes]:
+    scope = center_filter(center)
+    docs = await map_tiles_col.find(
+        {**scope, "version": version}, {"_id": 0, "z": 1, "x": 1, "y": 1, "body": 1},
+    ).to_list(None)
+    if docs:
+        return {(d["z"], d["x"], d["y"]): bytes(d["body"]) for d in docs}
+
+    logger.info("No pre-built tiles for %s dataset v%d, building in-process", center, version)
+    layers = await asyncio.gather(*(
+        db[name].find(scope, {"_id": 0, "location": 0, "path": 0, "center": 0}).to_list(None)
+        for name in _LAYER_COLLECTIONS
+    ))
+    return await asyncio.to_thread(build_tiles, *layers)
+
+
+async def get_tile(z: int, x: int, y: int, center: str | None = None) -> tuple[bytes | None, int, tuple[int, int, int]]:
+    """(tile bytes or None, centre dataset version, tile actually served)."""
+    center = center or default_center_id()
+    global_version = await current_version()
+    if _checked.get(center) != global_version:
+        async with _locks.setdefault(center, asyncio.Lock()):
+            if _checked.get(center) != global_version:
+                # Only a change to this centre's data reloads its tiles
+                version = await read_dataset_version(db, center)
+                if center not in _tiles or _tiles[center][0] != version:
+                    _tiles[center] = (version, await _load(center, version))
+                    _variants.pop(center, None)
+                _checked[center] = global_version
+    version, tiles = _tiles[center]
+    key = parent_tile(z, x, y, MAX_ZOOM) if z > MAX_ZOOM else (z, x, y)
+    return tiles.get(key), version, key
+
+
+def tile_variant(center: str, version: int, key: tuple[int, int, int], body: bytes, encoding: str) -> bytes:
+    """`body` (the tile `key` of `version`) compressed with `encoding`, compressed once."""
+    variants = _variants.setdefault(center, {})
+    compressed = variants.get((version, key, encoding))
+    if compressed is None:
+        compressed = variants[(version, key, encoding)] = compress(body, encoding)
+    return compressed
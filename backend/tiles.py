@@ -0,0 +1,145 @@
+"""
+Pre-built web-mercator tiles for the speed-limit and junction layers.
+
+build_tiles() turns the seeded layer documents into small JSON tiles for
+zooms MIN_ZOOM..MAX_ZOOM (deeper zooms reuse the MAX_ZOOM tile):
+- speed_limits: roads simplified with Douglas-Peucker at ~half a pixel for
+  the zoom, cut into the runs of segments that touch each tile, each run
+  as an encoded polyline.
+- google_speed_limits / hojre_vigepligt / signed_intersections: points
+  thinned to one per 8px cell below FULL_DETAIL_ZOOM, stored as one
+  encoded polyline of positions plus parallel attribute arrays.
+Pure functions, no database: the seed script and the API both use them.
+"""
+import json
+import math
+from collections import defaultdict
+import numpy as np
+import polyline
+
+MIN_ZOOM = 11
+MAX_ZOOM = 16
+# Zoom from which every point is kept (no thinning)
+FULL_DETAIL_ZOOM = 15
+THIN_CELL_PX = 8
+TILE_PX = 256
+# Metres per pixel at zoom 0 on the equator
+M_PER_PX_Z0 = 156543.03392
+
+
+def tile_xy(lat: np.ndarray, lng: np.ndarray, z: int) -> tuple[np.ndarray, np.ndarray]:
+    """Fractional tile coordinates (x, y) of points at zoom z."""
+    n = 2 ** z
+    lat_r = np.radians(np.asarray(lat, dtype=np.float64))
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat_r) + 1.0 / np.cos(lat_r)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def parent_tile(z: int, x: int, y: int, target_z: int) -> tuple[int, int, int]:
+    shift = z - target_z
+    return target_z, x >> shift, y >> shift
+
+
+def _thin(tx: np.ndarray, ty: np.ndarray, keys: list, z: int) -> np.ndarray:
+    """Indices of points kept at zoom z: first point per (8px cell, key)."""
+    if z >= FULL_DETAIL_ZOOM:
+        return np.arange(len(tx))
+    cells = TILE_PX // THIN_CELL_PX
+    cx = np.floor(tx * cells).astype(np.int64)
+    cy = np.floor(ty * cells).astype(np.int64)
+    seen = set()
+    kept = []
+    for i, (a, b, k) in enumerate(zip(cx.tolist(), cy.tolist(), keys)):
+        if (a, b, k) not in seen:
+            seen.add((a, b, k))
+            kept.append(i)
+    return np.asarray(kept, dtype=np.int64)
+
+
+def _point_layer(docs: list[dict], z: int, attrs: dict, thin_key: str | None) -> dict:
+    """tile key -> {"p": encoded positions, <attr>: [...]} for one point layer."""
+    if not docs:
+        return {}
+    lat = np.array([d["lat"] for d in docs])
+    lng = np.array([d["lng"] for d in docs])
+    tx, ty = tile_xy(lat, lng, z)
+    keys = [d.get(thin_key) for d in docs] if thin_key else [None] * len(docs)
+    kept = _thin(tx, ty, keys, z)
+
+    by_tile: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for i in kept.tolist():
+        by_tile[(int(tx[i]), int(ty[i]))].append(i)
+
+    out = {}
+    for key, idx in by_tile.items():
+        entry = {"p": polyline.encode(np.column_stack((lat[idx], lng[idx])))}
+        for short, fn in attrs.items():
+            entry[short] = [fn(docs[i]) for i in idx]
+        out[key] = entry
+    return out
+
+
+def _line_layer(roads: list[dict], z: int) -> dict:
+    """tile key -> [{"id", "n", "s", "h", "p"}] runs of simplified road geometry."""
+    out: dict[tuple[int, int], list[dict]] = defaultdict(list)
+    ref_lat = roads[0]["geometry"][0]["lat"] if roads and roads[0].get("geometry") else 55.6
+    tolerance = M_PER_PX_Z0 * math.cos(math.radians(ref_lat)) / 2 ** z / 2
+    for road in roads:
+        geom = road.get("geometry") or []
+        if len(geom) < 2:
+            continue
+        pts = polyline.simplify(np.array([[p["lat"], p["lng"]] for p in geom]), tolerance)
+        tx, ty = tile_xy(pts[:, 0], pts[:, 1], z)
+        x0 = np.floor(np.minimum(tx[:-1], tx[1:])).astype(int)
+        x1 = np.floor(np.maximum(tx[:-1], tx[1:])).astype(int)
+        y0 = np.floor(np.minimum(ty[:-1], ty[1:])).astype(int)
+        y1 = np.floor(np.maximum(ty[:-1], ty[1:])).astype(int)
+
+        # tile -> list of [first_vertex, last_vertex] runs of consecutive segments
+        runs: dict[tuple[int, int], list[list[int]]] = defaultdict(list)
+        for seg in range(len(pts) - 1):
+            for x in range(x0[seg], x1[seg] + 1):
+                for y in range(y0[seg], y1[seg] + 1):
+                    tile_runs = runs[(x, y)]
+                    if tile_runs and tile_runs[-1][1] == seg:
+                        tile_runs[-1][1] = seg + 1
+                    else:
+                        tile_runs.append([seg, seg + 1])
+
+        for key, tile_runs in runs.items():
+            for a, b in tile_runs:
+                out[key].append({
+                    "id": road.get("osm_id"),
+                    "n": road.get("name", ""),
+                    "s": road.get("maxspeed", ""),
+                    "h": road.get("highway_type", ""),
+                    "p": polyline.encode(pts[a:b + 1]),
+                })
+    return out
+
+
+def build_tiles(speed_limits: list[dict], google_speed_limits: list[dict],
+                hojre_vigepligt: list[dict], signed_intersections: list[dict],
+                zooms: range = range(MIN_ZOOM, MAX_ZOOM + 1)) -> dict[tuple[int, int, int], bytes]:
+    """(z, x, y) -> compact JSON tile bytes for every non-empty tile."""
+    tiles: dict[tuple[int, int, int], bytes] = {}
+    for z in zooms:
+        layers = {
+            "speed_limits": _line_layer(speed_limits, z),
+            "google_speed_limits": _point_layer(
+                google_speed_limits, z, {"s": lambda d: d.get("speedLimit")}, thin_key="speedLimit"),
+            "hojre_vigepligt": _point_layer(
+                hojre_vigepligt, z, {"id": lambda d: d.get("osm_id")}, thin_key=None),
+            "signed_intersections": _point_layer(
+                signed_intersections, z,
+                {"id": lambda d: d.get("osm_id"), "t": lambda d: d.get("type")}, thin_key="type"),
+        }
+        keys = set().union(*layers.values())
+        for x, y in keys:
+            tile = {"z": z, "x": x, "y": y}
+            for name, layer in layers.items():
+                if (x, y) in layer:
+                    tile[name] = layer[(x, y)]
+            tiles[(z, x, y)] = json.dumps(tile, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return tiles
@@ -0,0 +1,89 @@
+"""
+Node <-> way incidence of an OSM extract in CSR form.
+
+WayGraph is built from an osm_tables.WayTable. The distinct (node, way)
+pairs are sorted by node, so the ways at node i are
+way_of[start[i]:start[i + 1]]. Per-node questions are reductions over
+those runs, and the predicates below return one boolean per node (or per
+way), ready to be combined with & and |.
+Unlike local_router.RoadGraph (directed edges for routing) this only
+records which ways meet at which nodes.
+"""
+from typing import Iterable
+import numpy as np
+from osm_tables import NodeTable, WayTable
+
+
+class WayGraph:
+    def __init__(self, ways: WayTable):
+        self.ways = ways
+        node_of, way_of = ways.incidence()
+        self.node_ids, first, self.way_count = np.unique(node_of, return_index=True, return_counts=True)
+        self.start = np.append(first, len(node_of)).astype(np.int64)
+        self.way_of = way_of
+        _, highway, self.way_flags, _ = ways.arrays()
+        # One bit per interned highway type (osm_tables.Codes)
+        self.way_type = np.left_shift(np.uint64(1), highway.astype(np.uint64))
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def type_mask(self, names: Iterable[str]) -> np.uint64:
+        return self.ways.highway_codes.mask(names)
+
+    def _reduce(self, ufunc, per_pair: np.ndarray) -> np.ndarray:
+        if not len(self):
+            return per_pair[:0]
+        return ufunc.reduceat(per_pair, self.start[:-1])
+
+    def node_types(self) -> np.ndarray:
+        """uint64 mask of the highway types meeting at each node."""
+        return self._reduce(np.bitwise_or, self.way_type[self.way_of])
+
+    def node_way_flags(self) -> np.ndarray:
+        """OR of the flags of the ways through each node."""
+        return self._reduce(np.bitwise_or, self.way_flags[self.way_of])
+
+    def nodes_on(self, way_mask: np.ndarray) -> np.ndarray:
+        """Per node: is any way through it selected by the per-way bool mask?"""
+        return self._reduce(np.logical_or, way_mask[self.way_of])
+
+    def ways_touching(self, node_mask: np.ndarray) -> np.ndarray:
+        """Per way: does it pass through any node selected by the per-node bool mask?"""
+        touched = np.zeros(len(self.ways), dtype=bool)
+        touched[self.way_of[np.repeat(node_mask, self.way_count)]] = True
+        return touched
+
+    def ways_of_type(self, mask: np.uint64) -> np.ndarray:
+        return (self.way_type & mask) != 0
+
+
+# Vectorized per-node predicates
+
+def only_types(graph: WayGraph, mask: np.uint64) -> np.ndarray:
+    """Every way at the node has a type in `mask` (e.g. pure residential)."""
+    return (graph.node_types() & ~mask) == 0
+
+
+def tainted_by(graph: WayGraph, ways: np.ndarray, infra_mask: np.uint64) -> np.ndarray:
+    """
+    Node lies on one of the selected `ways` that itself touches an infra way
+    (footway, cycleway, ...) anywhere along its length.
+    """
+    infra_nodes = graph.nodes_on(graph.ways_of_type(infra_mask))
+    tainted = ways & graph.ways_touching(infra_nodes)
+    return graph.nodes_on(tainted)
+
+
+def in_set(graph: WayGraph, ids: set[int]) -> np.ndarray:
+    """Node id is in `ids` (e.g. the signed intersections)."""
+    return np.isin(graph.node_ids, np.fromiter(ids, dtype=np.int64, count=len(ids)))
+
+
+def poisoned(graph: WayGraph, node_rows: np.ndarray, nodes: NodeTable) -> np.ndarray:
+    """Any way flag at the node, or any node flag on its row in `nodes` (-1 = no row)."""
+    flags = graph.node_way_flags().copy()
+    _, _, _, node_flags = nodes.arrays()
+    found = node_rows >= 0
+    flags[found] |= node_flags[node_rows[found]]
+    return flags != 0
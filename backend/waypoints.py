@@ -0,0 +1,88 @@
+"""
+Precomputed villa waypoint table for route generation.
+
+Per test centre, villa streets are scored once by how many højre
+vigepligt junctions lie within 300m (looked up through a GridIndex), and
+the weights are kept as a cumulative table so picking waypoints is just a few weighted draws.
+The table is rebuilt lazily after invalidate_villa_weights(), which runs
+whenever that centre's dataset version changes (reseed or hojre bulk-delete).
+"""
+import asyncio
+import itertools
+import logging
+from db import villa_col, hojre_col
+from geo import haversine, GridIndex
+from layer_cache import current_version, on_dataset_change
+from centers import CENTERS, Center, center_filter, default_center_id, get_center
+import profiling
+
+logger = logging.getLogger(__name__)
+
+HOJRE_RADIUS_M = 300
+# Weight: villas with H junctions get 5x more likely per junction
+WEIGHT_PER_JUNCTION = 5
+
+# (centre id, max_dist_from_start) -> {"villas": [...], "cum_weights": [...]}
+_tables: dict[tuple[str, float], dict] = {}
+# centre id -> bumped on invalidation, so tables built meanwhile aren't kept
+_generations: dict[str, int] = {}
+_lock = asyncio.Lock()
+
+
+async def _build_table(center: Center, max_dist_from_start: float) -> dict:
+    scope = center_filter(center.id)
+    with profiling.phase("villa_mongo"):
+        all_villas = await villa_col.find(scope, {"_id": 0, "lat": 1, "lng": 1, "name": 1}).to_list(10000)
+        hojre_junctions = await hojre_col.find(scope, {"_id": 0, "lat": 1, "lng": 1}).to_list(10000)
+
+    with profiling.phase("villa_scoring"):
+        index = GridIndex(hojre_junctions, cell_m=HOJRE_RADIUS_M, ref_lat=center.lat)
+        # Only consider villas within range of start
+        villas = []
+        weights = []
+        for v in all_villas:
+            if not 200 < haversine(v["lat"], v["lng"], center.lat, center.lng) < max_dist_from_start:
+                continue
+            h_count = index.count_within(v["lat"], v["lng"], HOJRE_RADIUS_M)
+            villas.append({"lat": v["lat"], "lng": v["lng"], "name": v.get("name", ""), "h_count": h_count})
+            weights.append(1 + h_count * WEIGHT_PER_JUNCTION)
+
+    logger.info("Villa weight table %s: %d villas, %d hojre junctions (max %.0fm)",
+                center.id, len(villas), len(hojre_junctions), max_dist_from_start)
+    return {"villas": villas, "cum_weights": list(itertools.accumulate(weights))}
+
+
+async def get_villa_table(max_dist_from_start: float = 2000, center_id: str | None = None) -> dict:
+    # Picks up reseeds from other processes (throttled, usually no DB hit)
+    await current_version()
+    center = get_center(center_id)
+    key = (center.id, max_dist_from_start)
+    table = _tables.get(key)
+    if table is not None:
+        return table
+    async with _lock:
+        table = _tables.get(key)
+        if table is None:
+            generation = _generations.get(center.id, 0)
+            table = await _build_table(center, max_dist_from_start)
+            # Don't keep a table that was invalidated while it was being built
+            if generation == _generations.get(center.id, 0):
+                _tables[key] = table
+    return table
+
+
+def invalidate_villa_weights(center: str | None = None):
+    """Drop a centre's precomputed tables (every centre's without one); the next route request rebuilds them."""
+    for c in [center] if center else list(CENTERS):
+        _generations[c] = _generations.get(c, 0) + 1
+    for key in [k for k in _tables if center is None or k[0] == center]:
+        del _tables[key]
+
+
+on_dataset_change(invalidate_villa_weights)
+
+
+async def refresh_villa_weights(max_dist_from_start: float = 2000):
+    """Rebuild the default centre's table right away (startup / after bulk edits)."""
+    invalidate_villa_weights(default_center_id())
+    await get_villa_table(max_dist_from_start)
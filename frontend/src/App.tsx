@@ -2,13 +2,8 @@ import { useState, useEffect, useCallback } from "react";
 import HomeScreen from "./components/HomeScreen";
 import MapScreen from "./components/MapScreen";
 import HojreTrainer from "./components/HojreTrainer";
-import {
-  fetchRoute,
-  fetchHojreVigepligt,
-  fetchSpeedLimits,
-  fetchVillaAreas,
-  fetchGoogleSpeedLimits,
-} from "./api";
+import { fetchRoute } from "./api";
+import { loadLayers } from "./layerStore";
 import type { Intersection, Road, VillaStreet, RouteData, MarkerFilter, Screen, GoogleSpeedLimit } from "./types";
 
 const G_API_KEY = import.meta.env.VITE_G_API_KEY;
@@ -60,17 +55,24 @@ function App() {
   useEffect(() => {
     if (!mapsLoaded) return;
     setDataLoading(true);
-    Promise.all([
-      fetchHojreVigepligt().catch(() => ({ hojre_vigepligt: [], signed: [] })),
-      fetchSpeedLimits().catch(() => ({ roads: [] })),
-      fetchVillaAreas().catch(() => ({ villa_streets: [], neighborhoods: [] })),
-      fetchGoogleSpeedLimits().catch(() => ({ speed_limits: [] })),
-    ]).then(([vigepligt, speed, villa, gSpeed]) => {
-      setIntersections([...vigepligt.hojre_vigepligt, ...vigepligt.signed]);
-      setRoads(speed.roads);
-      setVillaStreets(villa.villa_streets);
-      setGoogleSpeeds(gSpeed.speed_limits || []);
-    }).finally(() => setDataLoading(false));
+    // One /api/bootstrap round trip; warm starts only fetch what changed.
+    // Google speed limits may stream in afterwards, drawn batch by batch
+    setGoogleSpeeds([]);
+    loadLayers((name, docs) => {
+      if (name === "google_speed_limits") {
+        setGoogleSpeeds((prev) => [...prev, ...(docs as unknown as GoogleSpeedLimit[])]);
+      }
+    }).then((layers) => {
+      const hojre = (layers.hojre_vigepligt || []) as unknown as Intersection[];
+      const signed = (layers.signed_intersections || []) as unknown as Intersection[];
+      setIntersections([...hojre, ...signed]);
+      setRoads((layers.speed_limits || []) as unknown as Road[]);
+      setVillaStreets((layers.villa_streets || []) as unknown as VillaStreet[]);
+      const google = (layers.google_speed_limits || []) as unknown as GoogleSpeedLimit[];
+      // Empty when it's being streamed: keep the batches already drawn
+      if (google.length) setGoogleSpeeds(google);
+    }).catch((err) => console.error("Loading layers failed", err))
+      .finally(() => setDataLoading(false));
   }, [mapsLoaded]);
 
   const handleGenerateRoute = useCallback(async (includeMotorway: boolean) => {
@@ -1,4 +1,5 @@
 import axios from "axios";
+import type { BootstrapResponse, GoogleSpeedLimit } from "./types";
 
 const PROD_BACKEND = "https://backend-production-4931.up.railway.app";
 const isNative = typeof window !== "undefined" && (window.location.protocol === "capacitor:" || window.location.protocol === "ionic:");
@@ -25,28 +26,38 @@ export async function fetchIntersections(lat?: number, lng?: number, radius?: nu
   return data;
 }
 
-export async function fetchSpeedLimits(lat?: number, lng?: number, radius?: number) {
-  const { data } = await api.get("/overpass/speed-limits", {
-    params: { lat, lng, radius },
-  });
+// Layers named in defer come back as {"deferred": true, "docs": []} whenever
+// they'd be sent whole, to be streamed from their layer endpoint instead
+export async function fetchBootstrap(since?: number, defer?: string[]): Promise<BootstrapResponse> {
+  const { data } = await api.get("/bootstrap", { params: { since, defer: defer?.join(",") } });
   return data;
 }
 
-export async function fetchHojreVigepligt(lat?: number, lng?: number, radius?: number) {
-  const { data } = await api.get("/overpass/hojre-vigepligt", {
-    params: { lat, lng, radius },
-  });
-  return data;
+// Streams a layer as NDJSON (?stream=ndjson), handing each received chunk of
+// documents to onBatch so markers can be drawn before the download finishes
+export async function streamLayer<T>(path: string, onBatch: (docs: T[]) => void, center?: string): Promise<number> {
+  const params = new URLSearchParams({ stream: "ndjson" });
+  if (center) params.set("center", center);
+  const res = await fetch(`${BASE}/api${path}?${params}`);
+  if (!res.ok || !res.body) throw new Error(`${path}: HTTP ${res.status}`);
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let count = 0;
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split("\n");
+    buffered = done ? "" : lines.pop()!;
+    const docs = lines.filter((l) => l.trim()).map((l) => JSON.parse(l) as T);
+    if (docs.length) {
+      count += docs.length;
+      onBatch(docs);
+    }
+    if (done) return count;
+  }
 }
 
-export async function fetchVillaAreas(lat?: number, lng?: number, radius?: number) {
-  const { data } = await api.get("/villa/areas", {
-    params: { lat, lng, radius },
-  });
-  return data;
-}
-
-export async function fetchGoogleSpeedLimits() {
-  const { data } = await api.get("/overpass/google-speed-limits");
-  return data;
+export function streamGoogleSpeedLimits(onBatch: (docs: GoogleSpeedLimit[]) => void, center?: string) {
+  return streamLayer<GoogleSpeedLimit>("/overpass/google-speed-limits", onBatch, center);
 }
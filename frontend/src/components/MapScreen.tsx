@@ -183,6 +183,7 @@ function parseSteps(legs: any[]): Step[] {
         startLng: startLoc.longitude || 0,
         endLat: endLoc.latitude || 0,
         endLng: endLoc.longitude || 0,
+        speedLimit: s.speedLimit ?? null,
       });
     }
   }
@@ -794,6 +795,9 @@ export default function MapScreen({ route, intersections, roads, villaStreets, g
     if (mode !== "step" || !steps[currentStep]) return null;
     const step = steps[currentStep];
 
+    // Generated routes come with the speed limit already attached per step
+    if (step.speedLimit) return step.speedLimit;
+
     // Try Google speed data first
     if (googleSpeeds.length > 0) {
       let closest: GoogleSpeedLimit | null = null;
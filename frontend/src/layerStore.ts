@@ -0,0 +1,99 @@
+// Start-up layers from /api/bootstrap, kept in IndexedDB between visits so
+// a warm start sends the stored version and only applies what changed since.
+// google_speed_limits, by far the largest, is streamed from its layer
+// endpoint whenever it has to be loaded whole, so it draws as it arrives
+import { fetchBootstrap, streamGoogleSpeedLimits } from "./api";
+import type { BootstrapResponse } from "./types";
+
+type Doc = Record<string, unknown>;
+
+const STREAMED: Record<string, (onBatch: (docs: Doc[]) => void, center: string) => Promise<number>> = {
+  google_speed_limits: (onBatch, center) =>
+    streamGoogleSpeedLimits((docs) => onBatch(docs as unknown as Doc[]), center),
+};
+
+interface StoredLayers {
+  center: string;
+  version: number;
+  layers: Record<string, Doc[]>;
+}
+
+const DB_NAME = "koereprove";
+const STORE = "bootstrap";
+const KEY = "layers";
+
+function openDb(): Promise<IDBDatabase> {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(DB_NAME, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(STORE);
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+async function readStored(): Promise<StoredLayers | undefined> {
+  const db = await openDb();
+  return new Promise((resolve, reject) => {
+    const req = db.transaction(STORE).objectStore(STORE).get(KEY);
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+async function writeStored(stored: StoredLayers) {
+  const db = await openDb();
+  return new Promise<void>((resolve, reject) => {
+    const tx = db.transaction(STORE, "readwrite");
+    tx.objectStore(STORE).put(stored, KEY);
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+  });
+}
+
+function apply(stored: StoredLayers | undefined, data: BootstrapResponse): StoredLayers {
+  const layers: Record<string, Doc[]> = {};
+  for (const [name, layer] of Object.entries(data.layers)) {
+    if (layer.full || !stored) {
+      layers[name] = layer.docs;
+      continue;
+    }
+    const byKey = new Map((stored.layers[name] || []).map((d) => [d[layer.key], d]));
+    for (const k of layer.deleted || []) byKey.delete(k);
+    for (const d of layer.docs) byKey.set(d[layer.key], d);
+    layers[name] = [...byKey.values()];
+  }
+  // Kept in the order the API serves them (nearest first)
+  layers.villa_streets?.sort((a, b) => (a.distance_m as number) - (b.distance_m as number));
+  return { center: data.center, version: data.version, layers };
+}
+
+// Resolves with the layers once the bootstrap response is applied; a layer
+// that has to be streamed is empty there and arrives through onStreamed, in
+// batches. The store is only updated once every stream has finished, so an
+// interrupted one is fetched whole again next time.
+export async function loadLayers(
+  onStreamed: (name: string, docs: Doc[]) => void,
+): Promise<Record<string, Doc[]>> {
+  const defer = Object.keys(STREAMED);
+  const stored = await readStored().catch(() => undefined);
+  let data = await fetchBootstrap(stored?.version, defer);
+  if (!data.full && stored?.center !== data.center) {
+    // The default test centre changed under us: the delta isn't for what we hold
+    data = await fetchBootstrap(undefined, defer);
+  }
+  const next = apply(data.full ? undefined : stored, data);
+  const streams = Object.entries(data.layers)
+    .filter(([, layer]) => layer.deferred)
+    .map(async ([name]) => {
+      const docs: Doc[] = [];
+      await STREAMED[name]((batch) => {
+        docs.push(...batch);
+        onStreamed(name, batch);
+      }, data.center);
+      next.layers[name] = docs;
+    });
+  Promise.all(streams)
+    .then(() => writeStored(next))
+    .catch((err) => console.warn("Could not store layers", err));
+  return { ...next.layers };
+}
@@ -34,6 +34,19 @@ export interface RouteData {
   polyline: string;
   include_motorway: boolean;
   legs: any[];
+  junction_events?: JunctionEvent[];
+}
+
+export interface JunctionEvent {
+  type: 'hojre_vigepligt' | 'trafiklys' | 'ubetinget_vigepligt' | 'stopskilt';
+  osm_id: number;
+  lat: number;
+  lng: number;
+  distance_along_m: number;
+  offset_m: number;
+  leg_index: number | null;
+  step_index: number | null;
+  order: number;
 }
 
 export interface VillaStreet {
@@ -60,6 +73,16 @@ export interface GoogleSpeedLimit {
   units: string;
   lat: number;
   lng: number;
+  source?: 'here' | 'osm';
+  // Speed run along one OSM way (lat/lng is its midpoint)
+  osm_id?: number;
+  name?: string;
+  length_m?: number;
+  geometry?: { lat: number; lng: number }[];
+  polyline?: string;
+  // Off-road cell (quadtree level, integer cell key)
+  level?: number;
+  cell?: number;
 }
 
 export interface Step {
@@ -72,6 +95,7 @@ export interface Step {
   startLng: number;
   endLat: number;
   endLng: number;
+  speedLimit?: number | null;
 }
 
 export type MarkerFilter = {
@@ -83,3 +107,20 @@ export type MarkerFilter = {
 };
 
 export type Screen = "home" | "map" | "streetview" | "trainer";
+
+// /api/bootstrap: every start-up layer, or what changed since `version`
+export interface BootstrapLayer<T = Record<string, unknown>> {
+  key: string;
+  full: boolean;
+  // Left out on request (defer=); stream it from the layer endpoint
+  deferred?: boolean;
+  docs: T[];
+  deleted?: (string | number)[];
+}
+
+export interface BootstrapResponse {
+  center: string;
+  version: number;
+  full: boolean;
+  layers: Record<string, BootstrapLayer>;
+}